@@ -4,8 +4,12 @@ import json
 import random
 import struct
 import configparser
+from collections import deque
 from datetime import datetime
 import paho.mqtt.client as mqtt
+from latency_trace import StageRecorder
+from telemetry_policy import ChangePublisher, ROBOT_KEEPALIVE, BATTERY_DEADBAND
+from catalog import load_catalog
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -15,6 +19,11 @@ BROKER = config['mqtt']['broker']
 PORT = int(config['mqtt']['port'])
 BATTERY_DECAY = float(config['robot']['battery_decay'])
 BATTERY_LOW_THRESHOLD = float(config['robot']['battery_low_threshold'])
+# Upcoming tasks a busy robot accepts and chains into straight after its drop (0 = IDLE only)
+TASK_QUEUE_DEPTH = config.getint('robot', 'task_queue_depth', fallback=1)
+FAULT_PROFILE = config.get('robot', 'fault_profile', fallback='default')
+CATALOG = load_catalog()
+TASK_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"]
 ACTIVE_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING", "MOVING_TO_CHARGE"]
 
 # State Durations (seconds)
@@ -24,8 +33,20 @@ DURATION_MOVING_TO_DROP = 2
 DURATION_DROPPING = 1
 DURATION_CHARGING = 10
 
+def load_fault_profile(name):
+    # A [faults.<name>] section; anything it leaves out keeps the original behavior (5% stall roll)
+    section = f"faults.{name}"
+    if not config.has_section(section) and name != "default":
+        print(f"WARNING: fault profile {name} not found in config.ini, using defaults")
+    return {
+        "stall_probability": config.getfloat(section, 'stall_probability', fallback=0.05),
+        "status_loss": config.getfloat(section, 'status_loss', fallback=0.0),
+        "silence_probability": config.getfloat(section, 'silence_probability', fallback=0.0),
+        "silence_seconds": config.getfloat(section, 'silence_seconds', fallback=10.0),
+    }
+
 class AMRRobot:
-    def __init__(self, group_id, robot_id):
+    def __init__(self, group_id, robot_id, fault_profile=None):
         self.group_id = group_id
         self.robot_id = robot_id
         
@@ -40,21 +61,47 @@ class AMRRobot:
         self.target_station = None
         self.state_timer = 0
         self.is_stalled = False
+        self.task_queue = deque()  # (shelf_code, station_code, trace_token) accepted while busy
+        self.tasks_completed = 0   # Reported in every status so the Coordinator can see chained drops
+
+        # Injected faults (stalls, lost status messages, silent periods)
+        self.fault_profile = fault_profile or FAULT_PROFILE
+        self.faults = load_fault_profile(self.fault_profile)
+        self.silent_until = 0
+
+        # Status goes out on change, otherwise once per keepalive; battery only past the deadband
+        self.telemetry = ChangePublisher(ROBOT_KEEPALIVE)
+        self.reported_battery = None
+
+        # Trace context for the current task (token from the binary command)
+        self.trace = None
+        self.trace_mono = {}
+        self.next_trace = None  # Trace of a chained task, active once the finished one is reported
+        self.trace_recorder = StageRecorder(f"robot-{robot_id}")
         
         self.client = mqtt.Client(client_id=f"{group_id}-{robot_id}-{random.randint(0, 1000)}")
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_subscribe = self.on_subscribe
+        self.pending_subscriptions = set()
         
         self.running = True
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"Connected to MQTT Broker as {self.robot_id}")
-            client.subscribe(self.topic_command)
+            self.pending_subscriptions = {client.subscribe(self.topic_command)[1]}
         else:
             print(f"Failed to connect, return code {rc}")
 
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        # Launcher ready marker, printed once the broker has acknowledged every subscription
+        if mid in self.pending_subscriptions:
+            self.pending_subscriptions.discard(mid)
+            if not self.pending_subscriptions:
+                print(f"Subscribed to {self.topic_command}")
+
     def on_disconnect(self, client, userdata, rc):
         print("Disconnected from MQTT Broker")
 
@@ -62,14 +109,24 @@ class AMRRobot:
         try:
             payload = msg.payload
             
-            # Binary Command Parsing (3 Bytes)
-            if len(payload) != 3:
+            # Binary Command Parsing (3 Bytes, or 7 with a trace token; 5 and 9 when
+            # catalog codes need 16 bits)
+            trace_token = 0
+            if len(payload) == 7:
+                cmd_type, byte2, byte3, trace_token = struct.unpack("<BBBI", payload)
+            elif len(payload) == 3:
+                cmd_type, byte2, byte3 = struct.unpack("BBB", payload)
+            elif len(payload) == 9:
+                cmd_type, byte2, byte3, trace_token = struct.unpack("<BHHI", payload)
+            elif len(payload) == 5:
+                cmd_type, byte2, byte3 = struct.unpack("<BHH", payload)
+            else:
                 return
-
-            cmd_type, byte2, byte3 = struct.unpack("BBB", payload)
             
             if cmd_type == 0x01: # EXECUTE_TASK
-                self.handle_execute_task(byte2, byte3)
+                self.handle_execute_task(byte2, byte3, trace_token)
+            elif cmd_type == 0x02: # QUEUE_TASK (pre-assigned while busy)
+                self.handle_execute_task(byte2, byte3, trace_token, queue_only=True)
             elif cmd_type == 0x03: # FORCE_CHARGE
                 self.handle_force_charge()
             else:
@@ -78,23 +135,40 @@ class AMRRobot:
         except Exception as e:
             print(f"DEBUG_ROBOT: Error processing message: {e}")
 
-    def handle_execute_task(self, shelf_id, station_id):
+    def handle_execute_task(self, shelf_id, station_id, trace_token=0, queue_only=False):
         # Validate robot readiness
         if self.is_stalled:
             return
         if self.battery < BATTERY_LOW_THRESHOLD:
             return
+        if self.state in TASK_STATES and len(self.task_queue) < TASK_QUEUE_DEPTH:
+            self.task_queue.append((shelf_id, station_id, trace_token))
+            print(f"DEBUG_ROBOT: Queued Task: Shelf {CATALOG.shelf_name(shelf_id)} ({len(self.task_queue)} queued)")
+            return
         if self.state != "IDLE":
             return
+        if queue_only:
+            # Arrived after the drop: the Coordinator has already requeued this order
+            print(f"DEBUG_ROBOT: Dropped queue-only Task for Shelf {CATALOG.shelf_name(shelf_id)}, robot is IDLE")
+            return
+        self.start_task(shelf_id, station_id, trace_token)
 
-        print(f"DEBUG_ROBOT: Accepted Task: Shelf {shelf_id}, Station {station_id}")
-        self.target_shelf = shelf_id
-        self.target_station = station_id
+    def start_task(self, shelf_id, station_id, trace_token):
+        # Codes from the command map back to shelf and station names through the shared catalog
+        self.target_shelf = CATALOG.shelf_name(shelf_id)
+        self.target_station = CATALOG.station_name(station_id)
+        print(f"DEBUG_ROBOT: Accepted Task: Shelf {self.target_shelf}, Station {self.target_station}")
+        if trace_token:
+            self.trace = {"token": trace_token, "accept_ns": time.time_ns()}
+            self.trace_mono = {"accept": time.perf_counter()}
         self.transition_to("MOVING_TO_PICK")
 
     def handle_force_charge(self):
         print("Received FORCE_CHARGE")
         self.is_stalled = False  # Clear stall flag on manual override
+        self.task_queue.clear()  # The Coordinator requeues anything that was waiting
+        self.trace = None
+        self.next_trace = None
         self.transition_to("MOVING_TO_CHARGE")
 
     def transition_to(self, new_state):
@@ -102,13 +176,16 @@ class AMRRobot:
         print(f"Transitioning to {new_state}", flush=True)
         self.state = new_state
         self.state_timer = 0
+
+        if self.trace:
+            self.record_trace_stage(new_state)
         
         if new_state == "IDLE":
             self.location = "DOCK"
         elif new_state == "MOVING_TO_PICK":
             self.location = "TRANSIT"
         elif new_state == "PICKING":
-            self.location = f"SHELF-S{self.target_shelf}"
+            self.location = f"SHELF-{self.target_shelf}"
         elif new_state == "MOVING_TO_DROP":
             self.location = "TRANSIT"
         elif new_state == "DROPPING":
@@ -118,18 +195,30 @@ class AMRRobot:
         elif new_state == "CHARGING":
             self.location = "CHARGING_STATION"
 
+    def record_trace_stage(self, new_state):
+        now = time.perf_counter()
+        if new_state == "PICKING":
+            self.trace["pick_ns"] = time.time_ns()
+            self.trace_mono["pick"] = now
+            self.trace_recorder.record("robot.accept_to_pick", now - self.trace_mono["accept"])
+        elif new_state == "IDLE" and "pick" in self.trace_mono:
+            self.trace["drop_ns"] = time.time_ns()
+            self.trace_recorder.record("robot.pick_to_drop", now - self.trace_mono["pick"])
+
     def update_logic(self):
         # Battery Consumption
         if self.state in ACTIVE_STATES and not self.is_stalled:
             self.battery -= BATTERY_DECAY
             if self.battery < 0: self.battery = 0
         
-        # Simulate Random Mechanical Failure (5% chance while moving)
-        if "MOVING" in self.state and not self.is_stalled:
+        # Simulate Random Mechanical Failure (stall_probability per tick while moving, 5% by default)
+        stall_probability = self.faults["stall_probability"]
+        if "MOVING" in self.state and not self.is_stalled and stall_probability > 0:
             roll = random.random()
-            if roll < 0.05: 
-                print(f"FAILURE: Robot STALLED (Rolled {roll:.4f} < 0.05)", flush=True)
+            if roll < stall_probability: 
+                print(f"FAILURE: Robot STALLED (Rolled {roll:.4f} < {stall_probability})", flush=True)
                 self.is_stalled = True
+                self.task_queue.clear()
 
         if self.is_stalled:
             return 
@@ -151,7 +240,7 @@ class AMRRobot:
                 
         elif self.state == "DROPPING":
             if self.state_timer >= DURATION_DROPPING:
-                self.transition_to("IDLE")
+                self.finish_task()
         
         elif self.state == "MOVING_TO_CHARGE":
              if self.state_timer >= 2:
@@ -162,27 +251,79 @@ class AMRRobot:
                 self.battery = 100.0
                 self.transition_to("IDLE")
 
-    def publish_status(self):
+    def finish_task(self):
+        # Chain straight into the next queued task instead of parking at the dock
+        self.tasks_completed += 1
+        if self.task_queue and self.battery >= BATTERY_LOW_THRESHOLD:
+            if self.trace and "pick" in self.trace_mono:
+                self.trace["drop_ns"] = time.time_ns()
+                self.trace_recorder.record("robot.pick_to_drop", time.perf_counter() - self.trace_mono["pick"])
+            finished_trace = self.trace
+            self.trace = None
+            self.start_task(*self.task_queue.popleft())
+            # The finished trace goes out with this tick's status, the new one from the next tick
+            self.next_trace, self.trace = self.trace, finished_trace
+            print(f"DEBUG_ROBOT: Chained to next task ({len(self.task_queue)} still queued)")
+            return
+        self.task_queue.clear()
+        self.transition_to("IDLE")
+
+    def publish_status(self, now=None):
+        now = now if now is not None else time.time()
         current_status = self.state
         if self.is_stalled:
             current_status = "STALLED"
 
+        battery = int(self.battery)
+        reported = self.reported_battery
+        battery_moved = (reported is None or abs(battery - reported) >= BATTERY_DEADBAND
+                         or (battery < BATTERY_LOW_THRESHOLD <= reported))
+        key = (current_status, self.location, self.tasks_completed, len(self.task_queue))
+        if not self.telemetry.due(key, now, battery_moved):
+            return
+        self.reported_battery = battery
+
         status_msg = {
             "robot_id": self.robot_id,
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "location_id": self.location,
-            "battery": int(self.battery),
-            "status": current_status
+            "battery": battery,
+            "status": current_status,
+            "tasks_completed": self.tasks_completed,
+            "queued": len(self.task_queue),
+            "keepalive": self.telemetry.keepalive
         }
-        try:
-            self.client.publish(self.topic_status, json.dumps(status_msg))
-        except Exception as e:
-            print(f"Failed to publish status: {e}")
+        if self.trace:
+            status_msg["trace"] = self.trace
+        if not self.radio_silent():
+            try:
+                self.client.publish(self.topic_status, json.dumps(status_msg))
+            except Exception as e:
+                print(f"Failed to publish status: {e}")
+
+        # Trace is reported once more with the drop timestamp, then closed
+        if self.trace and "drop_ns" in self.trace:
+            self.trace = self.next_trace
+            self.next_trace = None
+
+    def radio_silent(self):
+        # Fault profile: dropped status messages, or a silent period the Monitor should see as a lost heartbeat
+        now = time.time()
+        if now < self.silent_until:
+            return True
+        silence_probability = self.faults["silence_probability"]
+        if silence_probability > 0 and random.random() < silence_probability:
+            self.silent_until = now + self.faults["silence_seconds"]
+            print(f"FAULT: Robot going silent for {self.faults['silence_seconds']:.0f}s", flush=True)
+            return True
+        status_loss = self.faults["status_loss"]
+        return status_loss > 0 and random.random() < status_loss
 
     def run(self):
         try:
             self.client.connect(BROKER, PORT, 60)
             self.client.loop_start()
+            self.trace_recorder.start()
             
             while self.running:
                 start_time = time.time()
@@ -200,16 +341,18 @@ class AMRRobot:
         except Exception as e:
             print(f"Unexpected error: {e}")
         finally:
+            self.trace_recorder.flush()
             self.client.loop_stop()
             self.client.disconnect()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python amr_robot.py {GroupID} {robot_id}")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python amr_robot.py {GroupID} {robot_id} [fault_profile]")
         sys.exit(1)
         
     group_id = sys.argv[1]
     robot_id = sys.argv[2]
+    fault_profile = sys.argv[3] if len(sys.argv) == 4 else None
     
-    robot = AMRRobot(group_id, robot_id)
+    robot = AMRRobot(group_id, robot_id, fault_profile)
     robot.run()
@@ -0,0 +1,138 @@
+from array import array
+
+# Compact state codes for per-sample storage
+STATE_CODES = {
+    "IDLE": 0,
+    "MOVING_TO_PICK": 1,
+    "PICKING": 2,
+    "MOVING_TO_DROP": 3,
+    "DROPPING": 4,
+    "MOVING_TO_CHARGE": 5,
+    "CHARGING": 6,
+    "STALLED": 7,
+}
+STATE_OTHER = 8
+NUM_STATES = 9
+STATE_NAMES = {code: name for name, code in STATE_CODES.items()}
+STATE_NAMES[STATE_OTHER] = "OTHER"
+NON_DRAIN_STATES = (STATE_CODES["CHARGING"],)
+
+class BatteryTracker:
+    # Fixed-size ring of battery increments for one robot. Each slot holds the elapsed time,
+    # the battery drop and the state the robot was in over that interval. Per-state
+    # sums are updated on insert and eviction, so drain-rate regressions are O(1).
+    __slots__ = ("capacity", "dt", "db", "state", "head", "count",
+                 "sxy", "sxx", "sdt", "last_ts", "last_battery", "last_state", "last_alert")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.dt = array('f', bytes(4 * capacity))
+        self.db = array('f', bytes(4 * capacity))
+        self.state = array('B', bytes(capacity))
+        self.head = 0
+        self.count = 0
+        self.sxy = array('d', bytes(8 * NUM_STATES))  # sum(dt * drop)
+        self.sxx = array('d', bytes(8 * NUM_STATES))  # sum(dt * dt)
+        self.sdt = array('d', bytes(8 * NUM_STATES))  # time spent in state
+        self.last_ts = None
+        self.last_battery = 0.0
+        self.last_state = STATE_OTHER
+        self.last_alert = 0.0
+
+    def add(self, ts, battery, status):
+        code = STATE_CODES.get(status, STATE_OTHER)
+        if self.last_ts is not None:
+            dt = ts - self.last_ts
+            if dt > 0:
+                # The interval is attributed to the state the robot was in when it started
+                self._push(dt, self.last_battery - battery, self.last_state)
+        self.last_ts = ts
+        self.last_battery = battery
+        self.last_state = code
+
+    def _push(self, dt, drop, code):
+        i = self.head
+        if self.count == self.capacity:
+            old = self.state[i]
+            odt = self.dt[i]
+            self.sxy[old] -= odt * self.db[i]
+            self.sxx[old] -= odt * odt
+            self.sdt[old] -= odt
+        else:
+            self.count += 1
+
+        self.dt[i] = dt
+        self.db[i] = drop
+        self.state[i] = code
+        dt = self.dt[i] # Use the stored float32 value so add/subtract stay symmetric
+        self.sxy[code] += dt * self.db[i]
+        self.sxx[code] += dt * dt
+        self.sdt[code] += dt
+
+        self.head = (i + 1) % self.capacity
+        if self.head == 0:
+            self._resum()
+
+    def _resum(self):
+        # Once per revolution: rebuild sums to shed floating-point drift
+        for code in range(NUM_STATES):
+            self.sxy[code] = self.sxx[code] = self.sdt[code] = 0.0
+        for i in range(self.count):
+            code = self.state[i]
+            dt = self.dt[i]
+            self.sxy[code] += dt * self.db[i]
+            self.sxx[code] += dt * dt
+            self.sdt[code] += dt
+
+    def drain_rate(self, status):
+        # Least-squares slope of battery drop vs time for one state (% per second)
+        code = STATE_CODES.get(status, STATE_OTHER)
+        if self.sxx[code] <= 0:
+            return None
+        return self.sxy[code] / self.sxx[code]
+
+    def mix_rate(self):
+        # Expected drain under the recent state mix (charging excluded)
+        total_time = 0.0
+        weighted = 0.0
+        for code in range(NUM_STATES):
+            if code in NON_DRAIN_STATES or self.sxx[code] <= 0:
+                continue
+            total_time += self.sdt[code]
+            weighted += self.sdt[code] * (self.sxy[code] / self.sxx[code])
+        if total_time <= 0:
+            return None
+        return weighted / total_time
+
+    def predict(self, threshold):
+        # Seconds until the threshold and until empty, or None if no drain is observed
+        if self.last_state in NON_DRAIN_STATES:
+            return None
+        rate = self.mix_rate()
+        if not rate or rate <= 0:
+            return None
+        return {
+            "drain_rate": rate,
+            "time_to_threshold": max(0.0, (self.last_battery - threshold) / rate),
+            "time_to_empty": max(0.0, self.last_battery / rate),
+        }
+
+    def state_rates(self):
+        return {STATE_NAMES[c]: self.sxy[c] / self.sxx[c] for c in range(NUM_STATES) if self.sxx[c] > 0}
+
+class BatteryAnalytics:
+    def __init__(self, window=120, threshold=15.0):
+        self.window = window
+        self.threshold = threshold
+        self.trackers = {}
+
+    def observe(self, robot_id, ts, battery, status):
+        tracker = self.trackers.get(robot_id)
+        if tracker is None:
+            tracker = self.trackers[robot_id] = BatteryTracker(self.window)
+        tracker.add(ts, battery, status)
+        return tracker
+
+    def predict(self, robot_id):
+        tracker = self.trackers.get(robot_id)
+        return tracker.predict(self.threshold) if tracker else None
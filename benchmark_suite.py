@@ -0,0 +1,610 @@
+import os
+import sys
+import gc
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+import contextlib
+import importlib
+
+# Benchmark config: components read config.ini from the working directory at import time,
+# so the suite writes its own into a scratch directory before importing them.
+BENCH_CONFIG = """[mqtt]
+broker = 127.0.0.1
+port = {mqtt_port}
+
+[ports]
+gateway_udp = 0
+coordinator_udp = 0
+coordinator_tcp = 0
+
+[influxdb]
+url = http://127.0.0.1:1
+token = benchmark
+org = benchmark
+bucket = benchmark
+
+[robot]
+battery_decay = 1.0
+battery_low_threshold = 15.0
+trip_seconds = 7
+
+[charging]
+chargers = 2
+
+[catalog]
+path = {catalog_path}
+
+[shelf]
+initial_stock = 100
+
+[tracing]
+enabled = false
+
+[metrics]
+enabled = false
+"""
+
+GROUP_ID = "BENCH"
+
+# Direction of "better" per metric, used by the regression comparison
+HIGHER_IS_BETTER = {
+    "gateway_msgs_per_sec": True,
+    "dispatch_orders_per_sec": True,
+    "dispatch_latency_p50_ms": False,
+    "dispatch_latency_p99_ms": False,
+    "ingest_orders_per_sec": True,
+    "warm_start_first_dispatch_ms": False,
+    "coordinator_bytes_per_robot": False,
+    "coordinator_bytes_per_shelf": False,
+    "coordinator_bytes_per_order": False,
+    "monitor_bytes_per_robot": False,
+    "match_orders_per_sec": True,
+    "match_bytes_per_pending_order": False,
+    "telemetry_msgs_per_robot_sec": False,
+    "telemetry_reduction_pct": True,
+}
+
+class NullWriteApi:
+    # Stands in for the Influx batching writer so the benchmark never leaves the host
+    def __init__(self):
+        self.points = 0
+
+    def write(self, bucket=None, org=None, record=None, **kwargs):
+        self.points += 1
+
+class NullPublish:
+    # Publish result for a coordinator whose MQTT client is replaced in the offline benchmarks
+    rc = 0
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def wait_for(predicate, timeout, interval=0.01):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return predicate()
+
+class SyntheticFleet:
+    # One MQTT client standing in for many robots and shelves
+    def __init__(self, mqtt, group_id, num_robots, num_shelves):
+        self.mqtt = mqtt
+        self.group_id = group_id
+        self.robots = [f"AMR-{i + 1}" for i in range(num_robots)]
+        self.shelves = [f"S{i + 1}" for i in range(num_shelves)]
+        self.commands_received = 0
+        self.connected = threading.Event()
+
+        self.client = mqtt.Client(client_id=f"bench-fleet-{int(time.time())}")
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe(f"warehouse/{self.group_id}/amr/+/command")
+        self.connected.set()
+
+    def on_message(self, client, userdata, msg):
+        # Act like a robot that finishes instantly: accept, then go back to IDLE
+        self.commands_received += 1
+        robot_id = msg.topic.split('/')[3]
+        self.publish_robot(robot_id, "MOVING_TO_PICK", "TRANSIT")
+        self.publish_robot(robot_id, "IDLE", "DOCK")
+
+    def publish_robot(self, robot_id, status, location, battery=100):
+        msg = {
+            "robot_id": robot_id,
+            "timestamp": "2025-01-01T00:00:00Z",
+            "location_id": location,
+            "battery": battery,
+            "status": status
+        }
+        self.client.publish(f"warehouse/{self.group_id}/amr/{robot_id}/status", json.dumps(msg))
+
+    def publish_shelf(self, index, stock=1000000):
+        shelf_id = self.shelves[index]
+        zone = "storage-a" if index % 2 == 0 else "storage-b"
+        msg = {
+            "asset_id": shelf_id,
+            "type": "SHELF",
+            "item_id": f"item_{chr(65 + index % 10)}",
+            "stock": stock,
+            "unit": "units" if zone == "storage-a" else "kg",
+        }
+        self.client.publish(f"warehouse/{self.group_id}/locations/{zone}/{shelf_id}/status", json.dumps(msg))
+
+    def start(self, host, port):
+        self.client.connect(host, port, 60)
+        self.client.loop_start()
+        if not self.connected.wait(10):
+            raise RuntimeError("Synthetic fleet could not connect")
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+class BenchmarkSuite:
+    def __init__(self, args):
+        self.args = args
+        self.results = {}
+        self.workdir = tempfile.mkdtemp(prefix="warehouse-bench-")
+        self.broker = None
+        self.components = []
+
+    def setup(self):
+        import local_broker
+        self.broker = local_broker.EmbeddedBroker()
+        mqtt_port = self.broker.start()
+        self.report(f"Embedded broker on 127.0.0.1:{mqtt_port}")
+
+        with open(os.path.join(self.workdir, "config.ini"), 'w') as f:
+            catalog_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+            f.write(BENCH_CONFIG.format(mqtt_port=mqtt_port, catalog_path=catalog_path))
+        os.chdir(self.workdir)
+
+        # Import components only now so they pick up the benchmark config
+        self.mqtt = importlib.import_module("paho.mqtt.client")
+        self.gateway_mod = importlib.import_module("warehouse_gateway")
+        self.coordinator_mod = importlib.import_module("fleet_coordinator")
+        self.monitor_mod = importlib.import_module("system_monitor")
+        self.robot_mod = importlib.import_module("amr_robot")
+        self.shelf_mod = importlib.import_module("shelves")
+        self.mqtt_port = mqtt_port
+
+    def start_stack(self):
+        gateway = self.gateway_mod.WarehouseGateway(GROUP_ID)
+        gateway.write_api = NullWriteApi()
+        coordinator = self.coordinator_mod.FleetCoordinator(GROUP_ID)
+        monitor = self.monitor_mod.SystemMonitor(GROUP_ID)
+        monitor.gateway_address = ('127.0.0.1', gateway.udp_socket.getsockname()[1])
+
+        for component in (gateway, coordinator, monitor):
+            threading.Thread(target=component.run, daemon=True).start()
+        self.components = [gateway, coordinator, monitor]
+        self.gateway, self.coordinator, self.monitor = gateway, coordinator, monitor
+
+        sink = self.mqtt.Client(client_id=f"bench-sink-{int(time.time())}")
+        self.internal_count = 0
+        subscribed = threading.Event()
+
+        def on_message(client, userdata, msg):
+            self.internal_count += 1
+
+        sink.on_message = on_message
+        sink.on_subscribe = lambda client, userdata, mid, granted_qos: subscribed.set()
+        sink.on_connect = lambda client, userdata, flags, rc: client.subscribe(f"{GROUP_ID}/internal/+/+/status")
+        sink.connect("127.0.0.1", self.mqtt_port, 60)
+        sink.loop_start()
+        subscribed.wait(10)
+        self.sink = sink
+
+        # Give the components time to connect and subscribe
+        time.sleep(1.0)
+
+    def bench_gateway_throughput(self):
+        # Synthetic robot and shelf telemetry through the gateway ETL path
+        n = self.args.messages
+        fleet = SyntheticFleet(self.mqtt, GROUP_ID, self.args.robots, self.args.shelves)
+        fleet.start("127.0.0.1", self.mqtt_port)
+
+        self.internal_count = 0
+        start = time.perf_counter()
+        for i in range(n):
+            if i % 10 == 9:
+                fleet.publish_shelf(i % len(fleet.shelves))
+            else:
+                fleet.publish_robot(fleet.robots[i % len(fleet.robots)], "IDLE", "DOCK")
+        wait_for(lambda: self.internal_count >= n, timeout=60)
+        elapsed = time.perf_counter() - start
+        fleet.stop()
+
+        self.results["gateway_msgs_per_sec"] = round(self.internal_count / elapsed, 1)
+        self.report(f"Gateway throughput: {self.results['gateway_msgs_per_sec']} msg/s ({self.internal_count}/{n} forwarded)")
+
+    def bench_dispatch(self):
+        # Orders over UDP -> coordinator match -> gateway encode -> synthetic robot ack
+        fleet = SyntheticFleet(self.mqtt, GROUP_ID, self.args.robots, self.args.shelves)
+        fleet.start("127.0.0.1", self.mqtt_port)
+        for robot_id in fleet.robots:
+            fleet.publish_robot(robot_id, "IDLE", "DOCK")
+        for i in range(len(fleet.shelves)):
+            fleet.publish_shelf(i)
+        wait_for(lambda: len(self.coordinator.robots) >= len(fleet.robots)
+                 and len(self.coordinator.shelves) >= len(fleet.shelves), timeout=10)
+
+        dispatch_times = {}
+        done = threading.Event()
+        n = self.args.orders
+
+        watcher = self.mqtt.Client(client_id=f"bench-watch-{int(time.time())}")
+        subscribed = threading.Event()
+
+        def on_message(client, userdata, msg):
+            try:
+                order_id = json.loads(msg.payload.decode('utf-8')).get("order_id")
+            except ValueError:
+                return
+            if order_id and order_id.startswith("bench-"):
+                dispatch_times[order_id] = time.perf_counter()
+                if len(dispatch_times) >= n:
+                    done.set()
+
+        watcher.on_message = on_message
+        watcher.on_subscribe = lambda client, userdata, mid, granted_qos: subscribed.set()
+        watcher.on_connect = lambda client, userdata, flags, rc: client.subscribe(f"{GROUP_ID}/internal/tasks/dispatch")
+        watcher.connect("127.0.0.1", self.mqtt_port, 60)
+        watcher.loop_start()
+        subscribed.wait(10)
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        target = ('127.0.0.1', self.coordinator.udp_socket.getsockname()[1])
+        stations = [f"P{i + 1}" for i in range(self.args.robots)] # One station per robot so stations never block
+        send_times = {}
+        start = time.perf_counter()
+        for i in range(n):
+            order_id = f"bench-{i}"
+            order = {
+                "item": f"item_{chr(65 + i % min(10, len(fleet.shelves)))}",
+                "quantity": 1,
+                "pack_station": stations[i % len(stations)],
+                "order_id": order_id
+            }
+            send_times[order_id] = time.perf_counter()
+            sock.sendto(json.dumps(order).encode('utf-8'), target)
+            time.sleep(1.0 / self.args.order_rate)
+        done.wait(max(30, n / self.args.order_rate * 2))
+        elapsed = time.perf_counter() - start
+        sock.close()
+        watcher.loop_stop()
+        watcher.disconnect()
+        fleet.stop()
+
+        latencies = sorted((dispatch_times[o] - send_times[o]) * 1000.0 for o in dispatch_times if o in send_times)
+        self.results["dispatch_orders_per_sec"] = round(len(latencies) / elapsed, 1)
+        self.results["dispatch_latency_p50_ms"] = round(percentile(latencies, 50), 2)
+        self.results["dispatch_latency_p99_ms"] = round(percentile(latencies, 99), 2)
+        self.report(f"Dispatch: {len(latencies)}/{n} orders, {self.results['dispatch_orders_per_sec']} orders/s, "
+                    f"p50 {self.results['dispatch_latency_p50_ms']} ms, p99 {self.results['dispatch_latency_p99_ms']} ms")
+
+    def bench_tcp_ingest(self):
+        # Pipelined orders over the NDJSON stream API, timed until every "queued" event is back.
+        # The item has no shelf, so orders stay pending and are cancelled afterwards.
+        n = self.args.ingest_orders
+        sock = socket.create_connection(('127.0.0.1', self.coordinator.ingest_server.port), timeout=30)
+        payload = b"".join(json.dumps({"item": "item_bench_none", "quantity": 1, "order_id": f"ingest-{i}"}).encode('utf-8') + b"\n"
+                           for i in range(n))
+
+        queued = 0
+        buf = b""
+        start = time.perf_counter()
+        threading.Thread(target=sock.sendall, args=(payload,), daemon=True).start()
+        try:
+            while queued < n:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+                lines = buf.split(b"\n")
+                buf = lines.pop()
+                queued += sum(1 for line in lines if b'"queued"' in line)
+        except socket.timeout:
+            pass
+        elapsed = time.perf_counter() - start
+
+        cancels = b"".join(json.dumps({"command": "CANCEL", "order_id": f"ingest-{i}"}).encode('utf-8') + b"\n" for i in range(n))
+        with contextlib.suppress(OSError):
+            sock.sendall(cancels)
+        wait_for(lambda: not self.coordinator.pending_orders, timeout=10)
+        sock.close()
+
+        self.results["ingest_orders_per_sec"] = round(queued / elapsed, 1)
+        self.report(f"TCP ingest: {queued}/{n} orders acknowledged, {self.results['ingest_orders_per_sec']} orders/s")
+
+    def bench_warm_start(self):
+        # A second coordinator started against the running stack, with one order waiting for it.
+        # The gateway already knows the fleet, so the snapshot should make it dispatch right away
+        # instead of after the next robot and shelf heartbeats.
+        coordinator = self.coordinator_mod.FleetCoordinator(GROUP_ID)
+        self.components.append(coordinator)
+        threading.Thread(target=coordinator.run, daemon=True).start()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        order = {"item": "item_A", "quantity": 1, "order_id": "warm-start-0"}
+        sock.sendto(json.dumps(order).encode('utf-8'), ('127.0.0.1', coordinator.udp_socket.getsockname()[1]))
+        sock.close()
+        wait_for(lambda: coordinator.first_dispatch_at is not None, timeout=15)
+
+        if coordinator.first_dispatch_at is None:
+            self.report("Warm start: no dispatch within 15s")
+            return
+        self.results["warm_start_first_dispatch_ms"] = round(coordinator.first_dispatch_at * 1000.0, 1)
+        self.report(f"Warm start: first dispatch {self.results['warm_start_first_dispatch_ms']} ms after start "
+                    f"(snapshot applied after {(coordinator.snapshot_applied_at or 0) * 1000.0:.0f} ms)")
+
+    def bench_memory(self):
+        # Bytes retained per entity in coordinator and monitor state (no broker involved)
+        # Fresh, non-running instances so the live loops don't iterate state while it grows
+        count = self.args.entities
+        coordinator = self.coordinator_mod.FleetCoordinator(GROUP_ID)
+        monitor = self.monitor_mod.SystemMonitor(GROUP_ID)
+
+        def measure(fn):
+            gc.collect()
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            gc.collect()
+            after = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return round((after - before) / count, 1)
+
+        def add_robots():
+            for i in range(count):
+                coordinator.update_robot_state(f"MEM-{i}", {
+                    "robot_id": f"MEM-{i}", "timestamp": "2025-01-01T00:00:00Z",
+                    "location_id": "DOCK", "battery": 80, "status": "CHARGING"
+                })
+
+        def add_shelves():
+            for i in range(count):
+                coordinator.update_shelf_state(f"MS{i}", {
+                    "asset_id": f"MS{i}", "type": "SHELF", "item_id": f"item_M{i}",
+                    "stock": 2300.0, "unit": "kg", "original_stock": 100.0, "original_unit": "units"
+                })
+
+        def add_orders():
+            for i in range(count):
+                order = self.coordinator_mod.Order("mem-" + str(i), "item_ZZ", 1, "P1")
+                order.recv_ns = time.time_ns()
+                order.recv_mono = time.perf_counter()
+                coordinator.pending_orders.push(order)
+
+        def add_monitor_robots():
+            for i in range(count):
+                for _ in range(2):
+                    monitor.process_robot_status(f"MEM-{i}", {"status": "IDLE", "location_id": "DOCK", "battery": 80})
+
+        self.results["coordinator_bytes_per_robot"] = measure(add_robots)
+        self.results["coordinator_bytes_per_shelf"] = measure(add_shelves)
+        self.results["coordinator_bytes_per_order"] = measure(add_orders)
+        self.results["monitor_bytes_per_robot"] = measure(add_monitor_robots)
+
+        coordinator.udp_socket.close()
+        monitor.udp_socket.close()
+        self.report(f"Memory: robot {self.results['coordinator_bytes_per_robot']} B, shelf {self.results['coordinator_bytes_per_shelf']} B, "
+                    f"order {self.results['coordinator_bytes_per_order']} B (coordinator); robot {self.results['monitor_bytes_per_robot']} B (monitor)")
+
+    def bench_match_loop(self):
+        # Matching against a large backlog, offline: match_orders pending orders over a 500-robot
+        # fleet whose robots finish every task before the next pass. Covers queue memory per
+        # pending order and the process_orders + status handling cost per dispatched order.
+        count = self.args.match_orders
+        coordinator = self.coordinator_mod.FleetCoordinator(GROUP_ID)
+        coordinator.mqtt_client.publish = lambda *args, **kwargs: NullPublish
+        robots = [f"MATCH-{i}" for i in range(500)]
+        for i in range(200):
+            coordinator.update_shelf_state(f"MS{i}", {"asset_id": f"MS{i}", "type": "SHELF", "item_id": f"item_M{i % 100}",
+                                                      "stock": 1e9, "unit": "kg", "original_stock": 1e9})
+        done = dict.fromkeys(robots, 0)
+        for robot_id in robots:
+            coordinator.update_robot_state(robot_id, {"robot_id": robot_id, "battery": 100, "status": "IDLE", "tasks_completed": 0})
+        for station_id in ("P1", "P2", "P3", "P4"):
+            coordinator.stations.overrides[station_id.lower()] = str(len(robots))
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            coordinator.ingest_order({"item": f"item_M{i % 100}", "quantity": 1, "pack_station": f"P{i % 4 + 1}",
+                                      "order_id": f"match-{i}", "priority": i % 3}, log=False)
+        gc.collect()
+        bytes_per_order = (tracemalloc.get_traced_memory()[0] - before) / count
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        while coordinator.pending_orders:
+            coordinator.process_orders()
+            if not coordinator.robot_assignments:
+                break
+            for robot_id in list(coordinator.robot_assignments):
+                coordinator.update_robot_state(robot_id, {"robot_id": robot_id, "battery": 100, "status": "MOVING_TO_PICK",
+                                                          "tasks_completed": done[robot_id]})
+                done[robot_id] += 1
+                coordinator.update_robot_state(robot_id, {"robot_id": robot_id, "battery": 100, "status": "IDLE",
+                                                          "tasks_completed": done[robot_id]})
+        elapsed = time.perf_counter() - start
+        coordinator.udp_socket.close()
+        if coordinator.ingest_server:
+            coordinator.ingest_server.shutdown()
+
+        self.results["match_bytes_per_pending_order"] = round(bytes_per_order, 1)
+        self.results["match_orders_per_sec"] = round(coordinator.completed_orders / elapsed, 1)
+        self.report(f"Match loop: {coordinator.completed_orders} orders over {len(robots)} robots in {elapsed:.2f}s "
+                    f"({self.results['match_orders_per_sec']} orders/s), {bytes_per_order:.0f} B per pending order "
+                    f"({count} queued, dedup window included)")
+
+    def bench_telemetry_rate(self):
+        # Status messages from an idle-heavy fleet, offline in simulated seconds: real AMRRobot
+        # and ShelfSensor objects, busy_share of the robots taking one task after another and the
+        # rest idle. The reference is what they sent before publish-on-change: every robot once
+        # per tick, every shelf once per 5 s loop plus once per pick.
+        catalog = self.robot_mod.CATALOG
+        seconds = self.args.telemetry_seconds
+        robots = [self.robot_mod.AMRRobot(GROUP_ID, f"TEL-{i}") for i in range(self.args.telemetry_robots)]
+        for robot in robots:
+            robot.faults["stall_probability"] = 0
+            robot.client.publish = lambda *args, **kwargs: NullPublish
+        shelves = {}
+        for shelf_id in catalog.shelf_names[1:]:
+            zone = catalog.zone_names[catalog.shelf_zone[catalog.shelf_codes[shelf_id]]]
+            shelf = shelves[shelf_id] = self.shelf_mod.ShelfSensor(GROUP_ID, zone, shelf_id, 5)
+            shelf.stock = 1000000
+            shelf.client.publish = lambda *args, **kwargs: NullPublish
+        shelf_codes = [catalog.shelf_codes[shelf_id] for shelf_id in shelves]
+        station_codes = [catalog.station_codes[station_id] for station_id in catalog.stations] or [0]
+        busy = robots[:int(len(robots) * self.args.busy_share)]
+
+        picks = 0
+        start = time.time()
+        for tick in range(seconds):
+            now = start + tick
+            for i, robot in enumerate(busy):
+                if robot.state == "IDLE":
+                    if robot.battery < self.robot_mod.BATTERY_LOW_THRESHOLD:
+                        robot.handle_force_charge()
+                    else:
+                        robot.handle_execute_task(shelf_codes[(tick + i) % len(shelf_codes)],
+                                                  station_codes[(tick + i) % len(station_codes)])
+            for robot in robots:
+                robot.update_logic()
+                robot.publish_status(now)
+                if robot.state == "PICKING" and robot.state_timer == 0:
+                    shelf = shelves[robot.target_shelf]
+                    shelf.stock -= 1
+                    shelf.publish_status(now)
+                    picks += 1
+            if tick % 5 == 0:
+                for shelf in shelves.values():
+                    shelf.publish_status(now)
+
+        robot_sent = sum(robot.telemetry.sent for robot in robots)
+        shelf_sent = sum(shelf.telemetry.sent for shelf in shelves.values())
+        reference = len(robots) * seconds + len(shelves) * (seconds // 5) + picks
+        self.results["telemetry_msgs_per_robot_sec"] = round(robot_sent / (len(robots) * seconds), 3)
+        self.results["telemetry_reduction_pct"] = round((1.0 - (robot_sent + shelf_sent) / reference) * 100.0, 1)
+        self.report(f"Telemetry: {len(robots)} robots ({len(busy)} busy) and {len(shelves)} shelves over {seconds}s sent "
+                    f"{robot_sent + shelf_sent} status messages instead of {reference} "
+                    f"({self.results['telemetry_reduction_pct']}% fewer); {self.results['telemetry_msgs_per_robot_sec']} "
+                    f"per robot-second, keepalive {self.robot_mod.ROBOT_KEEPALIVE:g}s")
+
+    def teardown(self):
+        for component in self.components:
+            with contextlib.suppress(Exception):
+                component.mqtt_client.disconnect()
+        with contextlib.suppress(Exception):
+            self.sink.loop_stop()
+            self.sink.disconnect()
+        if self.broker:
+            self.broker.stop()
+
+    def report(self, line):
+        # Component chatter is redirected to the log; benchmark summaries go to the console
+        sys.__stdout__.write(line + "\n")
+        sys.__stdout__.flush()
+
+    def run(self):
+        log = open(self.args.log, 'a') if self.args.log else open(os.devnull, 'w')
+        try:
+            self.setup()
+            with contextlib.redirect_stdout(log):
+                self.start_stack()
+                self.bench_gateway_throughput()
+                self.bench_dispatch()
+                self.bench_tcp_ingest()
+                self.bench_warm_start()
+                self.bench_memory()
+                self.bench_match_loop()
+                self.bench_telemetry_rate()
+        finally:
+            with contextlib.redirect_stdout(log):
+                self.teardown()
+            log.close()
+        return self.results
+
+def compare(results, baseline, tolerance):
+    # Returns the list of metrics that regressed by more than tolerance (fraction)
+    regressions = []
+    print(f"{'Metric':<32}{'Baseline':>14}{'Current':>14}{'Change':>10}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<32}{'-':>14}{current:>14}{'new':>10}")
+            continue
+        change = (current - base) / base if base else 0.0
+        worse = -change if HIGHER_IS_BETTER.get(name, True) else change
+        flag = " REGRESSION" if worse > tolerance else ""
+        print(f"{name:<32}{base:>14}{current:>14}{change * 100:>9.1f}%{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Warehouse stack benchmarks with an embedded MQTT broker")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results file")
+    parser.add_argument("--compare", default=None, help="Baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression as a fraction (default 0.10)")
+    parser.add_argument("--robots", type=int, default=20)
+    parser.add_argument("--shelves", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=20000, help="Telemetry messages for the gateway benchmark")
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--order-rate", type=float, default=200.0, help="Orders per second for the dispatch benchmark")
+    parser.add_argument("--ingest-orders", type=int, default=20000, help="Pipelined orders for the TCP ingest benchmark")
+    parser.add_argument("--entities", type=int, default=10000, help="Entities for the memory benchmark")
+    parser.add_argument("--match-orders", type=int, default=100000, help="Pending orders for the match loop benchmark")
+    parser.add_argument("--telemetry-robots", type=int, default=200, help="Robots for the telemetry rate benchmark")
+    parser.add_argument("--busy-share", type=float, default=0.1, help="Share of those robots kept busy")
+    parser.add_argument("--telemetry-seconds", type=int, default=600, help="Simulated seconds for the telemetry rate benchmark")
+    parser.add_argument("--log", default=None, help="File for component output (default: discarded)")
+    args = parser.parse_args()
+
+    # Components and outputs are resolved relative to the repo, not the scratch directory
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    if args.log:
+        args.log = os.path.abspath(args.log)
+
+    results = BenchmarkSuite(args).run()
+    record = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "log")},
+        "results": results
+    }
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed beyond {args.tolerance * 100:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import argparse
+import configparser
+from array import array
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+CATALOG_PATH = config.get('catalog', 'path', fallback='catalog.json')
+
+UNKNOWN = 0  # Code 0 is reserved: "S0"/"P0" in charge commands and anything not in the catalog
+
+class Catalog:
+    # Items, shelves, zones and stations mapped to dense integer codes (1..n), loaded once.
+    # Per-shelf tables are arrays indexed by shelf code, so hot paths do one dict lookup for
+    # the name and array reads after that. item -> shelves is stored CSR-style (offsets into
+    # one flat array) to stay compact with tens of thousands of SKUs.
+    def __init__(self, data):
+        self.default_kg_per_unit = float(data.get("default_kg_per_unit", 23.0))
+
+        self.zone_names = [""]
+        self.zone_codes = {}
+        self.zone_units = [""]
+        for zone in data.get("zones", []):
+            self.zone_codes[zone["zone_id"]] = len(self.zone_names)
+            self.zone_names.append(zone["zone_id"])
+            self.zone_units.append(zone.get("unit", "units"))
+
+        self.item_names = [""]
+        self.item_codes = {}
+        self.item_kg_per_unit = array('d', [self.default_kg_per_unit])
+        for item in data.get("items", []):
+            self.item_codes[item["item_id"]] = len(self.item_names)
+            self.item_names.append(item["item_id"])
+            self.item_kg_per_unit.append(float(item.get("kg_per_unit", self.default_kg_per_unit)))
+
+        self.station_names = [""]
+        self.station_codes = {}
+        for station_id in data.get("stations", []):
+            self.station_codes[station_id] = len(self.station_names)
+            self.station_names.append(station_id)
+
+        self.shelf_names = [""]
+        self.shelf_codes = {}
+        self.legacy_codes = {}  # Names outside the catalog, cached after their first lookup
+        self.shelf_item = array('i', [UNKNOWN])
+        self.shelf_zone = array('i', [UNKNOWN])
+        self.shelf_kg_per_unit = array('d', [self.default_kg_per_unit])
+        for shelf in data.get("shelves", []):
+            item_code = self.item_codes.get(shelf.get("item_id"), UNKNOWN)
+            self.shelf_codes[shelf["shelf_id"]] = len(self.shelf_names)
+            self.shelf_names.append(shelf["shelf_id"])
+            self.shelf_item.append(item_code)
+            self.shelf_zone.append(self.zone_codes.get(shelf.get("zone"), UNKNOWN))
+            self.shelf_kg_per_unit.append(self.item_kg_per_unit[item_code])
+
+        # item code -> shelf codes: shelves of item i are item_shelves[item_offsets[i]:item_offsets[i + 1]]
+        counts = [0] * (len(self.item_names) + 1)
+        for item_code in self.shelf_item[1:]:
+            counts[item_code + 1] += 1
+        self.item_offsets = array('i', [0] * len(counts))
+        for i in range(1, len(counts)):
+            self.item_offsets[i] = self.item_offsets[i - 1] + counts[i]
+        self.item_shelves = array('i', [0] * (len(self.shelf_names) - 1))
+        fill = array('i', self.item_offsets)
+        for shelf_code in range(1, len(self.shelf_names)):
+            item_code = self.shelf_item[shelf_code]
+            self.item_shelves[fill[item_code]] = shelf_code
+            fill[item_code] += 1
+
+    def __repr__(self):
+        return (f"Catalog({len(self.item_names) - 1} items, {len(self.shelf_names) - 1} shelves, "
+                f"{len(self.zone_names) - 1} zones, {len(self.station_names) - 1} stations)")
+
+    def legacy_code(self, name):
+        # IDs outside the catalog keep their old numeric meaning ("S12" -> 12), parsed once
+        code = self.legacy_codes.get(name)
+        if code is None:
+            digits = "".join(ch for ch in str(name) if ch.isdigit())
+            code = self.legacy_codes[name] = int(digits) if digits else UNKNOWN
+            if code:
+                print(f"WARNING: {name} is not in the catalog, using legacy code {code}")
+        return code
+
+    def shelf_code(self, shelf_id):
+        code = self.shelf_codes.get(shelf_id)
+        return code if code is not None else self.legacy_code(shelf_id)
+
+    def station_code(self, station_id):
+        code = self.station_codes.get(station_id)
+        return code if code is not None else self.legacy_code(station_id)
+
+    def item_code(self, item_id):
+        return self.item_codes.get(item_id, UNKNOWN)
+
+    def shelf_name(self, code):
+        return self.shelf_names[code] if 0 < code < len(self.shelf_names) else f"S{code}"
+
+    def station_name(self, code):
+        return self.station_names[code] if 0 < code < len(self.station_names) else f"P{code}"
+
+    def item_for_shelf(self, shelf_id):
+        code = self.shelf_codes.get(shelf_id)
+        if code is None:
+            return None
+        return self.item_names[self.shelf_item[code]] or None
+
+    def unit_for_shelf(self, shelf_id, fallback="units"):
+        code = self.shelf_codes.get(shelf_id)
+        if code is None:
+            return fallback
+        return self.zone_units[self.shelf_zone[code]] or fallback
+
+    def kg_per_unit(self, shelf_id):
+        code = self.shelf_codes.get(shelf_id)
+        if code is None:
+            return self.default_kg_per_unit
+        return self.shelf_kg_per_unit[code]
+
+    def shelves_for_item(self, item_id):
+        code = self.item_codes.get(item_id)
+        if code is None:
+            return []
+        names = self.shelf_names
+        return [names[s] for s in self.item_shelves[self.item_offsets[code]:self.item_offsets[code + 1]]]
+
+    def stocked_items(self):
+        # Items with at least one shelf, in catalog order
+        return [name for code, name in enumerate(self.item_names)
+                if code and self.item_offsets[code + 1] > self.item_offsets[code]]
+
+    @property
+    def stations(self):
+        return self.station_names[1:]
+
+_catalog = None
+
+def load_catalog(path=None):
+    # Loaded once per process; without a catalog file every ID falls back to its legacy numeric code
+    global _catalog
+    if _catalog is None or path is not None:
+        path = path or CATALOG_PATH
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print(f"WARNING: catalog {path} not found, using legacy shelf and station codes")
+            data = {}
+        _catalog = Catalog(data)
+    return _catalog
+
+def generate(num_shelves, num_items, num_stations):
+    # Synthetic catalog for scale tests: shelves alternate between the two zones, items round-robin
+    items = [{"item_id": f"item_{i + 1}", "kg_per_unit": 23.0} for i in range(num_items)]
+    shelves = [{"shelf_id": f"S{i + 1}", "zone": "storage-a" if i % 2 == 0 else "storage-b",
+                "item_id": items[i % num_items]["item_id"]} for i in range(num_shelves)]
+    return {
+        "default_kg_per_unit": 23.0,
+        "zones": [{"zone_id": "storage-a", "unit": "units"}, {"zone_id": "storage-b", "unit": "kg"}],
+        "stations": [f"P{i + 1}" for i in range(num_stations)],
+        "items": items,
+        "shelves": shelves,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or generate the item and asset catalog")
+    sub = parser.add_subparsers(dest="command")
+    show = sub.add_parser("show", help="Summarize a catalog file")
+    show.add_argument("path", nargs="?", default=CATALOG_PATH)
+    gen = sub.add_parser("generate", help="Write a synthetic catalog for scale tests")
+    gen.add_argument("--shelves", type=int, default=20000)
+    gen.add_argument("--items", type=int, default=20000)
+    gen.add_argument("--stations", type=int, default=3)
+    gen.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        with open(args.output, 'w') as f:
+            json.dump(generate(args.shelves, args.items, args.stations), f)
+        print(f"Wrote {args.shelves} shelves, {args.items} items to {args.output}")
+    elif args.command == "show":
+        if not os.path.exists(args.path):
+            print(f"{args.path} not found")
+            sys.exit(1)
+        print(load_catalog(args.path))
+    else:
+        parser.print_help()
@@ -0,0 +1,155 @@
+import time
+from collections import deque
+
+CHARGING_STATES = ["MOVING_TO_CHARGE", "CHARGING"]
+WORKING_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"]
+
+class ChargingScheduler:
+    RESERVATION_GRACE = 5.0
+
+    def __init__(self, num_chargers, low_threshold, battery_decay, trip_seconds,
+                 charge_travel_seconds=2, opportunistic_level=60.0, stagger_interval=30.0,
+                 prediction_horizon=20.0, smoothing=0.2):
+        self.num_chargers = num_chargers
+        self.low_threshold = low_threshold
+        self.default_decay = battery_decay      # % per active second until observed
+        self.trip_seconds = trip_seconds        # Active seconds for one pick/drop trip
+        self.charge_travel_seconds = charge_travel_seconds
+        self.opportunistic_level = opportunistic_level
+        self.stagger_interval = stagger_interval
+        self.prediction_horizon = prediction_horizon
+        self.smoothing = smoothing
+
+        # Charger occupancy and waiting line
+        self.charging = set()
+        self.reserved = {}                      # robot_id -> time a charger was granted
+        self.queue = deque()
+        self.recommended = set()                # Robots flagged by the Monitor's battery forecast
+        self.last_opportunistic = 0
+
+        # Per-robot decay tracking: robot_id -> [last_ts, last_battery, active_rate]
+        self.samples = {}
+
+    def observe(self, robot_id, battery, status, now=None):
+        # Update decay estimate and charger occupancy from a robot status
+        now = now if now is not None else time.time()
+        sample = self.samples.get(robot_id)
+        if sample is None:
+            self.samples[robot_id] = [now, battery, self.default_decay]
+        else:
+            last_ts, last_battery, rate = sample
+            dt = now - last_ts
+            drop = last_battery - battery
+            # Only active drain informs the rate; charging and idle are excluded
+            if status in WORKING_STATES and dt > 0 and drop > 0:
+                observed = drop / dt
+                rate = (1 - self.smoothing) * rate + self.smoothing * observed
+            sample[0] = now
+            sample[1] = battery
+            sample[2] = rate
+
+        if status in CHARGING_STATES:
+            self.charging.add(robot_id)
+            self.reserved.pop(robot_id, None)
+            self.recommended.discard(robot_id)
+            if robot_id in self.queue:
+                self.queue.remove(robot_id)
+        elif robot_id in self.reserved and now - self.reserved[robot_id] < self.RESERVATION_GRACE:
+            # Command still in flight, keep the charger held
+            pass
+        elif robot_id in self.charging:
+            self.reserved.pop(robot_id, None)
+            self.charging.discard(robot_id)
+            print(f"Charger released by {robot_id} ({len(self.charging)}/{self.num_chargers} in use)")
+
+    def recommend(self, robot_id):
+        # Charge this robot the next time it is idle, regardless of its own prediction
+        if robot_id not in self.charging:
+            print(f"Charge recommended for {robot_id}")
+            self.recommended.add(robot_id)
+
+    def forget(self, robot_id):
+        self.samples.pop(robot_id, None)
+        self.recommended.discard(robot_id)
+        self.charging.discard(robot_id)
+        self.reserved.pop(robot_id, None)
+        if robot_id in self.queue:
+            self.queue.remove(robot_id)
+
+    def decay_rate(self, robot_id):
+        sample = self.samples.get(robot_id)
+        return sample[2] if sample else self.default_decay
+
+    def time_to_threshold(self, robot_id):
+        # Seconds of active work left before the robot crosses the low threshold
+        sample = self.samples.get(robot_id)
+        if sample is None:
+            return float("inf")
+        rate = sample[2]
+        if rate <= 0:
+            return float("inf")
+        return max(0.0, (sample[1] - self.low_threshold) / rate)
+
+    def can_complete_trip(self, robot_id, battery):
+        # A trip is only accepted if the robot can still reach a charger afterwards
+        rate = self.decay_rate(robot_id)
+        needed = (self.trip_seconds + self.charge_travel_seconds) * rate
+        return battery - needed >= self.low_threshold
+
+    def is_waiting(self, robot_id):
+        return robot_id in self.queue
+
+    def is_held(self, robot_id):
+        # Robot is charging, waiting for a charger or due to charge: don't dispatch it
+        return robot_id in self.charging or robot_id in self.queue or robot_id in self.recommended
+
+    def free_chargers(self):
+        return self.num_chargers - len(self.charging)
+
+    def plan(self, idle_robots, pending_orders, now=None):
+        # Returns the robots that should be sent to a charger right now.
+        # idle_robots: {robot_id: battery} for robots that are IDLE and unassigned.
+        now = now if now is not None else time.time()
+
+        # Queue robots that cannot finish another trip or will soon run dry
+        urgent = []
+        for robot_id, battery in idle_robots.items():
+            if robot_id in self.charging or robot_id in self.queue:
+                continue
+            ttt = self.time_to_threshold(robot_id)
+            if robot_id in self.recommended or not self.can_complete_trip(robot_id, battery) or ttt < self.prediction_horizon:
+                urgent.append((ttt, robot_id))
+        for _, robot_id in sorted(urgent):
+            print(f"Queueing {robot_id} for charging (time-to-threshold {self.time_to_threshold(robot_id):.0f}s)")
+            self.queue.append(robot_id)
+
+        # Drop queue entries for robots that are no longer idle
+        for robot_id in list(self.queue):
+            if robot_id not in idle_robots:
+                self.queue.remove(robot_id)
+
+        to_charge = []
+        free = self.free_chargers()
+        while free > 0 and self.queue:
+            robot_id = self.queue.popleft()
+            to_charge.append(robot_id)
+            free -= 1
+
+        # Opportunistic charging into idle gaps, staggered so robots don't drain in lockstep.
+        # One charger is kept free for urgent requests.
+        if not pending_orders and not self.queue and free > 1 and now - self.last_opportunistic >= self.stagger_interval:
+            candidates = [
+                (battery, robot_id) for robot_id, battery in idle_robots.items()
+                if battery < self.opportunistic_level and robot_id not in to_charge and robot_id not in self.charging
+            ]
+            if candidates:
+                _, robot_id = min(candidates)
+                print(f"Opportunistic charge for {robot_id} ({idle_robots[robot_id]}%)")
+                to_charge.append(robot_id)
+                self.last_opportunistic = now
+
+        # Reserve chargers immediately so the next plan() doesn't oversubscribe
+        for robot_id in to_charge:
+            self.charging.add(robot_id)
+            self.reserved[robot_id] = now
+        return to_charge
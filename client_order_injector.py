@@ -3,14 +3,28 @@ import sys
 import time
 import json
 import random
+from catalog import load_catalog
 
-def send_udp_message(payload, port=9091):
+CATALOG = load_catalog()
+STATIONS = CATALOG.stations or ["P1", "P2", "P3"]
+ITEMS = CATALOG.stocked_items()
+ITEM_HINT = f"{ITEMS[0]} ... {ITEMS[-1]}" if ITEMS else "see catalog.json"
+
+def send_udp_message(payload, port=9091, wait_ack=False):
     target_address = ('127.0.0.1', port)
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.sendto(json.dumps(payload).encode('utf-8'), target_address)
-        sock.close()
         print(f"Sent to {port}: {payload}")
+        if wait_ack:
+            # The Coordinator acknowledges orders (and answers retries with the original outcome)
+            sock.settimeout(0.5)
+            try:
+                data, _ = sock.recvfrom(1024)
+                print(f"Ack: {data.decode('utf-8')}")
+            except (socket.timeout, ConnectionResetError):
+                print("No ack received")
+        sock.close()
     except Exception as e:
         print(f"Error sending message: {e}")
 
@@ -34,59 +48,66 @@ def main():
         print("2. Send Multiple Orders to same station (Batch)")
         print("3. Send Mixed Orders (P1, P2, P3)")
         print("4. Send Force Charge")
+        print("5. Cancel Pending Order")
         print("9. Exit")
         
         choice = input("Select option: ")
         
         if choice == '1':
             while True:
-                item = input("Item ID (item_A ... item_J): ") or "item_B"
+                item = input(f"Item ID ({ITEM_HINT}): ") or "item_B"
                 # Auto-fix commonly made lowercase mistakes
                 if item.startswith("item_") and item[-1].islower():
                     item = item[:-1] + item[-1].upper()
                     print(f"Auto-corrected to {item}")
                 
-                if item.startswith("item_"):
+                if CATALOG.item_code(item):
                     break
-                print("Invalid Item ID. Must start with 'item_'.")
+                print(f"Unknown Item ID. Must be a catalog item ({ITEM_HINT}).")
             
             qty = input("Quantity (e.g., 10): ") or "10"
             
             while True:
-                station = input("Pack Station (P1, P2, P3): ") or "P1"
-                if station in ["P1", "P2", "P3"]:
+                station = input(f"Pack Station ({', '.join(STATIONS)}): ") or "P1"
+                if station in STATIONS:
                     break
-                print("Invalid Station. Must be P1, P2, or P3.")
+                print(f"Invalid Station. Must be one of {', '.join(STATIONS)}.")
+
+            priority = input("Priority (0 normal, 1 high, 2 urgent): ") or "0"
+            due_in = input("Due in seconds (blank for default): ")
             
             order = {
                 "item": item,
                 "quantity": int(qty),
                 "pack_station": station,
-                "order_id": f"ord-{int(time.time()*1000)}"
+                "order_id": f"ord-{int(time.time()*1000)}",
+                "priority": int(priority)
             }
-            send_udp_message(order, port=9091)
+            if due_in:
+                order["due_in"] = float(due_in)
+            send_udp_message(order, port=9091, wait_ack=True)
             
         elif choice == '2':
             # Batch
             count = int(input("How many orders? ") or "4")
             
             while True:
-                item = input("Item ID (item_A ... item_J): ") or "item_B"
+                item = input(f"Item ID ({ITEM_HINT}): ") or "item_B"
                 if item.startswith("item_") and item[-1].islower():
                     item = item[:-1] + item[-1].upper()
                     print(f"Auto-corrected to {item}")
                     
-                if item.startswith("item_"):
+                if CATALOG.item_code(item):
                     break
-                print("Invalid Item ID. Must start with 'item_'.")
+                print(f"Unknown Item ID. Must be a catalog item ({ITEM_HINT}).")
                 
             qty = input("Quantity per Order (e.g., 10): ") or "10"
             
             while True:
-                station = input("Pack Station (P1, P2, P3): ") or "P1"
-                if station in ["P1", "P2", "P3"]:
+                station = input(f"Pack Station ({', '.join(STATIONS)}): ") or "P1"
+                if station in STATIONS:
                     break
-                print("Invalid Station. Must be P1, P2, or P3.")
+                print(f"Invalid Station. Must be one of {', '.join(STATIONS)}.")
             
             for i in range(count):
                 order = {
@@ -95,7 +116,7 @@ def main():
                     "pack_station": station,
                     "order_id": f"ord-{int(time.time()*1000)}-{i}"
                 }
-                send_udp_message(order, port=9091)
+                send_udp_message(order, port=9091, wait_ack=True)
                 # Small delay to ensure separate UDP packets
                 time.sleep(0.1)
                 
@@ -116,13 +137,14 @@ def main():
                     "pack_station": target_station,
                     "order_id": f"ord-mix-{int(time.time())}-{i}"
                 }
-                send_udp_message(order, port=9091)
+                send_udp_message(order, port=9091, wait_ack=True)
                 time.sleep(0.5) # Slower injection to observe routing
 
         elif choice == '4':
             # Force Charge (To Monitor -> Gateway -> Robot)
             r_id = input("Robot ID (e.g. AMR-1): ") or "AMR-1"
             payload = {
+                "group_id": group_id,
                 "robot_id": r_id,
                 "level": "CRITICAL",
                 "override_task": "FORCE_CHARGE"
@@ -130,6 +152,11 @@ def main():
             g_port = int(input("Gateway UDP Port (default 9090? Check gateway): ") or "9090")
             send_udp_message(payload, port=g_port)
 
+        elif choice == '5':
+            order_id = input("Order ID to cancel: ")
+            if order_id:
+                send_udp_message({"command": "CANCEL", "order_id": order_id}, port=9091)
+
         elif choice == '9':
             print("Exiting.")
             break
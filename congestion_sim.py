@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import contextlib
+import importlib
+from benchmark_suite import BENCH_CONFIG, GROUP_ID, NullPublish, percentile
+
+# Robot state durations in ticks (seconds), as in amr_robot.py
+DURATION_MOVING_TO_PICK = 3
+DURATION_PICKING = 1
+DURATION_MOVING_TO_DROP = 2
+DURATION_DROPPING = 1
+TASK_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"]
+
+# Shelf policies compared by default: (name, balance, max_robots); max_robots None = --max-robots
+POLICIES = [
+    ("first-shelf", False, 0),
+    ("limit-only", False, None),
+    ("balanced", True, None),
+]
+
+class SimRobot:
+    __slots__ = ("robot_id", "state", "timer", "shelf", "queue", "tasks_completed", "arrived_at")
+
+    def __init__(self, robot_id):
+        self.robot_id = robot_id
+        self.state = "IDLE"
+        self.timer = 0
+        self.shelf = None
+        self.queue = []  # Shelves of tasks accepted while busy
+        self.tasks_completed = 0
+        self.arrived_at = None
+
+class SimShelf:
+    # A shelf with a fixed number of pick faces; robots that arrive while every face is
+    # taken wait in line, and that wait is what the shelf policy is judged on
+    __slots__ = ("shelf_id", "item_id", "stock", "faces", "picking", "line", "picks")
+
+    def __init__(self, shelf_id, item_id, stock, faces):
+        self.shelf_id = shelf_id
+        self.item_id = item_id
+        self.stock = stock
+        self.faces = faces
+        self.picking = []
+        self.line = []
+        self.picks = 0
+
+class CongestionSim:
+    # Drives an offline FleetCoordinator (real matching and shelf arbitration, no broker) with
+    # simulated robots and shelves in one-second ticks. Robots travel to the shelf, queue for a
+    # pick face, pick, drop and chain into a queued task like amr_robot.py. A share of the orders
+    # is for one hot item stocked on several shelves; the rest spread over single-shelf items.
+    def __init__(self, args, coordinator_mod, balance, max_robots):
+        self.args = args
+        self.queue_depth = coordinator_mod.TASK_QUEUE_DEPTH
+        self.coordinator = coordinator_mod.FleetCoordinator(GROUP_ID)
+        self.coordinator.shelf_balance = balance
+        self.coordinator.shelf_max_robots = max_robots
+        self.coordinator.charging_scheduler.can_complete_trip = lambda robot_id, battery: True
+        self.commands = []
+        self.coordinator.mqtt_client.publish = self.capture
+
+        self.shelves = {}
+        for i in range(args.hot_shelves):
+            self.add_shelf(f"HOT-{i + 1}", "item_hot")
+        for i in range(args.items):
+            self.add_shelf(f"S{i + 1}", f"item_{i + 1}")
+        self.robots = [SimRobot(f"SIM-{i + 1}") for i in range(args.robots)]
+        self.random = random.Random(args.seed)
+        self.sent = 0
+        self.waits = []
+        self.peak_line = 0
+
+    def add_shelf(self, shelf_id, item_id):
+        self.shelves[shelf_id] = SimShelf(shelf_id, item_id, self.args.stock, self.args.faces)
+
+    def capture(self, topic, payload=None, qos=0, retain=False):
+        self.commands.append(json.loads(payload))
+        return NullPublish
+
+    def deliver(self):
+        commands, self.commands = self.commands, []
+        robots = {robot.robot_id: robot for robot in self.robots}
+        for command in commands:
+            if command.get("command") == "EXECUTE_TASK":
+                robot = robots.get(command["robot_id"])
+                if robot.state == "IDLE":
+                    # A pre-assigned task that arrives after the drop is dropped, as amr_robot.py does
+                    if not command.get("queue_only"):
+                        self.start_task(robot, command["target_shelf_id"])
+                elif robot.state in TASK_STATES and len(robot.queue) < self.queue_depth:
+                    robot.queue.append(command["target_shelf_id"])
+            elif command.get("command") == "RESTOCK":
+                shelf = self.shelves.get(command["target_shelf_id"])
+                if shelf is not None:
+                    shelf.stock += command.get("quantity", 0)
+
+    def start_task(self, robot, shelf_id):
+        robot.state = "MOVING_TO_PICK"
+        robot.timer = 0
+        robot.shelf = shelf_id
+        robot.arrived_at = None
+
+    def step(self, now):
+        for robot in self.robots:
+            robot.timer += 1
+            if robot.state == "MOVING_TO_PICK":
+                if robot.arrived_at is None and robot.timer >= DURATION_MOVING_TO_PICK:
+                    robot.arrived_at = now
+                    self.shelves[robot.shelf].line.append(robot)
+            elif robot.state == "PICKING":
+                if robot.timer >= DURATION_PICKING:
+                    shelf = self.shelves[robot.shelf]
+                    shelf.picking.remove(robot)
+                    shelf.stock = max(0, shelf.stock - 1)
+                    shelf.picks += 1
+                    robot.state = "MOVING_TO_DROP"
+                    robot.timer = 0
+            elif robot.state == "MOVING_TO_DROP":
+                if robot.timer >= DURATION_MOVING_TO_DROP:
+                    robot.state = "DROPPING"
+                    robot.timer = 0
+            elif robot.state == "DROPPING":
+                if robot.timer >= DURATION_DROPPING:
+                    robot.tasks_completed += 1
+                    if robot.queue:
+                        self.start_task(robot, robot.queue.pop(0))
+                    else:
+                        robot.state = "IDLE"
+
+        # Robots in line take free pick faces in arrival order
+        for shelf in self.shelves.values():
+            self.peak_line = max(self.peak_line, len(shelf.line))
+            while shelf.line and len(shelf.picking) < shelf.faces:
+                robot = shelf.line.pop(0)
+                self.waits.append(now - robot.arrived_at)
+                shelf.picking.append(robot)
+                robot.state = "PICKING"
+                robot.timer = 0
+
+    def report_status(self):
+        coordinator = self.coordinator
+        for robot in self.robots:
+            coordinator.update_robot_state(robot.robot_id, {"robot_id": robot.robot_id, "status": robot.state,
+                                                            "battery": 100, "tasks_completed": robot.tasks_completed})
+        for shelf in self.shelves.values():
+            coordinator.update_shelf_state(shelf.shelf_id, {"asset_id": shelf.shelf_id, "item_id": shelf.item_id,
+                                                            "stock": shelf.stock, "original_stock": shelf.stock})
+
+    def feed_orders(self):
+        # Keep a backlog of a couple of orders per robot so the fleet is never short of work
+        coordinator = self.coordinator
+        while coordinator.pending_count() < 2 * len(self.robots):
+            if self.random.random() < self.args.hot_share:
+                item = "item_hot"
+            else:
+                item = f"item_{self.random.randint(1, self.args.items)}"
+            coordinator.ingest_order({"item": item, "quantity": 1, "order_id": f"sim-{self.sent}"}, log=False)
+            self.sent += 1
+
+    def run(self):
+        self.report_status()
+        for now in range(self.args.ticks):
+            self.feed_orders()
+            self.coordinator.process_orders()
+            self.deliver()
+            self.step(now)
+            self.report_status()
+        completed = sum(robot.tasks_completed for robot in self.robots)
+        waits = sorted(self.waits)
+        hot_picks = [self.shelves[f"HOT-{i + 1}"].picks for i in range(self.args.hot_shelves)]
+        self.coordinator.udp_socket.close()
+        if self.coordinator.ingest_server:
+            self.coordinator.ingest_server.shutdown()
+        return {
+            "completed": completed,
+            "tasks_per_minute": round(completed * 60.0 / self.args.ticks, 1),
+            "pick_wait_avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "pick_wait_p95": percentile(waits, 95) if waits else 0,
+            "pick_wait_max": waits[-1] if waits else 0,
+            "peak_line": self.peak_line,
+            "hot_shelf_picks": hot_picks,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick wait at congested shelves under the coordinator's shelf policies")
+    parser.add_argument("--robots", type=int, default=20)
+    parser.add_argument("--ticks", type=int, default=1800, help="Simulated seconds per policy")
+    parser.add_argument("--hot-shelves", type=int, default=4, help="Shelves holding the hot item")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="Share of orders for the hot item")
+    parser.add_argument("--items", type=int, default=20, help="Other items, one shelf each")
+    parser.add_argument("--faces", type=int, default=1, help="Robots that can pick at one shelf at a time")
+    parser.add_argument("--max-robots", type=int, default=2, help="Coordinator robot limit per shelf for the limited policies")
+    parser.add_argument("--stock", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--log", default=None, help="File for coordinator output (default: discarded)")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+    output = os.path.abspath(args.output) if args.output else None
+    log = open(os.path.abspath(args.log), 'a') if args.log else open(os.devnull, 'w')
+
+    # The coordinator reads config.ini at import; the benchmark config keeps it off the network
+    workdir = tempfile.mkdtemp(prefix="warehouse-congestion-")
+    with open(os.path.join(workdir, "config.ini"), 'w') as f:
+        f.write(BENCH_CONFIG.format(mqtt_port=1, catalog_path=os.path.join(repo_dir, "catalog.json")))
+    os.chdir(workdir)
+
+    results = {}
+    with contextlib.redirect_stdout(log):
+        coordinator_mod = importlib.import_module("fleet_coordinator")
+        for name, balance, max_robots in POLICIES:
+            # Same orders and the same robot draws for every policy
+            random.seed(args.seed)
+            max_robots = args.max_robots if max_robots is None else max_robots
+            results[name] = CongestionSim(args, coordinator_mod, balance, max_robots).run()
+    log.close()
+
+    print(f"{args.robots} robots, {args.ticks}s, {args.hot_share * 100:.0f}% of orders for one item on "
+          f"{args.hot_shelves} shelves, {args.faces} pick face(s) per shelf")
+    print(f"{'policy':<14}{'tasks/min':>10}{'wait avg':>10}{'p95':>6}{'max':>6}{'line':>6}  hot shelf picks")
+    for name, r in results.items():
+        print(f"{name:<14}{r['tasks_per_minute']:>10}{r['pick_wait_avg']:>10}{r['pick_wait_p95']:>6}"
+              f"{r['pick_wait_max']:>6}{r['peak_line']:>6}  {r['hot_shelf_picks']}")
+    if output:
+        with open(output, 'w') as f:
+            json.dump({"params": {k: v for k, v in vars(args).items() if k not in ("output", "log")},
+                       "results": results}, f, indent=2)
+        print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Outcomes after which the coordinator no longer holds the order
+TERMINAL_STATUSES = frozenset(("COMPLETED", "CANCELLED"))
+
+class DedupCache:
+    # Time-windowed LRU of recently seen order_ids and their latest outcome.
+    # Finished orders are bounded by max_entries and dropped window seconds after their last
+    # update or duplicate. Orders still live (queued, parked, held, dispatched) are pinned
+    # outside the window until a terminal outcome, however long they wait, so a retry can
+    # never queue them twice. Unlike a Bloom filter it has no false positives and can answer
+    # a duplicate with the original order's outcome.
+    def __init__(self, window=600.0, max_entries=100000):
+        self.window = window
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # finished order_id -> [last_update, outcome dict]
+        self.live = {}                # live order_id -> [last_update, outcome dict]
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.entries) + len(self.live)
+
+    def check(self, order_id, now=None):
+        # Returns the recorded outcome for a duplicate, or None (and remembers the id) for a new order
+        now = now if now is not None else time.time()
+        with self.lock:
+            entry = self.live.get(order_id)
+            if entry is None:
+                entry = self.entries.get(order_id)
+                if entry is not None and now - entry[0] <= self.window:
+                    self.entries.move_to_end(order_id)
+                else:
+                    entry = None
+            if entry is not None:
+                # A client still retrying keeps the entry in the window
+                entry[0] = now
+                self.hits += 1
+                return dict(entry[1])
+            self.misses += 1
+            self.entries.pop(order_id, None)
+            self.live[order_id] = [now, {"status": "RECEIVED"}]
+            self._expire(now)
+            return None
+
+    def update(self, order_id, status, now=None, **details):
+        # Record the latest outcome; a terminal one unpins the entry and starts its window
+        if not order_id:
+            return
+        now = now if now is not None else time.time()
+        with self.lock:
+            entry = self.live.get(order_id)
+            if entry is None:
+                entry = self.entries.get(order_id)
+                if entry is None:
+                    return
+            entry[0] = now
+            entry[1] = dict(details, status=status)
+            if status in TERMINAL_STATUSES:
+                if self.live.pop(order_id, None) is not None:
+                    self.entries[order_id] = entry
+                self.entries.move_to_end(order_id)
+                self._expire(now)
+            elif order_id not in self.live:
+                self.live[order_id] = self.entries.pop(order_id)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _expire(self, now):
+        entries = self.entries
+        while entries:
+            order_id, entry = next(iter(entries.items()))
+            if len(entries) <= self.max_entries and now - entry[0] <= self.window:
+                break
+            entries.popitem(last=False)
+            self.evicted += 1
@@ -0,0 +1,309 @@
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import configparser
+from mqtt_capture import topic_matches
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+UPSTREAM_HOST = config.get('mqtt', 'broker', fallback='127.0.0.1')
+UPSTREAM_PORT = config.getint('fault_proxy', 'upstream_port', fallback=1883)
+PROXY_PORT = config.getint('fault_proxy', 'port', fallback=1884)
+
+PUBLISH = 3
+PUBACK = 4
+FLAG_DUP = 0x08
+
+# Faults run in this order when no schedule file is given (seconds; delays in ms)
+DEFAULT_SCHEDULE = [
+    {"name": "loss-10", "duration": 30, "loss": 0.10},
+    {"name": "latency-200ms", "duration": 30, "delay_ms": 200, "jitter_ms": 100},
+    {"name": "reorder-20", "duration": 30, "reorder": 0.20},
+    {"name": "duplicate-10", "duration": 30, "duplicate": 0.10},
+    {"name": "broker-restart", "duration": 10, "disconnect": True, "down_seconds": 5},
+]
+
+class Impairment:
+    # What happens to traffic while one fault is active. Loss, reordering and duplication only
+    # touch PUBLISH packets (optionally only on matching topics); delay applies to every packet
+    # so MQTT sessions stay valid. direction is "up" (client -> broker), "down" or "both".
+    __slots__ = ("name", "loss", "delay_ms", "jitter_ms", "reorder", "duplicate", "direction", "topics")
+
+    def __init__(self, name="clean", loss=0.0, delay_ms=0.0, jitter_ms=0.0, reorder=0.0, duplicate=0.0,
+                 direction="both", topics=None):
+        self.name = name
+        self.loss = loss
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.reorder = reorder
+        self.duplicate = duplicate
+        self.direction = direction
+        self.topics = topics or None
+
+    @classmethod
+    def from_phase(cls, phase):
+        return cls(phase.get("name", "fault"), phase.get("loss", 0.0), phase.get("delay_ms", 0.0),
+                   phase.get("jitter_ms", 0.0), phase.get("reorder", 0.0), phase.get("duplicate", 0.0),
+                   phase.get("direction", "both"), phase.get("topics"))
+
+    def applies(self, direction, topic=None):
+        if self.direction != "both" and self.direction != direction:
+            return False
+        if topic is None or self.topics is None:
+            return True
+        return any(topic_matches(f, topic) for f in self.topics)
+
+CLEAN = Impairment()
+
+async def read_packet(reader):
+    # One MQTT control packet: fixed header byte, remaining length (1-4 byte varint), body
+    first = await reader.readexactly(1)
+    header = bytearray(first)
+    length = 0
+    multiplier = 1
+    for _ in range(4):
+        byte = (await reader.readexactly(1))[0]
+        header.append(byte)
+        length += (byte & 0x7F) * multiplier
+        if not byte & 0x80:
+            break
+        multiplier *= 128
+    body = await reader.readexactly(length) if length else b""
+    return first[0], bytes(header) + body, len(header)
+
+def publish_topic(packet, header_len):
+    topic_len = int.from_bytes(packet[header_len:header_len + 2], 'big')
+    return packet[header_len + 2:header_len + 2 + topic_len].decode('utf-8', 'replace')
+
+def publish_ack(packet, header_len):
+    # PUBACK for a QoS 1 PUBLISH, so a dropped message does not leave the sender's window stuck
+    topic_len = int.from_bytes(packet[header_len:header_len + 2], 'big')
+    offset = header_len + 2 + topic_len
+    return bytes([PUBACK << 4, 2]) + packet[offset:offset + 2]
+
+class ProxySession:
+    __slots__ = ("client_writer", "broker_writer", "tasks")
+
+    def __init__(self, client_writer, broker_writer):
+        self.client_writer = client_writer
+        self.broker_writer = broker_writer
+        self.tasks = []
+
+    def close(self):
+        for writer in (self.client_writer, self.broker_writer):
+            writer.close()
+        for task in self.tasks:
+            task.cancel()
+
+class FaultProxy:
+    # TCP proxy between MQTT clients and the broker. It frames MQTT packets so it can drop,
+    # delay, duplicate or reorder PUBLISHes, and it can cut every connection and refuse new
+    # ones for a while to look like a broker restart. Runs on its own event loop thread.
+    def __init__(self, upstream_host=UPSTREAM_HOST, upstream_port=UPSTREAM_PORT, port=PROXY_PORT,
+                 bind='127.0.0.1', seed=None):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.port = port
+        self.bind = bind
+        self.random = random.Random(seed)
+        self.impairment = CLEAN
+        self.accepting = True
+        self.sessions = set()
+        self.stats = {"connections": 0, "refused": 0, "forwarded": 0, "dropped": 0,
+                      "duplicated": 0, "reordered": 0, "disconnects": 0}
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+        self.error = None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self.handle_client, self.bind, self.port))
+            self.port = self.server.sockets[0].getsockname()[1]
+        except Exception as e:
+            self.error = e
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+
+    def start(self, timeout=10):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if not self.started.wait(timeout):
+            raise RuntimeError("Fault proxy did not start in time")
+        if self.error:
+            raise RuntimeError(f"Fault proxy failed to start: {self.error}")
+        print(f"Fault proxy on {self.bind}:{self.port} -> {self.upstream_host}:{self.upstream_port}")
+        return self.port
+
+    def stop(self):
+        if not self.loop:
+            return
+        self.loop.call_soon_threadsafe(self._close_all)
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def set_impairment(self, impairment):
+        # Swapped atomically; packets already delayed keep their release time
+        self.impairment = impairment or CLEAN
+        print(f"Fault proxy: {self.impairment.name}")
+
+    def disconnect_all(self, down_seconds=0.0):
+        # Drop every connection and refuse reconnects for down_seconds, like a broker restart
+        self.loop.call_soon_threadsafe(self._disconnect_all, down_seconds)
+
+    def _disconnect_all(self, down_seconds):
+        self.stats["disconnects"] += 1
+        print(f"Fault proxy: cutting {len(self.sessions)} connections, down for {down_seconds:.0f}s")
+        self._close_all()
+        if down_seconds > 0:
+            self.accepting = False
+            self.loop.call_later(down_seconds, self._accept_again)
+
+    def _accept_again(self):
+        self.accepting = True
+        print("Fault proxy: accepting connections again")
+
+    def _close_all(self):
+        for session in list(self.sessions):
+            session.close()
+        self.sessions.clear()
+
+    async def handle_client(self, client_reader, client_writer):
+        if not self.accepting:
+            self.stats["refused"] += 1
+            client_writer.close()
+            return
+        try:
+            broker_reader, broker_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+        except OSError as e:
+            print(f"Fault proxy: broker unreachable: {e}")
+            client_writer.close()
+            return
+        self.stats["connections"] += 1
+        session = ProxySession(client_writer, broker_writer)
+        self.sessions.add(session)
+        to_broker = asyncio.Queue()
+        to_client = asyncio.Queue()
+        session.tasks = [
+            asyncio.ensure_future(self.pump(client_reader, to_broker, to_client, "up")),
+            asyncio.ensure_future(self.pump(broker_reader, to_client, to_broker, "down")),
+            asyncio.ensure_future(self.send_loop(to_broker, broker_writer)),
+            asyncio.ensure_future(self.send_loop(to_client, client_writer)),
+        ]
+        await asyncio.wait(session.tasks, return_when=asyncio.FIRST_COMPLETED)
+        # Either side closing ends the session, like a dropped TCP connection
+        session.close()
+        self.sessions.discard(session)
+
+    async def pump(self, reader, outbox, replies, direction):
+        held = None  # PUBLISH held back to be sent after the next packet
+        try:
+            while True:
+                ptype, packet, header_len = await read_packet(reader)
+                impairment = self.impairment
+                out = [packet]
+                if ptype >> 4 == PUBLISH and impairment.applies(direction, publish_topic(packet, header_len)):
+                    rand = self.random.random
+                    qos = (packet[0] >> 1) & 0x03
+                    # QoS 2 is never dropped: its handshake cannot be faked from here
+                    if impairment.loss and qos < 2 and rand() < impairment.loss:
+                        self.stats["dropped"] += 1
+                        if qos == 1:
+                            replies.put_nowait((self.loop.time(), publish_ack(packet, header_len)))
+                        continue
+                    if impairment.duplicate and rand() < impairment.duplicate:
+                        self.stats["duplicated"] += 1
+                        # A QoS 1/2 copy is marked as a redelivery
+                        copy = bytes([packet[0] | FLAG_DUP]) + packet[1:] if qos else packet
+                        out.append(copy)
+                    if held is None and impairment.reorder and rand() < impairment.reorder:
+                        self.stats["reordered"] += 1
+                        held = out
+                        continue
+                if held is not None:
+                    out.extend(held)
+                    held = None
+                delay = 0.0
+                if impairment.delay_ms and impairment.applies(direction):
+                    delay = max(0.0, impairment.delay_ms + self.random.uniform(-impairment.jitter_ms, impairment.jitter_ms)) / 1000.0
+                for data in out:
+                    outbox.put_nowait((self.loop.time() + delay, data))
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        # The peer closed: whatever is still queued or held goes out, then the session ends
+        if held is not None:
+            for data in held:
+                outbox.put_nowait((self.loop.time(), data))
+        outbox.put_nowait(None)
+
+    async def send_loop(self, outbox, writer):
+        # FIFO per direction, as on a TCP connection: a delayed packet holds back the ones behind it
+        while True:
+            item = await outbox.get()
+            if item is None:
+                return
+            release, data = item
+            wait = release - self.loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                writer.write(data)
+                await writer.drain()
+            except (ConnectionError, OSError):
+                return
+            self.stats["forwarded"] += 1
+
+def load_schedule(path):
+    if not path:
+        return DEFAULT_SCHEDULE
+    with open(path) as f:
+        return json.load(f)
+
+def run_phase(proxy, phase):
+    # Applies one schedule entry; returns once its duration is over and traffic is clean again
+    if phase.get("disconnect"):
+        proxy.disconnect_all(phase.get("down_seconds", 0.0))
+    else:
+        proxy.set_impairment(Impairment.from_phase(phase))
+    time.sleep(phase.get("duration", 30))
+    proxy.set_impairment(CLEAN)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MQTT proxy that injects loss, latency, reordering, duplication and disconnects")
+    parser.add_argument("--port", type=int, default=PROXY_PORT, help="Port clients connect to")
+    parser.add_argument("--upstream", default=f"{UPSTREAM_HOST}:{UPSTREAM_PORT}", help="Broker host:port")
+    parser.add_argument("--schedule", default=None, help="JSON list of fault phases (default: built-in set)")
+    parser.add_argument("--gap", type=float, default=30, help="Clean seconds before and between faults")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    host, _, port = args.upstream.rpartition(':')
+    proxy = FaultProxy(host or UPSTREAM_HOST, int(port), args.port, bind='0.0.0.0', seed=args.seed)
+    proxy.start()
+    try:
+        for phase in load_schedule(args.schedule):
+            time.sleep(args.gap)
+            print(f"Fault phase {phase.get('name')} for {phase.get('duration', 30)}s")
+            run_phase(proxy, phase)
+            print(f"Fault phase {phase.get('name')} over: {proxy.stats}")
+        print("Schedule done, proxying clean traffic (Ctrl+C to stop)")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping fault proxy...")
+    finally:
+        proxy.stop()
+        sys.exit(0)
@@ -4,9 +4,23 @@ import time
 import socket
 import select
 import random
+import threading
 import configparser
-import paho.mqtt.client as mqtt
 from collections import deque
+import paho.mqtt.client as mqtt
+from charging_scheduler import ChargingScheduler, CHARGING_STATES
+from order_queue import OrderQueue, Order
+from station_pool import StationPool
+from replenishment_planner import ReplenishmentPlanner
+from dedup_cache import DedupCache
+from order_ingest import IngestServer
+from latency_trace import StageRecorder
+from metrics import MetricsRegistry
+from profiler import SamplingProfiler
+from state_snapshot import request_topic, reply_topic
+from telemetry_policy import advertised_keepalive
+from world_model import (RobotTable, ShelfRecord, Assignment, status_code, status_codes, intern_id,
+                         IDLE, STALLED, LOST, ASSIGNED, FREE, WORKING, MOVING_TO_CHARGE)
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -15,44 +29,215 @@ config.read('config.ini')
 MQTT_BROKER = config.get('mqtt', 'broker', fallback='localhost')
 MQTT_PORT = config.getint('mqtt', 'port', fallback=1883)
 INITIAL_STOCK = config.getint('shelf', 'initial_stock', fallback=100)
+SHELF_MAX_ROBOTS = config.getint('shelf', 'max_robots', fallback=2)
+SHELF_BALANCE = config.getboolean('shelf', 'balance', fallback=True)
+BATTERY_DECAY = config.getfloat('robot', 'battery_decay', fallback=1.0)
+BATTERY_LOW_THRESHOLD = config.getfloat('robot', 'battery_low_threshold', fallback=15.0)
+TRIP_SECONDS = config.getfloat('robot', 'trip_seconds', fallback=7)
+# Tasks pre-assigned to a busy robot, which chains into them after its drop (0 = off)
+TASK_QUEUE_DEPTH = config.getint('robot', 'task_queue_depth', fallback=1)
+TASK_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"]
+# A next task is only pre-assigned before the drop, so it reaches the robot while it is still busy
+CHAIN_STATES = ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP"]
+# The robot is done with its shelf once it heads for the drop
+PICKED_STATES = ["MOVING_TO_DROP", "DROPPING"]
+TASK_CODES = status_codes(TASK_STATES)
+CHAIN_CODES = status_codes(CHAIN_STATES)
+PICKED_CODES = status_codes(PICKED_STATES)
+CHARGING_CODES = status_codes(CHARGING_STATES)
+NUM_CHARGERS = config.getint('charging', 'chargers', fallback=2)
+OPPORTUNISTIC_LEVEL = config.getfloat('charging', 'opportunistic_level', fallback=60.0)
+STAGGER_INTERVAL = config.getfloat('charging', 'stagger_interval', fallback=30.0)
+PREDICTION_HORIZON = config.getfloat('charging', 'prediction_horizon', fallback=20.0)
+COORDINATOR_UDP_PORT = config.getint('ports', 'coordinator_udp', fallback=9091)
+COORDINATOR_TCP_PORT = config.getint('ports', 'coordinator_tcp', fallback=9092)
+METRICS_PORT = config.getint('metrics', 'coordinator_port', fallback=9101)
+DEFAULT_DEADLINE = config.getfloat('orders', 'default_deadline', fallback=300.0)
+PRIORITY_WEIGHT = config.getfloat('orders', 'priority_weight', fallback=60.0)
+ORDER_AGING = config.getfloat('orders', 'aging', fallback=0.5)
+DEDUP_WINDOW = config.getfloat('orders', 'dedup_window', fallback=600.0)
+DEDUP_MAX_ENTRIES = config.getint('orders', 'dedup_max_entries', fallback=100000)
+UDP_ACK = config.getboolean('orders', 'udp_ack', fallback=True)
+RESTOCK_ENABLED = config.getboolean('replenishment', 'enabled', fallback=True)
+RESTOCK_LEAD_TIME = config.getfloat('replenishment', 'lead_time', fallback=10.0)
+RESTOCK_SAFETY_FACTOR = config.getfloat('replenishment', 'safety_factor', fallback=1.5)
+RESTOCK_MAX_CONCURRENT = config.getint('replenishment', 'max_concurrent', fallback=2)
+RESTOCK_RATE_WINDOW = config.getfloat('replenishment', 'rate_window', fallback=120.0)
+RESTOCK_TIMEOUT = config.getfloat('replenishment', 'restock_timeout', fallback=30.0)
+STATION_SLOTS = config.getint('stations', 'default_slots', fallback=2)
+STATION_BUFFER = config.getint('stations', 'default_buffer', fallback=1)
+STATION_CAPACITY = {k: v for k, v in config.items('stations')
+                    if k not in ('default_slots', 'default_buffer')} if config.has_section('stations') else {}
 GROUP_ID = "G2021231020" 
 
 class FleetCoordinator:
     def __init__(self, group_id):
         self.group_id = group_id
         
-        # Track simulated world state
-        self.world_state = {
-            "robots": {},   
-            "shelves": {},  
-        }
+        # Track simulated world state as slotted records (world_model)
+        self.robots = RobotTable()
+        self.shelves = {}          # shelf_id -> ShelfRecord
+        self.shelves_by_item = {}  # item_id -> shelf_ids, kept in step with self.shelves
+        # Held by the paho thread while it applies a message and by the main loop while it matches,
+        # so robots and shelves never change under process_orders (the idle list is swap-removed)
+        self.state_lock = threading.Lock()
         
-        self.pending_orders = deque() 
-        self.active_stations = set() # Set of currently busy station IDs
-        self.robot_assignments = {} 
+        # Earliest-deadline-first queue with priority and aging
+        self.pending_orders = OrderQueue(DEFAULT_DEADLINE, PRIORITY_WEIGHT, ORDER_AGING)
+        self.deadlines_met = 0
+        self.deadlines_missed = 0
+
+        # Recently seen order_ids and their latest outcome, for idempotent retries
+        self.dedup = DedupCache(DEDUP_WINDOW, DEDUP_MAX_ENTRIES)
+        # Multi-slot pack stations, each with its own FIFO of orders waiting for a slot
+        self.stations = StationPool(STATION_SLOTS, STATION_BUFFER, STATION_CAPACITY)
+        self.out_of_stock = {}  # item_id -> deque of orders held until a shelf reports stock
+        # Shelf access: at most shelf_max_robots robots per shelf until they have picked; orders
+        # whose item is only on full shelves wait per item, in deadline order, for one to free up
+        self.shelf_max_robots = SHELF_MAX_ROBOTS
+        self.shelf_balance = SHELF_BALANCE
+        self.shelf_waiting = {}  # item_id -> deque of orders
+        self.robot_assignments = {}   # robot_id -> Assignment
+        self.queued_assignments = {}  # robot_id -> deque of assignments pre-assigned behind the current one
+        self.chained_tasks = 0
+
+        # Capacity-aware charging with predictive battery model
+        self.charging_scheduler = ChargingScheduler(
+            NUM_CHARGERS, BATTERY_LOW_THRESHOLD, BATTERY_DECAY, TRIP_SECONDS,
+            opportunistic_level=OPPORTUNISTIC_LEVEL,
+            stagger_interval=STAGGER_INTERVAL,
+            prediction_horizon=PREDICTION_HORIZON,
+        )
+
+        # Proactive restocking from smoothed per-item consumption rates
+        self.replenishment = ReplenishmentPlanner(
+            INITIAL_STOCK, RESTOCK_LEAD_TIME, RESTOCK_SAFETY_FACTOR, RESTOCK_MAX_CONCURRENT,
+            rate_window=RESTOCK_RATE_WINDOW, restock_timeout=RESTOCK_TIMEOUT,
+        )
+
+        # Fleet KPIs (availability is time-weighted over heartbeats)
+        self.start_time = time.time()
+        self.snapshot_applied_at = None  # Seconds from start until the gateway snapshot was applied
+        self.first_dispatch_at = None    # Seconds from start until the first task was dispatched
+        self.completed_orders = 0
+        self.order_wait_total = 0.0
+        self.order_wait_count = 0
+        self.order_wait_max = 0.0
+        self.availability_samples = 0
+        self.availability_sum = 0.0
+        # Robot utilization: time spent in task states, integrated between status messages
+        self.busy_seconds = 0.0
+        self.tracked_seconds = 0.0
+
+        # Per-stage latency histograms for order tracing
+        self.trace_recorder = StageRecorder("coordinator")
+        self.init_metrics()
 
-        self.mqtt_client = mqtt.Client(client_id=f"coordinator-{group_id}-{int(time.time())}")
+        # On-demand sampling profiler (env var, UDP PROFILE command or SIGUSR1)
+        self.profiler = SamplingProfiler("coordinator")
+
+        client_id = f"coordinator-{group_id}-{int(time.time())}"
+        self.snapshot_topic = reply_topic(group_id, client_id)
+        self.mqtt_client = mqtt.Client(client_id=client_id)
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        self.mqtt_client.on_subscribe = self.on_subscribe
+        self.pending_subscriptions = set()
+        self.profiler.attach(self.mqtt_client)
         
         # UDP Server for Client Orders
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp_socket.bind(('0.0.0.0', 9091))
+        self.udp_socket.bind(('0.0.0.0', COORDINATOR_UDP_PORT))
         self.udp_socket.setblocking(False) 
+
+        # Streaming NDJSON order API (TCP) next to the UDP path, served by the same loop
+        try:
+            self.ingest_server = IngestServer(COORDINATOR_TCP_PORT,
+                                             lambda order: self.ingest_order(order, log=False),
+                                             lambda order_id: self.cancel_order(order_id, log=False))
+        except OSError as e:
+            print(f"Order stream API disabled (TCP {COORDINATOR_TCP_PORT}): {e}")
+            self.ingest_server = None
         
         self.last_no_stock_log = 0 
         print(f"[{self.group_id}] Fleet Coordinator initialized. Broker: {MQTT_BROKER}:{MQTT_PORT}")
 
+    def init_metrics(self):
+        self.metrics = MetricsRegistry("coordinator")
+        messages_in = self.metrics.counter("coordinator_mqtt_messages_in_total", "MQTT messages received by topic class", ("topic_class",))
+        self.m_in_amr = messages_in.labels("amr")
+        self.m_in_shelf = messages_in.labels("static")
+        self.m_in_alert = messages_in.labels("alerts")
+        self.m_orders_in = self.metrics.counter("coordinator_orders_received_total", "Orders received over UDP")
+        self.m_orders_completed = self.metrics.counter("coordinator_orders_completed_total", "Orders whose robot returned to IDLE")
+        self.m_orders_requeued = self.metrics.counter("coordinator_orders_requeued_total", "Orders requeued after a robot failure")
+        dispatches = self.metrics.counter("coordinator_dispatches_total", "Commands published to the dispatch topic", ("command",))
+        self.m_dispatch_task = dispatches.labels("EXECUTE_TASK")
+        self.m_dispatch_charge = dispatches.labels("CHARGE")
+        self.m_dispatch_restock = dispatches.labels("RESTOCK")
+        restocks = self.metrics.counter("coordinator_restocks_total", "Restocks issued by trigger", ("trigger",))
+        self.m_restock_proactive = restocks.labels("forecast")
+        self.m_restock_reactive = restocks.labels("order")
+        self.metrics.gauge("coordinator_stockout_seconds", "Cumulative shelf time spent out of stock").set_function(
+            lambda: self.replenishment.stockout_seconds())
+        failures = self.metrics.counter("coordinator_robot_failures_total", "Robot failures seen by the coordinator", ("reason",))
+        self.m_stalls = failures.labels("stalled")
+        self.m_lost = failures.labels("lost")
+        self.m_match_loop = self.metrics.histogram("coordinator_match_loop_seconds", "Duration of one process_orders pass")
+        deadlines = self.metrics.counter("coordinator_order_deadlines_total", "Completed orders by deadline outcome", ("outcome",))
+        self.m_deadline_met = deadlines.labels("met")
+        self.m_deadline_missed = deadlines.labels("missed")
+        self.m_duplicates = self.metrics.counter("coordinator_orders_duplicate_total", "Orders ignored because their order_id was already seen")
+        self.metrics.gauge("coordinator_dedup_hit_rate", "Share of received orders that were duplicates").set_function(
+            lambda: self.dedup.hit_rate())
+        self.metrics.gauge("coordinator_dedup_entries", "order_ids held in the duplicate window").set_function(lambda: len(self.dedup))
+        self.m_orders_cancelled = self.metrics.counter("coordinator_orders_cancelled_total", "Pending orders cancelled over UDP")
+        self.metrics.gauge("coordinator_pending_overdue", "Pending orders already past their deadline").set_function(
+            lambda: self.pending_orders.overdue() + self.stations.overdue(time.time()) + self.held_overdue(time.time()))
+        self.m_dispatch_latency = self.metrics.histogram("coordinator_dispatch_latency_seconds", "Order UDP receipt to dispatch publish")
+        self.metrics.gauge("coordinator_pending_orders", "Orders waiting to be matched").set_function(lambda: self.pending_count())
+        self.metrics.gauge("coordinator_station_robots", "Robots currently assigned to pack stations").set_function(
+            lambda: self.stations.occupied_count())
+        self.metrics.gauge("coordinator_station_waiting", "Orders parked waiting for a station slot").set_function(
+            lambda: self.stations.waiting_count())
+        self.metrics.gauge("coordinator_shelf_waiting", "Orders waiting for a shelf below its robot limit").set_function(
+            lambda: self.shelf_waiting_count())
+        self.metrics.gauge("coordinator_shelf_robots_max", "Most robots assigned to one shelf that have not picked yet").set_function(
+            lambda: max((shelf.en_route for shelf in list(self.shelves.values())), default=0))
+        self.m_station_wait = self.metrics.histogram("coordinator_station_wait_seconds", "Time orders spent parked at a full station",
+                                                     buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600))
+        self.metrics.gauge("coordinator_robots", "Robots known to the coordinator").set_function(lambda: len(self.robots))
+        self.metrics.gauge("coordinator_time_to_first_dispatch_seconds", "Seconds from start to the first dispatched task").set_function(
+            lambda: self.first_dispatch_at or 0.0)
+        self.metrics.gauge("coordinator_robot_utilization", "Share of robot time spent on tasks").set_function(
+            lambda: self.robot_utilization())
+        self.metrics.gauge("coordinator_tasks_preassigned", "Tasks queued on busy robots").set_function(
+            lambda: sum(len(q) for q in list(self.queued_assignments.values())))
+        self.metrics.gauge("coordinator_chargers_in_use", "Chargers held by the charging scheduler").set_function(
+            lambda: len(self.charging_scheduler.charging))
+
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print("Connected to MQTT Broker")
             # Subscribe to all internal status updates
             topic_filter = f"{self.group_id}/internal/+/+/status"
-            client.subscribe(topic_filter)
-            print(f"Subscribed to {topic_filter}")
+            self.pending_subscriptions = {client.subscribe(topic_filter)[1]}
+            # Liveness and battery alerts from the System Monitor
+            alert_filter = f"{self.group_id}/internal/alerts/+/+"
+            self.pending_subscriptions.add(client.subscribe(alert_filter)[1])
+            # Warm start: ask the gateway for the last known state instead of waiting for every heartbeat
+            self.pending_subscriptions.add(client.subscribe(self.snapshot_topic, qos=1)[1])
+            client.publish(request_topic(self.group_id), json.dumps({"reply_to": self.snapshot_topic}), qos=1)
         else:
             print(f"Failed to connect to MQTT, rc={rc}")
 
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        # Launcher ready marker, printed once the broker has acknowledged every subscription
+        if mid in self.pending_subscriptions:
+            self.pending_subscriptions.discard(mid)
+            if not self.pending_subscriptions:
+                print(f"Subscribed to {self.group_id}/internal/+/+/status and {self.group_id}/internal/alerts/+/+")
+
     def on_message(self, client, userdata, msg):
         try:
             payload = json.loads(msg.payload.decode('utf-8'))
@@ -65,148 +250,511 @@ class FleetCoordinator:
             entity_id = topic_parts[3] 
             
             # Route matched messages to update handlers
-            if category == "amr":
-                self.update_robot_state(entity_id, payload)
-            elif category == "static" or category == "shelves":
-                self.update_shelf_state(entity_id, payload)
+            with self.state_lock:
+                self.route_message(category, entity_id, payload)
                 
         except Exception as e:
             print(f"Error processing MQTT message on {msg.topic}: {e}")
 
+    def route_message(self, category, entity_id, payload):
+        if category == "amr":
+            self.m_in_amr.inc()
+            self.update_robot_state(entity_id, payload)
+        elif category == "static" or category == "shelves":
+            self.m_in_shelf.inc()
+            self.update_shelf_state(entity_id, payload)
+        elif category == "snapshot":
+            self.apply_snapshot(payload)
+        elif category == "alerts":
+            self.m_in_alert.inc()
+            if payload.get("alert") == "ROBOT_LOST":
+                self.handle_liveness_alert(entity_id, payload)
+            elif payload.get("alert") == "CHARGE_RECOMMENDED":
+                self.charging_scheduler.recommend(entity_id)
+
+    def apply_snapshot(self, payload):
+        # The snapshot is at least as new as any status received before it, so it is applied as is.
+        # Entities it no longer lists went silent while we were away and are dropped.
+        robots = payload.get("robots", {})
+        shelves = payload.get("shelves", {})
+        for robot_id, entry in robots.items():
+            self.update_robot_state(robot_id, entry["status"])
+        for shelf_id, entry in shelves.items():
+            self.update_shelf_state(shelf_id, entry["status"])
+
+        for robot_id in [r for r in self.robots if r not in robots]:
+            state = self.robots.get(robot_id).state
+            if state == ASSIGNED or state == WORKING:
+                self.recover_assignment(robot_id, state, "Missing from snapshot")
+            self.robots.remove(robot_id)
+            self.charging_scheduler.forget(robot_id)
+            print(f"Robot {robot_id} not in gateway snapshot, removed")
+        for shelf_id in [s for s in self.shelves if s not in shelves]:
+            self.forget_shelf(shelf_id)
+
+        if self.snapshot_applied_at is None:
+            self.snapshot_applied_at = time.time() - self.start_time
+        print(f"Applied gateway snapshot: {len(robots)} robots, {len(shelves)} shelves "
+              f"({self.snapshot_applied_at * 1000:.0f} ms after start)")
+
     def update_robot_state(self, robot_id, payload):
-        status = payload.get("status")
+        status = status_code(payload.get("status"))
+        robot = self.robots.get(robot_id)
+        if robot is None:
+            robot = self.robots.add(robot_id)
+        robot.keepalive = advertised_keepalive(payload)
+        self.track_utilization(robot, status)
         
         # Track internal state to handle task lifecycle logic
-        current_internal_state = "FREE"
-        if robot_id in self.world_state["robots"]:
-            current_internal_state = self.world_state["robots"][robot_id].get("internal_state", "FREE")
+        state = robot.state
             
         # HANDLE STALLS: Robot reported failure
-        if status == "STALLED":
-            if current_internal_state in ["ASSIGNED", "WORKING"]:
-                print(f"CRITICAL: Robot {robot_id} reported STALLED while {current_internal_state}!")
-                
-                # Recover Order from Stalled Robot
-                if robot_id in self.robot_assignments:
-                    assignment = self.robot_assignments[robot_id]
-                    failed_order = assignment.get("order")
-                    station_id = assignment.get("station")
-                    shelf_id = assignment.get("shelf_id")
-                    qty = assignment.get("quantity", 0)
-
-                    # Refund stock if robot had arguably picked it
-                    if current_internal_state == "WORKING" and shelf_id:
-                        print(f"REFUNDING {qty} items to {shelf_id} (Robot Stalled while working)")
-                        refund_payload = {
-                            "command": "RESTOCK",
-                            "target_shelf_id": shelf_id,
-                            "quantity": qty
-                        }
-                        self.mqtt_client.publish(f"{self.group_id}/internal/tasks/dispatch", json.dumps(refund_payload), qos=1)
-                    
-                    # Re-queue the failed order to be picked up by another robot
-                    if failed_order:
-                        print(f"REQUEUING Order due to Stall: {failed_order}")
-                        self.pending_orders.appendleft(failed_order)
-                    
-                    # Force unlock station so others can use it
-                    if station_id in self.active_stations:
-                        self.active_stations.remove(station_id)
-                        print(f"Force-Released Station {station_id} due to stall.")
-                    
-                    del self.robot_assignments[robot_id]
-                
-                current_internal_state = "STALLED"
+        if status == STALLED:
+            if state == ASSIGNED or state == WORKING:
+                print(f"CRITICAL: Robot {robot_id} reported STALLED while {robot.state_name()}!")
+                self.m_stalls.inc()
+                self.recover_assignment(robot_id, state, "Stall")
+                state = STALLED
         
         # Task started confirmation
-        elif current_internal_state == "ASSIGNED":
-            if status in ["MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"]:
-                 current_internal_state = "WORKING"
+        elif state == ASSIGNED:
+            if status in TASK_CODES:
+                 state = WORKING
+
+        # Task completion: Robot went back to IDLE, or its completed count moved on while it
+        # chained straight into a queued task
+        elif state == WORKING:
+            for _ in range(self.tasks_finished(robot, payload, status)):
+                self.complete_task(robot_id, payload)
+                if not self.promote_queued(robot_id, status):
+                    break
+            if robot_id not in self.robot_assignments:
+                state = FREE
+
+        # Recovery from Stall or lost heartbeat
+        elif state == STALLED or state == LOST:
+            if status == IDLE:
+                state = FREE
+
+        try:
+            robot.battery = float(payload.get("battery", 0))
+            self.charging_scheduler.observe(robot_id, robot.battery, payload.get("status"))
+        except (TypeError, ValueError):
+            pass
+
+        # Past the pick: the shelf can take another robot
+        if state == WORKING and status in PICKED_CODES:
+            assignment = self.robot_assignments.get(robot_id)
+            if assignment is not None:
+                self.leave_shelf(assignment)
+
+        robot.tasks_completed = payload.get("tasks_completed")
+        self.robots.set_state(robot, status, state)
+
+    def tasks_finished(self, robot, payload, status):
+        # Robots with a task queue report a running count; older robots only signal by going IDLE
+        done = payload.get("tasks_completed")
+        before = robot.tasks_completed
+        if done is not None and before is not None and done > before:
+            return done - before
+        return 1 if status == IDLE else 0
 
-        # Task completion: Robot went back to IDLE
-        elif current_internal_state == "WORKING":
-            if status == "IDLE":
-                self.free_station(robot_id)
-                current_internal_state = "FREE"
+    def complete_task(self, robot_id, payload):
+        self.record_order_completion(robot_id, payload.get("trace"))
+        self.record_deadline(robot_id)
+        self.record_order_event(self.assigned_order(robot_id), "COMPLETED", robot_id=robot_id)
+        self.free_station(robot_id)
+        self.completed_orders += 1
+        self.m_orders_completed.inc()
 
-        # Recovery from Stall
-        elif current_internal_state == "STALLED":
-            if status == "IDLE":
-                current_internal_state = "FREE"
+    def promote_queued(self, robot_id, status):
+        # The next pre-assigned task becomes current if the robot chained into it
+        queued = self.queued_assignments.get(robot_id)
+        if not queued:
+            return False
+        if status not in TASK_CODES:
+            # Back at the dock (low battery, or the command was refused): the queued orders go back
+            self.requeue_queued(robot_id, "Not chained")
+            return False
+        self.robot_assignments[robot_id] = queued.popleft()
+        if not queued:
+            del self.queued_assignments[robot_id]
+        self.chained_tasks += 1
+        return True
+
+    def requeue_queued(self, robot_id, reason):
+        for assignment in self.queued_assignments.pop(robot_id, ()):
+            order = assignment.order
+            print(f"REQUEUING pre-assigned Order due to {reason}: {order}")
+            self.pending_orders.requeue(order)
+            self.m_orders_requeued.inc()
+            self.record_order_event(order, "REQUEUED", reason=reason)
+            self.leave_shelf(assignment)
+            if assignment.station:
+                self.stations.release(assignment.station, assignment.slot)
 
-        self.world_state["robots"][robot_id] = payload
-        self.world_state["robots"][robot_id]["internal_state"] = current_internal_state
+    def track_utilization(self, robot, status, now=None):
+        now = now if now is not None else time.time()
+        if robot.seen_at is not None:
+            elapsed = now - robot.seen_at
+            # Gaps longer than a few heartbeats past the robot's keepalive (robot lost, coordinator
+            # paused) are not counted; a quiet idle robot still counts as tracked time
+            if 0 < elapsed <= 5.0 + robot.keepalive:
+                self.tracked_seconds += elapsed
+                if robot.on_task:
+                    self.busy_seconds += elapsed
+        robot.seen_at = now
+        robot.on_task = status in TASK_CODES
+
+    def robot_utilization(self):
+        return self.busy_seconds / self.tracked_seconds if self.tracked_seconds else 0.0
+
+    def recover_assignment(self, robot_id, internal_state, reason):
+        # Recover Order from a failed Robot (tasks queued behind the current one go back too)
+        self.requeue_queued(robot_id, reason)
+        if robot_id not in self.robot_assignments:
+            return
+        assignment = self.robot_assignments[robot_id]
+        failed_order = assignment.order
+        station_id = assignment.station
+        shelf_id = assignment.shelf_id
+        qty = assignment.quantity
+
+        # Refund stock if robot had arguably picked it
+        if internal_state == WORKING and shelf_id:
+            print(f"REFUNDING {qty} items to {shelf_id} (Robot {reason} while working)")
+            refund_payload = {
+                "command": "RESTOCK",
+                "target_shelf_id": shelf_id,
+                "quantity": qty
+            }
+            self.mqtt_client.publish(f"{self.group_id}/internal/tasks/dispatch", json.dumps(refund_payload), qos=1)
+            self.m_dispatch_restock.inc()
+        
+        # Re-queue the failed order to be picked up by another robot
+        if failed_order:
+            print(f"REQUEUING Order due to {reason}: {failed_order}")
+            self.pending_orders.requeue(failed_order)
+            self.m_orders_requeued.inc()
+            self.record_order_event(failed_order, "REQUEUED", reason=reason)
+        
+        # Force unlock the station slot and the shelf so others can use them
+        self.leave_shelf(assignment)
+        if station_id and self.stations.release(station_id, assignment.slot):
+            print(f"Force-Released Station {station_id} slot due to {reason.lower()}.")
+        
+        del self.robot_assignments[robot_id]
+
+    def handle_liveness_alert(self, robot_id, payload):
+        # Robot stopped reporting: requeue its order and keep it out of dispatch until it returns IDLE
+        robot = self.robots.get(robot_id)
+        if robot is None:
+            return
+        print(f"CRITICAL: Robot {robot_id} LOST (heartbeat timeout) while {robot.state_name()}!")
+        self.m_lost.inc()
+        if robot.state == ASSIGNED or robot.state == WORKING:
+            self.recover_assignment(robot_id, robot.state, "Lost Heartbeat")
+        self.robots.set_state(robot, LOST, LOST)
+        self.charging_scheduler.forget(robot_id)
 
     def update_shelf_state(self, shelf_id, payload):
-        self.world_state["shelves"][shelf_id] = payload
+        item_id = intern_id(payload.get("item_id"))
+        try:
+            stock = float(payload.get("stock", 0))
+        except (TypeError, ValueError):
+            stock = 0.0
+        # The gateway normalizes stock to kg; restocks and picks are in the shelf's own units
+        try:
+            units = float(payload.get("original_stock", payload.get("stock", 0)))
+        except (TypeError, ValueError):
+            units = None
+        shelf = self.shelves.get(shelf_id)
+        if shelf is None or shelf.item_id != item_id:
+            self.forget_shelf(shelf_id)
+            shelf = self.shelves[shelf_id] = ShelfRecord(shelf_id, item_id, stock, units or 0.0)
+            self.shelves_by_item.setdefault(item_id, []).append(shelf_id)
+        else:
+            shelf.stock = stock
+            if units is not None:
+                shelf.units = units
+        if units is not None:
+            self.replenishment.observe_stock(shelf_id, item_id, units)
+
+    def forget_shelf(self, shelf_id):
+        shelf = self.shelves.pop(shelf_id, None)
+        if shelf is None:
+            return
+        shelf_ids = self.shelves_by_item.get(shelf.item_id, [])
+        if shelf_id in shelf_ids:
+            shelf_ids.remove(shelf_id)
+            if not shelf_ids:
+                del self.shelves_by_item[shelf.item_id]
+
+    def record_order_completion(self, robot_id, trace):
+        # End-to-end latency from UDP receipt to the robot's drop
+        assignment = self.robot_assignments.get(robot_id)
+        if not trace or assignment is None or assignment.order is None:
+            return
+        self.trace_recorder.record_ns("order.end_to_end", assignment.order.recv_ns, trace.get("drop_ns"))
+
+    def assigned_order(self, robot_id):
+        assignment = self.robot_assignments.get(robot_id)
+        return assignment.order if assignment is not None else None
+
+    def record_order_event(self, order, status, **details):
+        # Latest outcome per order_id, returned to clients that retry the same order
+        if order is not None:
+            self.dedup.update(order.order_id, status, **details)
+            if self.ingest_server:
+                self.ingest_server.notify(order.order_id, status, details)
+
+    def record_deadline(self, robot_id):
+        order = self.assigned_order(robot_id)
+        if order is None or order.deadline is None:
+            return
+        if time.time() <= order.deadline:
+            self.deadlines_met += 1
+            self.m_deadline_met.inc()
+        else:
+            self.deadlines_missed += 1
+            self.m_deadline_missed.inc()
+            print(f"DEADLINE MISSED: Order {order.order_id} finished {time.time() - order.deadline:.1f}s late")
 
     def free_station(self, robot_id):
         # Unlocks the packing station resource
         if robot_id in self.robot_assignments:
             assignment = self.robot_assignments.pop(robot_id)
-            station_id = assignment.get("station") if isinstance(assignment, dict) else assignment
+            station_id = assignment.station
+            self.leave_shelf(assignment)
             
-            if station_id in self.active_stations:
-                self.active_stations.remove(station_id)
-                print(f"Released Station {station_id} (Robot {robot_id} finished)")
+            if station_id and self.stations.release(station_id, assignment.slot):
+                print(f"Released Station {station_id} slot (Robot {robot_id} finished)")
 
     def process_orders(self):
         # Attempt to process all pending orders
-        if not self.pending_orders:
+        if not self.pending_orders and not self.stations.waiting_count() and not self.out_of_stock and not self.shelf_waiting:
+            return
+
+        with self.m_match_loop.time():
+            self.release_restocked_orders()
+            self.release_shelf_waiting()
+
+            # Orders parked at a station that has a free slot again go first, oldest first.
+            # A head order no shelf can serve right now moves to the item holds so the
+            # orders behind it are not stuck; it comes back through the queue from there.
+            for station in self.stations.ready():
+                while station.waiting and station.has_room() and self.available_robot():
+                    if self.try_match_order(station.waiting[0]):
+                        station.waiting.popleft()
+                    elif not self.available_robot():
+                        break
+                    else:
+                        self.hold_for_shelf(station.waiting.popleft())
+
+            # Walk orders in deadline order; blocked ones are set aside and pushed back
+            # with their original keys. Orders for a full station are parked in its FIFO,
+            # orders for an item no shelf has in stock are held per item, and so are orders
+            # whose shelves are all at their robot limit, so none of them is re-examined
+            # every pass. Without a free robot nothing else can match.
+            deferred = []
+            now = time.time()
+            while self.pending_orders and self.available_robot():
+                order = self.pending_orders.pop()
+                station_id = order.pack_station
+                if station_id:
+                    station = self.stations.get(station_id, now)
+                    if station.waiting or not station.has_room():
+                        station.park(order, now)
+                        continue
+                item = order.item
+                if item in self.out_of_stock:
+                    self.out_of_stock[item].append(order)
+                elif item in self.shelf_waiting and self.select_shelf(item, order.quantity) is None:
+                    self.shelf_waiting[item].append(order)
+                elif not self.try_match_order(order):
+                    if not self.available_robot():
+                        deferred.append(order)
+                    else:
+                        self.hold_for_shelf(order)
+            for order in deferred:
+                self.pending_orders.requeue(order)
+
+    def hold_for_shelf(self, order):
+        # Station had room and a robot was free, so no shelf could take the order: every shelf
+        # with the item is busy (shelf_waiting) or none has it in stock (out_of_stock)
+        item = order.item
+        if self.item_in_stock(item):
+            self.shelf_waiting.setdefault(item, deque()).append(order)
+        else:
+            self.out_of_stock.setdefault(item, deque()).append(order)
+
+    def release_restocked_orders(self):
+        # Held orders go back into the queue with their original keys once any shelf has their item
+        for item in list(self.out_of_stock):
+            if self.item_in_stock(item):
+                for order in self.out_of_stock.pop(item):
+                    self.pending_orders.requeue(order)
+
+    def release_shelf_waiting(self):
+        # As many waiting orders go back as the item's shelves have free access slots, oldest first.
+        # Slots on empty shelves count too, and all of them go back once no shelf holds the item:
+        # those orders then move on to the out-of-stock hold.
+        for item in list(self.shelf_waiting):
+            orders = self.shelf_waiting[item]
+            free = self.shelf_slots_free(item)
+            while free > 0 and orders:
+                self.pending_orders.requeue(orders.popleft())
+                free -= 1
+            if not orders:
+                del self.shelf_waiting[item]
+
+    def shelf_slots_free(self, item):
+        shelves = self.shelves
+        # Copy of the id list, and shelves.get: a shelf may be forgotten while we look
+        shelf_ids = list(self.shelves_by_item.get(item, ()))
+        if self.shelf_max_robots <= 0 or not shelf_ids:
+            return len(self.shelf_waiting.get(item, ()))
+        free = 0
+        for shelf_id in shelf_ids:
+            shelf = shelves.get(shelf_id)
+            if shelf is not None:
+                free += max(0, self.shelf_max_robots - shelf.en_route)
+        return free
+
+    def select_shelf(self, item, quantity):
+        # Shelves with stock and below their robot limit. Balanced: the one that can cover the
+        # quantity without a refill, then the fewest robots en route, then the most unreserved stock.
+        # Otherwise the first one, as before the limit existed.
+        shelves = self.shelves
+        limit = self.shelf_max_robots
+        best = None
+        best_key = None
+        for shelf_id in list(self.shelves_by_item.get(item, ())):
+            shelf = shelves.get(shelf_id)
+            if shelf is None or shelf.stock <= 0 or (limit > 0 and shelf.en_route >= limit):
+                continue
+            if not self.shelf_balance:
+                return shelf
+            free = shelf.units - shelf.reserved
+            key = (free < quantity, shelf.en_route, -free)
+            if best_key is None or key < best_key:
+                best = shelf
+                best_key = key
+        return best
+
+    def leave_shelf(self, assignment):
+        # Once per assignment: the robot picked, or the task was taken off it
+        if not assignment.at_shelf:
             return
+        assignment.at_shelf = False
+        shelf = self.shelves.get(assignment.shelf_id)
+        if shelf is not None:
+            shelf.en_route = max(0, shelf.en_route - 1)
+            shelf.reserved = max(0, shelf.reserved - assignment.quantity)
+
+    def shelf_with_stock(self, item):
+        # Only the shelves holding this item are looked at, not every shelf in the warehouse
+        shelves = self.shelves
+        for shelf_id in list(self.shelves_by_item.get(item, ())):
+            shelf = shelves.get(shelf_id)
+            if shelf is not None and shelf.stock > 0:
+                return shelf_id
+        return None
+
+    def item_in_stock(self, item):
+        return self.shelf_with_stock(item) is not None
+
+    def held_count(self):
+        return sum(len(orders) for orders in list(self.out_of_stock.values()))
+
+    def shelf_waiting_count(self):
+        return sum(len(orders) for orders in list(self.shelf_waiting.values()))
+
+    def held_overdue(self, now):
+        return sum(1 for held in (self.out_of_stock, self.shelf_waiting)
+                   for orders in list(held.values()) for order in list(orders) if order.deadline < now)
+
+    def pending_count(self):
+        return len(self.pending_orders) + self.stations.waiting_count() + self.held_count() + self.shelf_waiting_count()
 
-        count = len(self.pending_orders)
-        for _ in range(count):
-            order = self.pending_orders.popleft()
-            if self.try_match_order(order):
-                pass
-            else:
-                self.pending_orders.append(order)
+    def available_robot(self):
+        # A free robot first; otherwise a busy robot that can take a task queued behind its current one
+        robot = self.free_robot()
+        if robot is None:
+            chainable = self.chainable_robots()
+            if chainable:
+                robot = random.choice(chainable)
+        return robot
+
+    def chainable_robots(self):
+        if TASK_QUEUE_DEPTH <= 0:
+            return []
+        chainable = []
+        for robot in self.robots.values():
+            if robot.state != WORKING or robot.status not in CHAIN_CODES:
+                continue
+            if robot.tasks_completed is None:
+                continue  # Robot without a task queue
+            robot_id = robot.robot_id
+            if len(self.queued_assignments.get(robot_id, ())) >= TASK_QUEUE_DEPTH:
+                continue
+            if self.charging_scheduler.is_held(robot_id):
+                continue
+            # Battery for the rest of the current trip as well as the next one
+            battery = robot.battery - TRIP_SECONDS * self.charging_scheduler.decay_rate(robot_id)
+            if not self.charging_scheduler.can_complete_trip(robot_id, battery):
+                continue
+            chainable.append(robot)
+        return chainable
+
+    def free_robot(self):
+        # A random robot from the idle list; the list is only scanned when that one cannot go
+        idle = self.robots.idle
+        if not idle:
+            return None
+        robot = random.choice(idle)
+        if self.can_take_trip(robot):
+            return robot
+        eligible = self.eligible_robots()
+        return random.choice(eligible) if eligible else None
+
+    def eligible_robots(self):
+        # Idle robots with enough battery to finish the trip
+        return [robot for robot in self.robots.idle if self.can_take_trip(robot)]
+
+    def can_take_trip(self, robot):
+        if self.charging_scheduler.is_held(robot.robot_id):
+            return False
+        return self.charging_scheduler.can_complete_trip(robot.robot_id, robot.battery)
 
     def try_match_order(self, order):
-        target_item = order.get("item")
-        target_station = order.get("pack_station", "").strip()
+        target_item = order.item
+        target_station = order.pack_station
         
-        # Check if Station is Busy
-        if target_station and target_station in self.active_stations:
+        # Check if Station has a free slot
+        if target_station and not self.stations.has_room(target_station):
              return False
 
-        # Find Shelf with Stock
-        target_shelf_id = None
-        for shelf_id, data in self.world_state["shelves"].items():
-            if data.get("item_id") == target_item:
-                try:
-                    if float(data.get("stock", 0)) > 0:
-                        target_shelf_id = shelf_id
-                        break
-                except ValueError:
-                    pass
+        qty = order.quantity
+
+        # Find Shelf with Stock and room for another robot
+        shelf = self.select_shelf(target_item, qty)
         
-        if not target_shelf_id:
+        if shelf is None:
             now = time.time()
             if now - self.last_no_stock_log > 5:
                 self.last_no_stock_log = now
             return False
+        target_shelf_id = shelf.shelf_id
 
-        # Find Available Robot
-        eligible_robots = []
-        for robot_id, data in self.world_state["robots"].items():
-            internal_st = data.get("internal_state", "FREE")
-            remote_st = data.get("status")
-            
-            if remote_st == "IDLE" and internal_st == "FREE":
-                eligible_robots.append(robot_id)
-        
-        if not eligible_robots:
+        # Find Available Robot (with enough battery to finish the trip)
+        robot = self.available_robot()
+        if robot is None:
             return False
-            
-        assigned_robot_id = random.choice(eligible_robots)
-
-        qty = order.get("quantity", 1)
         
         # Boost stock if insufficient for order (Auto-Refill Trigger)
         try:
-             current_stock = float(self.world_state["shelves"][target_shelf_id].get("stock", 0))
+             current_stock = shelf.stock
              while current_stock < qty:
                  print(f"Stock {current_stock} < Order {qty}. Triggering Auto-Refill...")
                  restock_payload = {
@@ -215,99 +763,292 @@ class FleetCoordinator:
                     "quantity": INITIAL_STOCK
                  }
                  self.mqtt_client.publish(f"{self.group_id}/internal/tasks/dispatch", json.dumps(restock_payload), qos=1)
+                 self.m_dispatch_restock.inc()
+                 self.m_restock_reactive.inc()
+                 self.replenishment.record_reactive(target_shelf_id, INITIAL_STOCK)
                  
                  current_stock += INITIAL_STOCK
              
-             self.world_state["shelves"][target_shelf_id]["stock"] = current_stock
+             shelf.stock = current_stock
              
         except Exception as e:
             print(f"Error in auto-refill logic: {e}")
 
         # Finalize assignment and lock resources
-        self.dispatch_task(assigned_robot_id, target_shelf_id, target_station, qty, order)
+        self.dispatch_task(robot.robot_id, target_shelf_id, target_station, qty, order)
         return True
 
     def dispatch_task(self, robot_id, shelf_id, station_id, quantity, full_order):
-        # Lock Station
-        self.active_stations.add(station_id)
+        match_time = time.perf_counter()
+        if full_order.recv_mono is not None:
+            self.trace_recorder.record("coordinator.queue_wait", match_time - full_order.recv_mono)
+        now = time.time()
+        if full_order.enqueued_at is not None:
+            wait = now - full_order.enqueued_at
+            self.order_wait_total += wait
+            self.order_wait_count += 1
+            self.order_wait_max = max(self.order_wait_max, wait)
+        if full_order.item:
+            self.replenishment.observe_consumption(full_order.item, quantity, now)
+
+        oid = full_order.order_id or "unknown"
+        assignment = Assignment(station_id, shelf_id, quantity, full_order, (robot_id, oid))
+
+        # Count the robot against the shelf until it has picked
+        shelf = self.shelves.get(shelf_id)
+        if shelf is not None:
+            shelf.en_route += 1
+            shelf.reserved += quantity
+            assignment.at_shelf = True
+
+        # Occupy a Station slot
+        if station_id:
+            parked_at = full_order.parked_at
+            self.stations.occupy(station_id, assignment.slot, full_order)
+            if parked_at is not None:
+                self.m_station_wait.observe(time.time() - parked_at)
         
-        self.robot_assignments[robot_id] = {
-            "station": station_id,
-            "shelf_id": shelf_id,
-            "quantity": quantity,
-            "order": full_order
-        }
+        queue_only = robot_id in self.robot_assignments
+        if queue_only:
+            # Busy robot: the task waits in its on-board queue behind the current one
+            self.queued_assignments.setdefault(robot_id, deque()).append(assignment)
+            print(f"PRE-ASSIGNING Order {oid} to busy Robot {robot_id}")
+        else:
+            self.robot_assignments[robot_id] = assignment
         
-        # Reserve Robot locally to prevent double assignment
-        if robot_id in self.world_state["robots"]:
-            self.world_state["robots"][robot_id]["status"] = "ASSIGNED"
-            self.world_state["robots"][robot_id]["internal_state"] = "ASSIGNED"
+            # Reserve Robot locally to prevent double assignment
+            robot = self.robots.get(robot_id)
+            if robot is not None:
+                self.robots.set_state(robot, ASSIGNED, ASSIGNED)
 
+        self.record_order_event(full_order, "DISPATCHED", robot_id=robot_id, shelf_id=shelf_id, station_id=station_id)
         payload = {
             "robot_id": robot_id,
             "command": "EXECUTE_TASK",
             "target_shelf_id": shelf_id,
             "target_station_id": station_id,
-            "quantity": quantity
+            "quantity": quantity,
+            "order_id": oid,
+            # A robot that is already back at the dock drops it; promote_queued requeues the order
+            "queue_only": queue_only,
+            "trace": {
+                "recv_ns": full_order.recv_ns,
+                "dispatch_ns": time.time_ns()
+            }
         }
         
         topic = f"{self.group_id}/internal/tasks/dispatch"
         
-        oid = full_order.get("order_id", "unknown")
         print(f"DISPATCHING Order {oid}: {json.dumps(payload)}")
         
         info = self.mqtt_client.publish(topic, json.dumps(payload), qos=1)
         if info.rc != mqtt.MQTT_ERR_SUCCESS:
             print(f"WARNING: Publish failed with code {info.rc}")
+        published = time.perf_counter()
+        self.m_dispatch_task.inc()
+        if full_order.recv_mono is not None:
+            self.m_dispatch_latency.observe(published - full_order.recv_mono)
+        self.trace_recorder.record("coordinator.dispatch", published - match_time)
+        if self.first_dispatch_at is None:
+            self.first_dispatch_at = time.time() - self.start_time
+            print(f"Time to first dispatch: {self.first_dispatch_at:.3f}s after start")
+
+    def schedule_charging(self):
+        # Send idle robots to free chargers based on predicted battery drain
+        idle_robots = {robot.robot_id: robot.battery for robot in self.robots.idle}
+
+        for robot_id in self.charging_scheduler.plan(idle_robots, self.pending_count()):
+            self.dispatch_charge(robot_id)
+
+    def plan_restocks(self):
+        # Refill shelves ahead of their predicted stock-out
+        if not RESTOCK_ENABLED:
+            return
+        for shelf_id, quantity in self.replenishment.plan():
+            rate = self.replenishment.rate(self.replenishment.shelves[shelf_id].item_id)
+            print(f"PROACTIVE RESTOCK: {shelf_id} +{quantity:g} (consuming {rate * 60:.1f}/min)")
+            payload = {
+                "command": "RESTOCK",
+                "target_shelf_id": shelf_id,
+                "quantity": quantity
+            }
+            self.mqtt_client.publish(f"{self.group_id}/internal/tasks/dispatch", json.dumps(payload), qos=1)
+            self.m_dispatch_restock.inc()
+            self.m_restock_proactive.inc()
+
+    def dispatch_charge(self, robot_id):
+        payload = {
+            "robot_id": robot_id,
+            "command": "CHARGE"
+        }
+        robot = self.robots.get(robot_id)
+        if robot is not None:
+            self.robots.set_state(robot, MOVING_TO_CHARGE, robot.state)
+
+        print(f"DISPATCHING Charge: {robot_id} ({len(self.charging_scheduler.charging)}/{NUM_CHARGERS} chargers in use)")
+        info = self.mqtt_client.publish(f"{self.group_id}/internal/tasks/dispatch", json.dumps(payload), qos=1)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"WARNING: Publish failed with code {info.rc}")
+        self.m_dispatch_charge.inc()
+
+    def sample_availability(self):
+        robots = self.robots
+        if not robots:
+            return
+        unavailable = sum(1 for r in robots.values() if r.status in CHARGING_CODES or r.status == STALLED)
+        self.availability_samples += 1
+        self.availability_sum += 1.0 - unavailable / len(robots)
 
     def print_world_state(self):
         print("\n--- World State ---")
-        print(f"Pending Orders: {len(self.pending_orders)}")
+        now = time.time()
+        overdue = self.pending_orders.overdue(now) + self.stations.overdue(now) + self.held_overdue(now)
+        print(f"Pending Orders: {self.pending_count()} ({self.stations.waiting_count()} parked at stations, "
+              f"{self.held_count()} waiting for stock, {self.shelf_waiting_count()} waiting for shelf access, {overdue} overdue)")
         if self.pending_orders:
-            print(f"  Next: {list(self.pending_orders)[0]}")
+            print(f"  Next: {self.pending_orders.peek()}")
         
-        print(f"Active Stations: {self.active_stations}")
+        for station_id, station in sorted(self.stations.stations.items()):
+            r = station.report(now)
+            print(f"Station {station_id}: {r['occupied']}/{r['capacity']} busy, {r['waiting']} waiting | "
+                  f"Utilization {r['utilization'] * 100:.1f}% (buffer {r['buffer_utilization'] * 100:.1f}%) | "
+                  f"Wait avg {r['avg_wait']:.1f}s max {r['max_wait']:.1f}s")
         
-        assigned_count = sum(1 for r in self.world_state["robots"].values() if r.get("status") != "IDLE")
-        print(f"Robots Busy: {assigned_count}/{len(self.world_state['robots'])}")
+        assigned_count = sum(1 for r in self.robots.values() if r.status != IDLE)
+        print(f"Robots Busy: {assigned_count}/{len(self.robots)} | Utilization {self.robot_utilization() * 100:.1f}% on tasks | "
+              f"Chained: {self.chained_tasks} tasks ({sum(len(q) for q in self.queued_assignments.values())} pre-assigned now)")
+
+        self.sample_availability()
+        hours = max(time.time() - self.start_time, 1.0) / 3600.0
+        availability = self.availability_sum / self.availability_samples if self.availability_samples else 0.0
+        print(f"Chargers: {len(self.charging_scheduler.charging)}/{NUM_CHARGERS} in use, {len(self.charging_scheduler.queue)} waiting")
+        finished = self.deadlines_met + self.deadlines_missed
+        miss_rate = self.deadlines_missed / finished if finished else 0.0
+        planner = self.replenishment
+        avg_wait = self.order_wait_total / self.order_wait_count if self.order_wait_count else 0.0
+        print(f"Order Wait: avg {avg_wait:.1f}s max {self.order_wait_max:.1f}s over {self.order_wait_count} dispatched")
+        print(f"Restocks: {planner.proactive} forecast, {planner.reactive} on demand, {planner.in_flight()} in flight | "
+              f"Stock-out time: {planner.stockout_seconds(now):.1f}s")
+        print(f"Duplicates: {self.dedup.hits} ignored ({self.dedup.hit_rate() * 100:.1f}% of received, {len(self.dedup)} ids in window)")
+        print(f"Deadlines: {self.deadlines_met} met, {self.deadlines_missed} missed ({miss_rate * 100:.1f}% miss rate)")
+        print(f"Fleet Availability: {availability * 100:.1f}% | Orders/hour: {self.completed_orders / hours:.1f} ({self.completed_orders} completed)")
         
         print("-------------------\n")
         print("-------------------\n")
 
+    def cancel_order(self, order_id, log=True):
+        order = self.pending_orders.cancel(order_id) or self.stations.cancel(order_id) or self.cancel_held(order_id)
+        if order is not None:
+            self.m_orders_cancelled.inc()
+            self.record_order_event(order, "CANCELLED")
+            if log:
+                print(f"CANCELLED Order {order_id}")
+            return True
+        if log:
+            print(f"Cancel ignored: Order {order_id} is not pending")
+        return False
+
+    def cancel_held(self, order_id):
+        for held in (self.out_of_stock, self.shelf_waiting):
+            for item, orders in held.items():
+                for order in orders:
+                    if order.order_id == order_id:
+                        orders.remove(order)
+                        if not orders:
+                            del held[item]
+                        return order
+        return None
+
+    def ingest_order(self, message, log=True):
+        # Queue a new order; a retried order_id gets the original order's latest outcome instead.
+        # Stream clients get per-order events back, so their path skips the per-order log lines.
+        order_id = message.get("order_id")
+        if order_id:
+            outcome = self.dedup.check(order_id)
+            if outcome is not None:
+                self.m_duplicates.inc()
+                if log:
+                    print(f"DUPLICATE Order {order_id} ignored ({outcome['status']})")
+                return dict(outcome, order_id=order_id, duplicate=True)
+
+        # Only the fields dispatch needs are kept (item and station are stripped and interned)
+        order = Order.from_message(message)
+        order.recv_ns = time.time_ns()
+        order.recv_mono = time.perf_counter()
+        self.m_orders_in.inc()
+        self.pending_orders.push(order)
+        self.record_order_event(order, "QUEUED")
+        return {"order_id": order.order_id, "status": "QUEUED", "duplicate": False}
+
+    def handle_udp_datagram(self, data, addr):
+        order = json.loads(data.decode('utf-8'))
+        if order.get("command") == "PROFILE":
+            self.profiler.handle_command(order)
+            return
+        if order.get("command") == "CANCEL":
+            self.cancel_order(order.get("order_id"))
+            return
+        result = self.ingest_order(order)
+        if not result["duplicate"]:
+            print(f"UDP Received Order: {result['order_id']} | {order.get('item')} x{order.get('quantity')} (priority {order.get('priority', 0)})")
+        if UDP_ACK:
+            # Best-effort acknowledgement; lets a retrying client learn the original outcome
+            self.udp_socket.sendto(json.dumps(result).encode('utf-8'), addr)
+
     def run(self):
         try:
+            self.profiler.install()
             print(f"Connecting to MQTT {MQTT_BROKER}...")
             self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
             self.mqtt_client.loop_start() 
+            self.trace_recorder.start()
+            self.metrics.start_server(METRICS_PORT)
             
             print("Coordinator Loop Started (CTRL+C to stop)")
             last_heartbeat = time.time()
             
             while True:
                 if time.time() - last_heartbeat > 5:
-                    self.print_world_state()
+                    with self.state_lock:
+                        self.print_world_state()
                     last_heartbeat = time.time()
 
-                # Check for new UDP orders
-                readable, _, _ = select.select([self.udp_socket], [], [], 0.1)
-                
-                for s in readable:
-                    if s is self.udp_socket:
-                        try:
-                            data, addr = self.udp_socket.recvfrom(1024)
-                            order = json.loads(data.decode('utf-8'))
-                            # Sanitize input
-                            if "item" in order: order["item"] = order["item"].strip()
-                            print(f"UDP Received Order: {order.get('order_id', 'unknown')} | {order.get('item')} x{order.get('quantity')}")
-                            self.pending_orders.append(order)
-                        except Exception as e:
-                            print(f"UDP Error: {e}")
-
-                self.process_orders()
+                # Check for new UDP orders and order stream traffic
+                read_list = [self.udp_socket]
+                write_list = []
+                if self.ingest_server:
+                    read_list += self.ingest_server.read_sockets()
+                    write_list = self.ingest_server.write_sockets()
+                readable, writable, _ = select.select(read_list, write_list, [], 0.1)
+
+                with self.state_lock:
+                    for s in writable:
+                        self.ingest_server.handle_writable(s)
+                    
+                    for s in readable:
+                        if self.ingest_server and self.ingest_server.owns(s):
+                            self.ingest_server.handle_readable(s)
+                        elif s is self.udp_socket:
+                            try:
+                                data, addr = self.udp_socket.recvfrom(1024)
+                                self.handle_udp_datagram(data, addr)
+                            except ConnectionResetError:
+                                pass # Windows reports an unreachable client port from an earlier ack here
+                            except Exception as e:
+                                print(f"UDP Error: {e}")
+
+                    self.process_orders()
+                    self.schedule_charging()
+                    self.plan_restocks()
+                    if self.ingest_server:
+                        self.ingest_server.flush_events()
                 
         except KeyboardInterrupt:
             print("Stopping...")
         finally:
+            self.trace_recorder.flush()
+            if self.ingest_server:
+                self.ingest_server.shutdown()
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
 
@@ -0,0 +1,622 @@
+import re
+import sys
+import gzip
+import json
+import math
+import time
+import argparse
+import multiprocessing
+from array import array
+from collections import deque
+from mqtt_capture import MAGIC, CaptureReader
+from battery_analytics import STATE_CODES, STATE_NAMES, STATE_OTHER, NUM_STATES
+
+# Offline fleet KPIs from recorded telemetry: MQTT capture files (mqtt_debugger.py --record)
+# or gateway measurements exported from Influx as line protocol. Records are read in
+# fixed-size column chunks and folded into per-robot arrays, so memory depends on the
+# number of robots, stations and time buckets, not on the length of the recording.
+
+STATUS_TOPIC = "warehouse/+/amr/+/status"
+DISPATCH_TOPIC = "+/internal/tasks/dispatch"
+# robot_commands types that hand a robot a task (QUEUE_TASK: pre-assigned while it is busy)
+TASK_COMMANDS = ("EXECUTE_TASK", "QUEUE_TASK")
+KIND_STATUS = 0
+KIND_COMMAND = 1
+NO_COUNTER = -1
+
+STALLED = STATE_CODES["STALLED"]
+PICKING = STATE_CODES["PICKING"]
+DROPPING = STATE_CODES["DROPPING"]
+# Entering these means the robot dropped its current and queued tasks
+QUEUE_RESET_STATES = (STATE_CODES["IDLE"], STATE_CODES["MOVING_TO_CHARGE"], STALLED)
+TASK_CODES = tuple(STATE_CODES[s] for s in ("MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING"))
+STATE_BYTES = {name.encode('utf-8'): code for name, code in STATE_CODES.items()}
+
+# Capture timestamps are only roughly in file order (several publishers), so time-bounded
+# reads look this far past their bounds and filter exactly
+SLICE_SLACK = 5.0
+
+PICK_BIN = 0.5   # Histogram resolution for pick-to-drop times (seconds)
+PICK_BINS = 480  # Up to 4 minutes; longer ones land in the last bin
+
+STATUS_FIELD = b'"status": "'
+COUNTER_FIELD = re.compile(rb'"tasks_completed": ?(\d+)')
+
+class RecordChunk:
+    # One batch of decoded records as parallel columns
+    __slots__ = ("kind", "robot", "ts", "state", "done", "station")
+
+    def __init__(self):
+        self.kind = array('B')
+        self.robot = array('I')
+        self.ts = array('d')
+        self.state = array('B')
+        self.done = array('q')     # Robot's tasks_completed counter, NO_COUNTER if not reported
+        self.station = array('I')  # Station code for commands
+
+    def __len__(self):
+        return len(self.robot)
+
+    def status(self, robot, ts, state, done=NO_COUNTER):
+        self.kind.append(KIND_STATUS)
+        self.robot.append(robot)
+        self.ts.append(ts)
+        self.state.append(state)
+        self.done.append(done)
+        self.station.append(0)
+
+    def command(self, robot, ts, station):
+        self.kind.append(KIND_COMMAND)
+        self.robot.append(robot)
+        self.ts.append(ts)
+        self.state.append(STATE_OTHER)
+        self.done.append(NO_COUNTER)
+        self.station.append(station)
+
+class KpiAccumulator:
+    # Reconstructs each robot's state intervals from consecutive status records (an interval
+    # belongs to the state it started in; gaps longer than max_gap count as offline) and
+    # folds them into per-robot and per-bucket totals. Records only need to be in time order
+    # per robot, so both capture files (time order) and Influx exports (series order) work.
+    def __init__(self, bucket_seconds=3600, max_gap=20.0):
+        self.bucket_seconds = bucket_seconds
+        self.max_gap = max_gap
+
+        self.robot_codes = {}
+        self.robot_names = []
+        self.station_codes = {"": 0}
+        self.station_names = [""]
+
+        # Per robot, indexed by robot code
+        self.first_seen = array('d')  # First status record, so time slices can be stitched together
+        self.first_state = array('B')
+        self.first_done = array('q')
+        self.last_ts = array('d')
+        self.last_state = array('B')
+        self.last_done = array('q')
+        self.pick_start = array('d')
+        self.drop_start = array('d')
+        self.task_station = array('I')
+        self.picked = array('B')          # Seen a pick matched to a command in this slice
+        self.orphan_drop = array('d')     # Drop (start, end) before that: its command came in the previous slice
+        self.completions = array('I')
+        self.stalls = array('I')
+        self.state_seconds = array('d')  # robot * NUM_STATES + state
+        self.commands = []               # Per robot: deque of (ts, station) not yet matched to a pick
+
+        # Per time bucket: seconds per state, then completions, stalls, dispatches
+        self.buckets = {}
+        self.station_busy = {}  # (station, bucket) -> bitmap of busy seconds
+
+        self.pick_hist = array('I', bytes(4 * PICK_BINS))
+        self.pick_sum = 0.0
+        self.pick_count = 0
+        self.records = 0
+        self.out_of_order = 0
+        self.first_ts = None
+        self.end_ts = None
+
+    def robot_code(self, name):
+        code = self.robot_codes.get(name)
+        if code is None:
+            code = self.robot_codes[name] = len(self.robot_names)
+            self.robot_names.append(name)
+            for column in (self.first_seen, self.last_ts, self.pick_start, self.drop_start):
+                column.append(0.0)
+            self.first_state.append(STATE_OTHER)
+            self.last_state.append(STATE_OTHER)
+            self.first_done.append(NO_COUNTER)
+            self.last_done.append(NO_COUNTER)
+            for column in (self.task_station, self.picked, self.completions, self.stalls):
+                column.append(0)
+            self.orphan_drop.extend((0.0, 0.0))
+            self.state_seconds.extend([0.0] * NUM_STATES)
+            self.commands.append(deque())
+        return code
+
+    def station_code(self, name):
+        code = self.station_codes.get(name)
+        if code is None:
+            code = self.station_codes[name] = len(self.station_names)
+            self.station_names.append(name)
+        return code
+
+    def bucket(self, ts):
+        index = int(ts // self.bucket_seconds)
+        row = self.buckets.get(index)
+        if row is None:
+            row = self.buckets[index] = array('d', bytes(8 * (NUM_STATES + 3)))
+        return row
+
+    def add_chunk(self, chunk):
+        kinds, robots, stamps, states, counters, stations = chunk.kind, chunk.robot, chunk.ts, chunk.state, chunk.done, chunk.station
+        last_ts, last_state, last_done = self.last_ts, self.last_state, self.last_done
+        state_seconds = self.state_seconds
+        max_gap = self.max_gap
+        bucket_seconds = self.bucket_seconds
+        index = row = None
+
+        if len(chunk):
+            first = min(stamps)
+            end = max(stamps)
+            if self.first_ts is None or first < self.first_ts:
+                self.first_ts = first
+            if self.end_ts is None or end > self.end_ts:
+                self.end_ts = end
+        self.records += len(chunk)
+
+        for i in range(len(robots)):
+            r = robots[i]
+            ts = stamps[i]
+            if int(ts // bucket_seconds) != index:
+                index = int(ts // bucket_seconds)
+                row = self.bucket(ts)
+
+            if kinds[i] == KIND_COMMAND:
+                self.commands[r].append((ts, stations[i]))
+                row[NUM_STATES + 2] += 1
+                continue
+
+            prev_ts = last_ts[r]
+            if ts < prev_ts:
+                self.out_of_order += 1
+                continue
+            state = states[i]
+            prev = last_state[r]
+            if prev_ts:
+                dt = ts - prev_ts
+                if dt <= max_gap:
+                    state_seconds[r * NUM_STATES + prev] += dt
+                    row[prev] += dt
+            else:
+                self.first_seen[r] = ts
+                self.first_state[r] = state
+                self.first_done[r] = counters[i]
+            last_ts[r] = ts
+            last_state[r] = state
+
+            # Completions: the robot's own counter when it reports one (survives lost messages
+            # and chained tasks), otherwise leaving DROPPING
+            done = counters[i]
+            if done != NO_COUNTER:
+                before = last_done[r]
+                last_done[r] = done
+                if before != NO_COUNTER and done > before:
+                    self.complete(r, ts, done - before, row)
+            elif prev == DROPPING and state != DROPPING and state != STALLED:
+                self.complete(r, ts, 1, row)
+
+            if state != prev:
+                self.transition(r, ts, prev, state, row)
+
+    def transition(self, r, ts, prev, state, row):
+        if prev == DROPPING:
+            if self.picked[r]:
+                self.mark_station(self.task_station[r], self.drop_start[r], ts)
+            else:
+                self.orphan_drop[2 * r] = self.drop_start[r]
+                self.orphan_drop[2 * r + 1] = ts
+        if state == PICKING:
+            self.pick_start[r] = ts
+            # The oldest dispatched command not yet picked up is the task being started
+            commands = self.commands[r]
+            if commands and commands[0][0] <= ts:
+                self.task_station[r] = commands.popleft()[1]
+                self.picked[r] = 1
+        elif state == DROPPING:
+            self.drop_start[r] = ts
+        elif state in QUEUE_RESET_STATES:
+            self.pick_start[r] = 0.0
+            commands = self.commands[r]
+            while commands and commands[0][0] <= ts:
+                commands.popleft()
+            if state == STALLED:
+                self.stalls[r] += 1
+                row[NUM_STATES + 1] += 1
+
+    def complete(self, r, ts, count, row):
+        self.completions[r] += count
+        row[NUM_STATES] += count
+        start = self.pick_start[r]
+        if start:
+            duration = ts - start
+            self.pick_sum += duration
+            self.pick_count += 1
+            self.pick_hist[min(PICK_BINS - 1, int(duration / PICK_BIN))] += 1
+            self.pick_start[r] = 0.0
+
+    def mark_station(self, station, start, end):
+        # Busy seconds are bits in a per-bucket bitmap, so overlapping drops at one station
+        # count once however the records are ordered
+        if not station or not start or end - start > self.max_gap:
+            return
+        bucket_seconds = self.bucket_seconds
+        for second in range(int(start), max(int(start) + 1, int(end))):
+            index, offset = divmod(second, bucket_seconds)
+            bitmap = self.station_busy.get((station, index))
+            if bitmap is None:
+                bitmap = self.station_busy[(station, index)] = bytearray(bucket_seconds // 8 + 1)
+            bitmap[offset >> 3] |= 1 << (offset & 7)
+
+    def pick_percentile(self, pct):
+        target = self.pick_count * pct / 100.0
+        seen = 0
+        for i, count in enumerate(self.pick_hist):
+            seen += count
+            if count and seen >= target:
+                return (i + 0.5) * PICK_BIN
+        return 0.0
+
+    def merge(self, later):
+        # Folds in the accumulator of the time slice right after this one. Each robot's last
+        # record here is stitched to its first record there, so totals match a single pass
+        # (only pick-to-drop times of tasks that span the boundary are approximate).
+        stations = [self.station_code(name) for name in later.station_names]
+        for lr, name in enumerate(later.robot_names):
+            r = self.robot_code(name)
+            if later.first_seen[lr] and self.last_ts[r]:
+                self.stitch(r, later, lr)
+            if later.orphan_drop[2 * lr]:
+                # Picked here with a command still pending, or picked before the boundary
+                commands = self.commands[r]
+                station = commands.popleft()[1] if commands else self.task_station[r]
+                self.mark_station(station, later.orphan_drop[2 * lr], later.orphan_drop[2 * lr + 1])
+            base = r * NUM_STATES
+            later_base = lr * NUM_STATES
+            for s in range(NUM_STATES):
+                self.state_seconds[base + s] += later.state_seconds[later_base + s]
+            self.completions[r] += later.completions[lr]
+            self.stalls[r] += later.stalls[lr]
+            if not self.first_seen[r]:
+                self.first_seen[r] = later.first_seen[lr]
+                self.first_state[r] = later.first_state[lr]
+                self.first_done[r] = later.first_done[lr]
+            self.picked[r] |= later.picked[lr]
+            if later.last_ts[lr]:
+                self.last_ts[r] = later.last_ts[lr]
+                self.last_state[r] = later.last_state[lr]
+                self.last_done[r] = later.last_done[lr]
+                self.pick_start[r] = later.pick_start[lr]
+                self.drop_start[r] = later.drop_start[lr]
+                self.task_station[r] = stations[later.task_station[lr]]
+            self.commands[r].extend((ts, stations[code]) for ts, code in later.commands[lr])
+
+        for index, later_row in later.buckets.items():
+            row = self.bucket(index * self.bucket_seconds)
+            for i in range(len(row)):
+                row[i] += later_row[i]
+        for (station, index), later_bitmap in later.station_busy.items():
+            key = (stations[station], index)
+            bitmap = self.station_busy.get(key)
+            if bitmap is None:
+                self.station_busy[key] = bytearray(later_bitmap)
+            else:
+                for i, b in enumerate(later_bitmap):
+                    bitmap[i] |= b
+        for i in range(PICK_BINS):
+            self.pick_hist[i] += later.pick_hist[i]
+        self.pick_sum += later.pick_sum
+        self.pick_count += later.pick_count
+        self.records += later.records
+        self.out_of_order += later.out_of_order
+        if later.first_ts is not None and (self.first_ts is None or later.first_ts < self.first_ts):
+            self.first_ts = later.first_ts
+        if later.end_ts is not None and (self.end_ts is None or later.end_ts > self.end_ts):
+            self.end_ts = later.end_ts
+
+    def stitch(self, r, later, lr):
+        # The interval, completion and station drop that fall between the two slices
+        ts = later.first_seen[lr]
+        prev = self.last_state[r]
+        state = later.first_state[lr]
+        row = self.bucket(ts)
+        dt = ts - self.last_ts[r]
+        if 0 <= dt <= self.max_gap:
+            self.state_seconds[r * NUM_STATES + prev] += dt
+            row[prev] += dt
+        before = self.last_done[r]
+        done = later.first_done[lr]
+        if done != NO_COUNTER:
+            if before != NO_COUNTER and done > before:
+                self.complete(r, ts, done - before, row)
+        elif prev == DROPPING and state != DROPPING and state != STALLED:
+            self.complete(r, ts, 1, row)
+        if prev == DROPPING and state != DROPPING:
+            self.mark_station(self.task_station[r], self.drop_start[r], ts)
+        if prev == STALLED and state == STALLED:
+            # The later slice counted the ongoing stall again on its first record
+            self.stalls[r] -= 1
+            row[NUM_STATES + 1] -= 1
+
+    def report(self, top=10):
+        span = (self.end_ts - self.first_ts) if self.first_ts is not None else 0.0
+        totals = [0.0] * NUM_STATES
+        for r in range(len(self.robot_names)):
+            for s in range(NUM_STATES):
+                totals[s] += self.state_seconds[r * NUM_STATES + s]
+        tracked = sum(totals)
+        busy = sum(totals[s] for s in TASK_CODES)
+        completions = sum(self.completions)
+        stalls = sum(self.stalls)
+
+        robots = []
+        for r, name in enumerate(self.robot_names):
+            seconds = self.state_seconds[r * NUM_STATES:(r + 1) * NUM_STATES]
+            robot_tracked = sum(seconds)
+            robots.append({
+                "robot_id": name,
+                "tracked_hours": round(robot_tracked / 3600.0, 3),
+                "utilization": round(sum(seconds[s] for s in TASK_CODES) / robot_tracked, 4) if robot_tracked else 0.0,
+                "completed": self.completions[r],
+                "stalls": self.stalls[r],
+                "stalls_per_hour": round(self.stalls[r] / (robot_tracked / 3600.0), 3) if robot_tracked else 0.0,
+            })
+        robots.sort(key=lambda x: (-x["stalls_per_hour"], x["robot_id"]))
+
+        stations = []
+        for code in range(1, len(self.station_names)):
+            busy_seconds = sum(bin(b).count('1') for (station, _), bitmap in self.station_busy.items()
+                               if station == code for b in bitmap)
+            stations.append({
+                "station_id": self.station_names[code],
+                "busy_seconds": busy_seconds,
+                "idle_seconds": round(max(0.0, span - busy_seconds), 1),
+                "idle_pct": round(max(0.0, 1.0 - busy_seconds / span) * 100.0, 1) if span else 0.0,
+            })
+
+        buckets = []
+        for index in sorted(self.buckets):
+            row = self.buckets[index]
+            bucket_tracked = sum(row[:NUM_STATES])
+            buckets.append({
+                "start": index * self.bucket_seconds,
+                "completed": int(row[NUM_STATES]),
+                "orders_per_hour": round(row[NUM_STATES] * 3600.0 / self.bucket_seconds, 1),
+                "stalls": int(row[NUM_STATES + 1]),
+                "dispatched": int(row[NUM_STATES + 2]),
+                "utilization": round(sum(row[s] for s in TASK_CODES) / bucket_tracked, 4) if bucket_tracked else 0.0,
+            })
+
+        return {
+            "start": self.first_ts,
+            "end": self.end_ts,
+            "records": self.records,
+            "out_of_order": self.out_of_order,
+            "robots": len(self.robot_names),
+            "robot_hours": round(tracked / 3600.0, 2),
+            "utilization": round(busy / tracked, 4) if tracked else 0.0,
+            "state_share": {STATE_NAMES[s]: round(totals[s] / tracked, 4) for s in range(NUM_STATES) if totals[s]} if tracked else {},
+            "completed": completions,
+            "orders_per_hour": round(completions * 3600.0 / span, 1) if span else 0.0,
+            "pick_to_drop_mean": round(self.pick_sum / self.pick_count, 2) if self.pick_count else None,
+            "pick_to_drop_p50": self.pick_percentile(50),
+            "pick_to_drop_p95": self.pick_percentile(95),
+            "stalls": stalls,
+            "stalls_per_robot_hour": round(stalls / (tracked / 3600.0), 3) if tracked else 0.0,
+            "top_stalling_robots": robots[:top],
+            "stations": stations,
+            "buckets": buckets,
+        }
+
+def read_capture(path, acc, chunk_size=65536, start_ts=None, end_ts=None):
+    # Robot status as published by the robots, plus dispatches for station attribution
+    reader = CaptureReader(path)
+    robot_by_topic = {}
+    chunk = RecordChunk()
+    scan_start = start_ts - SLICE_SLACK if start_ts is not None else None
+    scan_end = end_ts + SLICE_SLACK if end_ts is not None else None
+    try:
+        for ts, topic, payload, qos, retain in reader.iter_messages(scan_start, scan_end, [STATUS_TOPIC, DISPATCH_TOPIC]):
+            if (start_ts is not None and ts < start_ts) or (end_ts is not None and ts > end_ts):
+                continue
+            robot = robot_by_topic.get(topic)
+            if robot is None and topic.endswith("/status"):
+                parts = topic.split('/')
+                robot = robot_by_topic[topic] = acc.robot_code(f"{parts[1]}/{parts[3]}")
+            if robot is not None:
+                state, done = parse_status(payload)
+                chunk.status(robot, ts, state, done)
+            else:
+                try:
+                    command = json.loads(payload)
+                except ValueError:
+                    continue
+                if command.get("command") != "EXECUTE_TASK":
+                    continue
+                group = topic.split('/', 1)[0]
+                chunk.command(acc.robot_code(f"{group}/{command.get('robot_id')}"), ts,
+                              acc.station_code(f"{group}/{command.get('target_station_id') or ''}"))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = RecordChunk()
+    finally:
+        reader.close()
+    if len(chunk):
+        yield chunk
+
+def parse_status(payload):
+    # Robots publish json.dumps() output, so the fields are found without a full parse
+    i = payload.find(STATUS_FIELD)
+    if i < 0:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return STATE_OTHER, NO_COUNTER
+        done = msg.get("tasks_completed")
+        return STATE_CODES.get(msg.get("status"), STATE_OTHER), int(done) if done is not None else NO_COUNTER
+    i += len(STATUS_FIELD)
+    state = STATE_BYTES.get(payload[i:payload.find(b'"', i)], STATE_OTHER)
+    match = COUNTER_FIELD.search(payload, i)
+    return state, int(match.group(1)) if match else NO_COUNTER
+
+def read_line_protocol(path, acc, chunk_size=65536, start_ts=None, end_ts=None):
+    # Influx export of the gateway's robot_status and robot_commands measurements
+    robot_by_series = {}
+    chunk = RecordChunk()
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt') as f:
+        for line in f:
+            is_status = line.startswith("robot_status,")
+            if not is_status and not line.startswith("robot_commands,"):
+                continue
+            space = line.find(' ')
+            last_space = line.rfind(' ')
+            try:
+                ts = int(line[last_space + 1:]) / 1e9
+            except ValueError:
+                continue
+            if (start_ts is not None and ts < start_ts) or (end_ts is not None and ts > end_ts):
+                continue
+            series = line[:space]
+            robot = robot_by_series.get(series)
+            if robot is None:
+                tags = dict(tag.split('=', 1) for tag in series.split(',')[1:] if '=' in tag)
+                robot = robot_by_series[series] = acc.robot_code(f"{tags.get('group_id')}/{tags.get('robot_id')}")
+            fields = line[space + 1:last_space]
+            if is_status:
+                chunk.status(robot, ts, STATE_CODES.get(string_field(fields, "status"), STATE_OTHER))
+            elif string_field(fields, "command_type") in TASK_COMMANDS:
+                group = acc.robot_names[robot].split('/', 1)[0]
+                chunk.command(robot, ts, acc.station_code(f"{group}/{string_field(fields, 'target_station') or ''}"))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = RecordChunk()
+    if len(chunk):
+        yield chunk
+
+def string_field(fields, name):
+    prefix = f'{name}="'
+    if fields.startswith(prefix):
+        i = len(prefix)
+    else:
+        i = fields.find(',' + prefix)
+        if i < 0:
+            return None
+        i += len(prefix) + 1
+    return fields[i:fields.find('"', i)]
+
+def is_capture(path):
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_records(path, acc, chunk_size=65536, start_ts=None, end_ts=None):
+    reader = read_capture if is_capture(path) else read_line_protocol
+    return reader(path, acc, chunk_size, start_ts, end_ts)
+
+def plan_slices(paths, workers, start_ts=None, end_ts=None):
+    # Capture files are indexed by time, so each is cut into one slice per worker;
+    # line protocol files can only be read whole
+    jobs = []
+    for path in paths:
+        if workers <= 1 or not is_capture(path):
+            jobs.append((path, start_ts, end_ts))
+            continue
+        reader = CaptureReader(path)
+        first, last = reader.first_ts, reader.last_ts
+        reader.close()
+        if first is None:
+            continue
+        first = max(first, start_ts) if start_ts is not None else first
+        last = min(last, end_ts) if end_ts is not None else last
+        step = (last - first) / workers
+        # The outer bounds stay open: the index's first and last times are only approximate
+        bounds = [start_ts] + [first + step * i for i in range(1, workers)] + [end_ts]
+        for i in range(workers):
+            # Slice ends are exclusive, except for the last one
+            end = bounds[i + 1] if bounds[i + 1] is None or i == workers - 1 else math.nextafter(bounds[i + 1], -math.inf)
+            jobs.append((path, bounds[i], end))
+    return jobs
+
+def analyze_slice(job):
+    path, start_ts, end_ts, bucket_seconds, max_gap, chunk_size = job
+    acc = KpiAccumulator(bucket_seconds, max_gap)
+    for chunk in read_records(path, acc, chunk_size, start_ts, end_ts):
+        acc.add_chunk(chunk)
+    return acc
+
+def analyze(paths, bucket_seconds=3600, max_gap=20.0, chunk_size=65536, workers=1, start_ts=None, end_ts=None):
+    # Slices are analyzed in parallel and merged back in time order
+    jobs = [(path, start, end, bucket_seconds, max_gap, chunk_size)
+            for path, start, end in plan_slices(paths, workers, start_ts, end_ts)]
+    if workers <= 1 or len(jobs) <= 1:
+        acc = KpiAccumulator(bucket_seconds, max_gap)
+        for path, start, end, _, _, _ in jobs:
+            for chunk in read_records(path, acc, chunk_size, start, end):
+                acc.add_chunk(chunk)
+        return acc
+    with multiprocessing.Pool(min(workers, len(jobs))) as pool:
+        results = pool.imap(analyze_slice, jobs)
+        acc = next(results)
+        for later in results:
+            acc.merge(later)
+    return acc
+
+def print_report(report, seconds):
+    print(f"Records: {report['records']} from {report['robots']} robots "
+          f"({report['robot_hours']} robot-hours) in {seconds:.2f}s ({report['records'] / max(seconds, 1e-9):,.0f} records/s)")
+    if report["out_of_order"]:
+        print(f"Skipped {report['out_of_order']} records older than the robot's previous one")
+    print(f"Utilization (task states): {report['utilization'] * 100:.1f}%")
+    print("  " + ", ".join(f"{state} {share * 100:.1f}%" for state, share in report["state_share"].items()))
+    print(f"Orders: {report['completed']} completed, {report['orders_per_hour']} per hour")
+    if report["pick_to_drop_mean"] is not None:
+        print(f"Pick to drop: mean {report['pick_to_drop_mean']}s, p50 {report['pick_to_drop_p50']}s, p95 {report['pick_to_drop_p95']}s")
+    print(f"Stalls: {report['stalls']} ({report['stalls_per_robot_hour']} per robot-hour)")
+    for robot in report["top_stalling_robots"]:
+        if robot["stalls"]:
+            print(f"  {robot['robot_id']:<24} {robot['stalls']:>5} stalls  {robot['stalls_per_hour']:>7} /h  "
+                  f"utilization {robot['utilization'] * 100:.1f}%")
+    for station in report["stations"]:
+        print(f"Station {station['station_id']}: idle {station['idle_seconds']:.0f}s ({station['idle_pct']}%)")
+    print(f"{'Bucket start (UTC)':<22}{'Orders':>8}{'Per hour':>10}{'Stalls':>8}{'Dispatched':>12}{'Util':>8}")
+    for bucket in report["buckets"]:
+        start = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(bucket["start"]))
+        print(f"{start:<22}{bucket['completed']:>8}{bucket['orders_per_hour']:>10}{bucket['stalls']:>8}"
+              f"{bucket['dispatched']:>12}{bucket['utilization'] * 100:>7.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet KPIs from capture files or Influx line protocol exports")
+    parser.add_argument("paths", nargs="+", help="Capture files (.wcap) or line protocol exports (.lp, .lp.gz)")
+    parser.add_argument("--bucket", type=float, default=3600, help="Seconds per time bucket")
+    parser.add_argument("--max-gap", type=float, default=20.0,
+                        help="Longer gaps between status messages count as offline (idle robots report once per keepalive)")
+    parser.add_argument("--chunk", type=int, default=65536, help="Records decoded per chunk")
+    parser.add_argument("--start", type=float, default=None, help="Epoch seconds to start from")
+    parser.add_argument("--end", type=float, default=None, help="Epoch seconds to stop at")
+    parser.add_argument("--top", type=int, default=10, help="Robots listed by stall rate")
+    parser.add_argument("--workers", type=int, default=1, help="Processes; capture files are split into time slices")
+    parser.add_argument("--json", default=None, help="Write the full report (with buckets) as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        acc = analyze(args.paths, int(args.bucket), args.max_gap, args.chunk, args.workers, args.start, args.end)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read telemetry: {e}")
+        sys.exit(1)
+    report = acc.report(args.top)
+    print_report(report, time.perf_counter() - started)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.json}")
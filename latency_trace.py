@@ -0,0 +1,197 @@
+import os
+import sys
+import glob
+import json
+import time
+import threading
+import configparser
+from array import array
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+TRACING_ENABLED = config.getboolean('tracing', 'enabled', fallback=True)
+TRACE_DIR = config.get('tracing', 'dir', fallback='traces')
+TRACE_FLUSH_INTERVAL = config.getfloat('tracing', 'flush_interval', fallback=10.0)
+
+# Log-linear buckets (HDR-style): 32 linear sub-buckets per power of two, ~3% relative error
+SUB_BUCKET_BITS = 5
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+MAX_MAGNITUDE = 40 # Values up to ~2^45 us (over a year)
+BUCKET_COUNT = (MAX_MAGNITUDE + 2) * SUB_BUCKET_HALF
+
+class LatencyHistogram:
+    # Fixed-size histogram of microsecond values; record() is a few integer ops
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * BUCKET_COUNT))
+        self.total = 0
+        self.max_value = 0
+
+    @staticmethod
+    def bucket_index(value):
+        magnitude = value.bit_length() - SUB_BUCKET_BITS
+        if magnitude <= 0:
+            return value
+        if magnitude > MAX_MAGNITUDE:
+            magnitude = MAX_MAGNITUDE
+            value = (SUB_BUCKET_COUNT << magnitude) - 1
+        return magnitude * SUB_BUCKET_HALF + (value >> magnitude)
+
+    @staticmethod
+    def bucket_value(index):
+        # Midpoint of the bucket's value range
+        if index < SUB_BUCKET_COUNT:
+            return index
+        magnitude = index // SUB_BUCKET_HALF - 1
+        sub = index - magnitude * SUB_BUCKET_HALF
+        return (sub << magnitude) + ((1 << magnitude) >> 1)
+
+    def record(self, value_us):
+        value_us = int(value_us)
+        if value_us < 0:
+            value_us = 0
+        self.counts[self.bucket_index(value_us)] += 1
+        self.total += 1
+        if value_us > self.max_value:
+            self.max_value = value_us
+
+    def percentile(self, pct):
+        if self.total == 0:
+            return 0
+        target = max(1, int(self.total * pct / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                if seen >= target:
+                    return min(self.bucket_value(index), self.max_value)
+        return self.max_value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+
+    def to_dict(self):
+        # Sparse form for JSON dumps
+        return {
+            "total": self.total,
+            "max": self.max_value,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c}
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        for index, count in data.get("buckets", {}).items():
+            hist.counts[int(index)] = count
+        hist.total = data.get("total", 0)
+        hist.max_value = data.get("max", 0)
+        return hist
+
+class StageRecorder:
+    # Per-component collection of stage histograms, periodically dumped to TRACE_DIR
+    def __init__(self, component):
+        self.component = component
+        self.stages = {}
+        self.enabled = TRACING_ENABLED
+        self.path = os.path.join(TRACE_DIR, f"{component}.json")
+        self.flush_thread = None
+
+    def record(self, stage, seconds):
+        if not self.enabled:
+            return
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record(seconds * 1e6)
+
+    def record_ns(self, stage, start_ns, end_ns):
+        # Cross-process stages use wall-clock nanoseconds carried in the payload
+        if start_ns and end_ns:
+            self.record(stage, (end_ns - start_ns) / 1e9)
+
+    def flush(self):
+        if not self.enabled or not self.stages:
+            return
+        try:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            data = {
+                "component": self.component,
+                "updated": time.time(),
+                "stages": {name: hist.to_dict() for name, hist in list(self.stages.items())}
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Failed to write trace histograms: {e}")
+
+    def start(self, interval=TRACE_FLUSH_INTERVAL):
+        if not self.enabled or self.flush_thread:
+            return
+
+        def flush_loop():
+            while True:
+                time.sleep(interval)
+                self.flush()
+
+        self.flush_thread = threading.Thread(target=flush_loop, daemon=True)
+        self.flush_thread.start()
+
+# Pipeline order used by the report
+STAGE_ORDER = [
+    "coordinator.queue_wait",
+    "coordinator.dispatch",
+    "mqtt.dispatch_transit",
+    "gateway.encode",
+    "mqtt.command_transit",
+    "robot.accept_to_pick",
+    "robot.pick_to_drop",
+    "order.end_to_end",
+]
+
+def load_histograms(paths):
+    merged = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        for stage, hist_data in data.get("stages", {}).items():
+            hist = LatencyHistogram.from_dict(hist_data)
+            if stage in merged:
+                merged[stage].merge(hist)
+            else:
+                merged[stage] = hist
+    return merged
+
+def format_us(value_us):
+    if value_us >= 1e6:
+        return f"{value_us / 1e6:.2f}s"
+    if value_us >= 1e3:
+        return f"{value_us / 1e3:.1f}ms"
+    return f"{value_us}us"
+
+def print_breakdown(merged):
+    ordered = [s for s in STAGE_ORDER if s in merged] + sorted(s for s in merged if s not in STAGE_ORDER)
+    print(f"{'Stage':<28}{'Count':>10}{'p50':>12}{'p99':>12}{'p999':>12}{'max':>12}")
+    for stage in ordered:
+        h = merged[stage]
+        print(f"{stage:<28}{h.total:>10}{format_us(h.percentile(50)):>12}{format_us(h.percentile(99)):>12}"
+              f"{format_us(h.percentile(99.9)):>12}{format_us(h.max_value):>12}")
+
+if __name__ == "__main__":
+    # Merge per-component dumps into a per-stage latency breakdown
+    paths = sys.argv[1:] or glob.glob(os.path.join(TRACE_DIR, "*.json"))
+    if not paths:
+        print("Usage: python latency_trace.py [trace files...] (default: all files in the trace dir)")
+        sys.exit(1)
+    print_breakdown(load_histograms(paths))
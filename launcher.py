@@ -0,0 +1,331 @@
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import importlib
+import selectors
+import subprocess
+
+# Restart backoff (seconds): doubles per crash up to the cap, back to the start once a
+# process has stayed up for STABLE_SECONDS
+BACKOFF_START = 1.0
+BACKOFF_MAX = 30.0
+STABLE_SECONDS = 60.0
+READY_TIMEOUT = 30.0
+STOP_GRACE = 5.0
+
+# Component scripts are found next to the launcher; config.ini is read from the topology's workdir
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Child:
+    # One process of the topology. state: waiting (dependencies not ready or backing off),
+    # starting (spawned, ready marker not seen yet), ready, exited (not restarted) or stopped.
+    __slots__ = ("name", "component", "argv", "cwd", "env", "cpus", "ready", "ready_timeout", "restart",
+                 "proc", "buffer", "state", "started_at", "ready_at", "first_ready", "next_start",
+                 "backoff", "restarts")
+
+    def __init__(self, name, component, argv, cwd, env, cpus, ready, ready_timeout, restart):
+        self.name = name
+        self.component = component
+        self.argv = argv
+        self.cwd = cwd
+        self.env = env
+        self.cpus = cpus
+        self.ready = ready              # Compiled pattern; None = ready as soon as it is running
+        self.ready_timeout = ready_timeout
+        self.restart = restart
+        self.proc = None
+        self.buffer = b""
+        self.state = "waiting"
+        self.started_at = None
+        self.ready_at = None
+        self.first_ready = None         # Seconds after launch when it was first ready
+        self.next_start = 0.0
+        self.backoff = BACKOFF_START
+        self.restarts = 0
+
+def expand(topology, workdir, scale):
+    # Topology components -> (component name, dependencies, children), in file order.
+    # "count" gives n instances ({n} in the command), "each_shelf" one per catalog shelf
+    # ({shelf}, {zone}); {group} is the topology's group_id everywhere.
+    group_id = topology.get("group_id", "G2021231020")
+    python = topology.get("python") or sys.executable
+    base_env = dict(os.environ)
+    base_env.update(topology.get("env", {}))
+    base_env["PYTHONUNBUFFERED"] = "1"  # Ready markers and log lines arrive as they are printed
+
+    components = []
+    for spec in topology["components"]:
+        name = spec["name"]
+        if spec.get("each_shelf"):
+            catalog = importlib.import_module("catalog").load_catalog()
+            instances = [{"shelf": shelf_id, "zone": catalog.zone_names[catalog.shelf_zone[catalog.shelf_codes[shelf_id]]]}
+                         for shelf_id in catalog.shelf_names[1:]]
+            if name in scale:
+                instances = instances[:scale[name]]
+        else:
+            count = scale.get(name, spec.get("count", 1))
+            instances = [{"n": n} for n in range(1, count + 1)]
+
+        env = dict(base_env)
+        env.update(spec.get("env", {}))
+        ready = re.compile(spec["ready"]) if spec.get("ready") else None
+        cpus = set(spec["cpus"]) if spec.get("cpus") else None
+        children = []
+        for fields in instances:
+            argv = [str(arg).format(group=group_id, **fields) for arg in spec["command"]]
+            if argv[0].endswith(".py"):
+                argv[:1] = [python, os.path.join(REPO_DIR, argv[0])]
+            label = fields.get("shelf", fields.get("n"))
+            child_name = name if len(instances) == 1 and "shelf" not in fields else f"{name}-{label}"
+            children.append(Child(child_name, name, argv, workdir, env, cpus, ready,
+                                  spec.get("ready_timeout", READY_TIMEOUT), spec.get("restart", True)))
+        components.append((name, spec.get("after", []), children))
+    return components
+
+class Launcher:
+    # Starts every process whose dependencies are ready, all at once, and gates dependents on
+    # each process printing its ready marker (connected and subscribed) instead of sleeping.
+    # One selector loop reads every child's output, prefixes it with the process name and
+    # writes it to the console and the log file; the same loop restarts crashed processes with
+    # exponential backoff and, on Ctrl+C or SIGTERM, stops the stack in reverse order.
+    def __init__(self, components, args):
+        self.components = components
+        self.args = args
+        self.children = [child for _, _, children in components for child in children]
+        self.after = {name: after for name, after, _ in components}
+        self.by_component = {name: children for name, _, children in components}
+        # A component scaled to zero has nothing to wait for
+        self.component_ready = {name: not children for name, _, children in components}
+        self.selector = selectors.DefaultSelector()
+        self.log = open(args.log, 'a') if args.log else None
+        self.start_time = time.monotonic()
+        self.all_ready_at = None
+        self.starting = 0
+        self.running = True
+
+        unknown = [dep for after in self.after.values() for dep in after if dep not in self.after]
+        if unknown:
+            raise ValueError(f"Unknown components in 'after': {', '.join(unknown)}")
+        if any(child.cpus for child in self.children) and not hasattr(os, "sched_setaffinity"):
+            self.say("WARNING: CPU affinity is not supported on this platform, ignoring 'cpus'")
+            for child in self.children:
+                child.cpus = None
+
+    def say(self, line):
+        self.emit("launcher", line)
+
+    def emit(self, name, line):
+        stamped = f"{time.strftime('%H:%M:%S')} {name:<14}| {line}"
+        if not self.args.quiet or name == "launcher":
+            print(stamped, flush=True)
+        if self.log:
+            self.log.write(stamped + "\n")
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def spawn(self, child):
+        cpus = child.cpus
+        try:
+            child.proc = subprocess.Popen(child.argv, cwd=child.cwd, env=child.env, stdin=subprocess.DEVNULL,
+                                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True,
+                                          preexec_fn=(lambda: os.sched_setaffinity(0, cpus)) if cpus else None)
+        except (OSError, subprocess.SubprocessError) as e:
+            # A bad "cpus" entry fails in preexec_fn and surfaces as SubprocessError
+            self.say(f"Failed to start {child.name}: {e}")
+            self.schedule_restart(child, time.monotonic())
+            return
+        os.set_blocking(child.proc.stdout.fileno(), False)
+        self.selector.register(child.proc.stdout, selectors.EVENT_READ, child)
+        child.buffer = b""
+        child.started_at = time.monotonic()
+        child.ready_at = None
+        if child.ready is None:
+            self.mark_ready(child)
+        else:
+            child.state = "starting"
+            self.starting += 1
+
+    def mark_ready(self, child):
+        child.state = "ready"
+        child.ready_at = time.monotonic()
+        if child.first_ready is None:
+            child.first_ready = self.elapsed()
+        if child.restarts:
+            self.say(f"{child.name} ready again after {child.ready_at - child.started_at:.2f}s")
+        component = child.component
+        if not self.component_ready[component] and all(c.state == "ready" for c in self.by_component[component]):
+            self.component_ready[component] = True
+            self.say(f"{component}: {len(self.by_component[component])} ready at {self.elapsed():.2f}s")
+
+    def read(self, child):
+        try:
+            data = os.read(child.proc.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return False
+        if not data:
+            self.selector.unregister(child.proc.stdout)
+            data = b"\n" if child.buffer else b""
+        lines = (child.buffer + data).split(b"\n")
+        child.buffer = lines.pop()
+        for raw in lines:
+            line = raw.decode('utf-8', 'replace').rstrip()
+            self.emit(child.name, line)
+            if child.state == "starting" and child.ready.search(line):
+                self.mark_ready(child)
+        return bool(data)
+
+    def drain(self, child):
+        # Whatever an exited process left in its pipe, then the pipe is closed. A pipe still held
+        # open by something the process started is dropped rather than waited for.
+        stdout = child.proc.stdout
+        while stdout.fileno() in self.selector.get_map() and self.read(child):
+            pass
+        if stdout.fileno() in self.selector.get_map():
+            self.selector.unregister(stdout)
+        stdout.close()
+
+    def schedule_restart(self, child, now):
+        child.proc = None
+        if not child.restart:
+            child.state = "exited"
+            return
+        child.state = "waiting"
+        child.next_start = now + child.backoff
+        child.restarts += 1
+        self.say(f"Restarting {child.name} in {child.backoff:.0f}s (restart {child.restarts})")
+        child.backoff = min(child.backoff * 2, BACKOFF_MAX)
+
+    def check(self, child, now):
+        proc = child.proc
+        if child.state == "waiting":
+            # Dependencies only gate the first start; a restart does not wait for them again
+            if now < child.next_start or (self.args.max_starting and self.starting >= self.args.max_starting):
+                return
+            if child.restarts or all(self.component_ready[d] for d in self.after[child.component]):
+                self.spawn(child)
+            return
+        if proc is None:
+            return
+        rc = proc.poll()
+        if rc is None:
+            if child.state == "starting" and now - child.started_at > child.ready_timeout:
+                self.say(f"{child.name} not ready after {child.ready_timeout:.0f}s, killing it")
+                proc.kill()
+            elif child.state == "ready" and child.backoff > BACKOFF_START and now - child.ready_at > STABLE_SECONDS:
+                child.backoff = BACKOFF_START
+            return
+        self.drain(child)
+        self.say(f"{child.name} exited with code {rc} after {now - child.started_at:.1f}s")
+        self.schedule_restart(child, now)
+
+    def report(self):
+        # Time to ready per component: first, median and last process, from launcher start
+        total = len(self.children)
+        self.say(f"All {total} processes ready in {self.all_ready_at:.2f}s")
+        summary = {"processes": total, "ready_seconds": round(self.all_ready_at, 3), "components": {}}
+        for name, _, children in self.components:
+            if not children:
+                continue
+            times = sorted(child.first_ready for child in children)
+            entry = {"count": len(times), "first": round(times[0], 3), "median": round(times[len(times) // 2], 3),
+                     "last": round(times[-1], 3), "restarts": sum(child.restarts for child in children)}
+            summary["components"][name] = entry
+            self.say(f"  {name:<14}{entry['count']:>6}  first {entry['first']:.2f}s  median {entry['median']:.2f}s  "
+                     f"last {entry['last']:.2f}s")
+        if self.args.output:
+            with open(self.args.output, 'w') as f:
+                json.dump(summary, f, indent=2)
+            self.say(f"Startup report written to {self.args.output}")
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.on_signal)
+        signal.signal(signal.SIGTERM, self.on_signal)
+        self.say(f"Launching {len(self.children)} processes in {len(self.components)} components")
+        try:
+            while self.running:
+                now = time.monotonic()
+                self.starting = sum(1 for child in self.children if child.state == "starting")
+                for child in self.children:
+                    self.check(child, now)
+                for key, _ in self.selector.select(timeout=0.1):
+                    self.read(key.data)
+                if self.all_ready_at is None and all(self.component_ready.values()):
+                    self.all_ready_at = self.elapsed()
+                    self.report()
+                    if self.args.exit_when_ready:
+                        break
+        finally:
+            self.stop()
+            if self.log:
+                self.log.close()
+
+    def on_signal(self, signum, frame):
+        self.running = False
+
+    def stop(self):
+        # Reverse topology order so devices go before the gateway and the broker goes last.
+        # SIGINT first (components clean up on KeyboardInterrupt), SIGKILL after the grace period.
+        for name, _, children in reversed(self.components):
+            live = [child for child in children if child.proc is not None and child.proc.poll() is None]
+            for child in live:
+                child.proc.send_signal(signal.SIGINT)
+            deadline = time.monotonic() + STOP_GRACE
+            while live and time.monotonic() < deadline:
+                for key, _ in self.selector.select(timeout=0.1):
+                    self.read(key.data)
+                live = [child for child in live if child.proc.poll() is None]
+            for child in live:
+                child.proc.kill()
+            for child in children:
+                if child.proc is not None:
+                    child.proc.wait()
+                    self.drain(child)
+                    child.proc = None
+                child.state = "stopped"
+        self.say("All processes stopped")
+
+def parse_scale(values):
+    scale = {}
+    for value in values:
+        name, _, count = value.partition("=")
+        scale[name] = int(count)
+    return scale
+
+def main():
+    parser = argparse.ArgumentParser(description="Start, supervise and stop the warehouse stack from a topology file")
+    parser.add_argument("topology", nargs="?", default="topology.json", help="Topology file (default: topology.json)")
+    parser.add_argument("--scale", action="append", default=[], metavar="NAME=COUNT",
+                        help="Override a component's instance count, e.g. --scale robot=200")
+    parser.add_argument("--max-starting", type=int, default=2 * (os.cpu_count() or 1),
+                        help="Processes starting at the same time (0 = no limit); earlier components go first")
+    parser.add_argument("--log", default=None, help="Also append the aggregated output to this file")
+    parser.add_argument("--quiet", action="store_true", help="Only print launcher messages on the console")
+    parser.add_argument("--output", default=None, help="Write the time-to-ready report as JSON")
+    parser.add_argument("--exit-when-ready", action="store_true", help="Stop everything once the stack is ready (startup timing)")
+    args = parser.parse_args()
+
+    topology_path = os.path.abspath(args.topology)
+    args.log = os.path.abspath(args.log) if args.log else None
+    args.output = os.path.abspath(args.output) if args.output else None
+    with open(topology_path) as f:
+        topology = json.load(f)
+
+    # Components and the catalog read config.ini from the working directory
+    workdir = os.path.abspath(os.path.join(os.path.dirname(topology_path), topology.get("workdir", ".")))
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    try:
+        launcher = Launcher(expand(topology, workdir, parse_scale(args.scale)), args)
+    except (KeyError, ValueError) as e:
+        print(f"Invalid topology {topology_path}: {e}")
+        sys.exit(1)
+    launcher.run()
+
+if __name__ == "__main__":
+    main()
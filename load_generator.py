@@ -0,0 +1,269 @@
+import time
+import json
+import random
+import socket
+import argparse
+import threading
+import configparser
+import multiprocessing
+import paho.mqtt.client as mqtt
+from catalog import load_catalog
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+MQTT_BROKER = config.get('mqtt', 'broker', fallback='localhost')
+MQTT_PORT = config.getint('mqtt', 'port', fallback=1883)
+
+ITEMS = load_catalog().stocked_items() # Every catalog item that has a shelf
+
+def parse_weights(spec):
+    # "P1:0.5,P2:0.3,P3:0.2" -> (["P1", "P2", "P3"], [0.5, 0.3, 0.2])
+    names, weights = [], []
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        names.append(name.strip())
+        weights.append(float(weight) if weight else 1.0)
+    return names, weights
+
+def zipf_weights(n, s):
+    # Rank 1 is the most popular item
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+def parse_steps(spec):
+    # "50:10,200:30" -> [(50.0, 10.0), (200.0, 30.0)] (rate per second, duration seconds)
+    steps = []
+    for part in spec.split(','):
+        rate, _, duration = part.partition(':')
+        steps.append((float(rate), float(duration)))
+    return steps
+
+class RateProfile:
+    # Target rate as a function of elapsed time: constant, linear ramp-up, or step list
+    def __init__(self, rate, duration, ramp=0.0, steps=None):
+        self.rate = rate
+        self.ramp = ramp
+        self.steps = steps
+        self.duration = sum(d for _, d in steps) if steps else duration
+
+    def rate_at(self, elapsed):
+        if self.steps:
+            for rate, duration in self.steps:
+                if elapsed < duration:
+                    return rate
+                elapsed -= duration
+            return 0.0
+        if self.ramp > 0 and elapsed < self.ramp:
+            return max(self.rate * elapsed / self.ramp, self.rate * 0.01)
+        return self.rate
+
+    def expected_orders(self):
+        if self.steps:
+            return sum(r * d for r, d in self.steps)
+        ramp = min(self.ramp, self.duration)
+        return self.rate * (self.duration - ramp) + self.rate * ramp / 2.0
+
+class OrderStream:
+    def __init__(self, run_id, worker_id, zipf_s, stations, station_weights, quantity, seed=None):
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.rng = random.Random(seed)
+        self.items = ITEMS
+        self.item_weights = zipf_weights(len(ITEMS), zipf_s)
+        self.stations = stations
+        self.station_weights = station_weights
+        self.quantity = quantity
+        self.seq = 0
+
+    def next_order(self):
+        self.seq += 1
+        # Send time is embedded in the order_id so the watcher can compute latency without shared state
+        sent_us = time.time_ns() // 1000
+        return {
+            "item": self.rng.choices(self.items, self.item_weights)[0],
+            "quantity": self.quantity,
+            "pack_station": self.rng.choices(self.stations, self.station_weights)[0],
+            "order_id": f"lg-{self.run_id}-{self.worker_id}-{self.seq}-{sent_us}"
+        }
+
+def run_worker(worker_id, args, share, result_queue):
+    # Open-loop sender: arrivals are scheduled ahead of time and never wait for the coordinator
+    stations, station_weights = parse_weights(args.stations)
+    steps = parse_steps(args.steps) if args.steps else None
+    profile = RateProfile(args.rate * share, args.duration, args.ramp, [(r * share, d) for r, d in steps] if steps else None)
+    stream = OrderStream(args.run_id, worker_id, args.zipf, stations, station_weights, args.quantity,
+                         seed=None if args.seed is None else args.seed + worker_id)
+    rng = random.Random(None if args.seed is None else args.seed * 31 + worker_id)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = (args.host, args.port)
+
+    sent = 0
+    errors = 0
+    max_lag = 0.0
+    start = time.perf_counter()
+    next_send = start
+    while True:
+        elapsed = next_send - start
+        if elapsed >= profile.duration:
+            break
+        rate = profile.rate_at(elapsed)
+        if rate <= 0:
+            next_send += 0.01
+            continue
+
+        now = time.perf_counter()
+        if next_send > now:
+            time.sleep(next_send - now)
+        else:
+            max_lag = max(max_lag, now - next_send)
+
+        try:
+            sock.sendto(json.dumps(stream.next_order()).encode('utf-8'), target)
+            sent += 1
+        except OSError:
+            errors += 1
+
+        if args.arrival == "poisson":
+            next_send += rng.expovariate(rate)
+        else:
+            next_send += 1.0 / rate
+
+    sock.close()
+    result_queue.put({
+        "worker": worker_id,
+        "sent": sent,
+        "errors": errors,
+        "elapsed": time.perf_counter() - start,
+        "max_lag": max_lag
+    })
+
+class DispatchWatcher:
+    # Subscribes to the dispatch topic and measures order-to-dispatch latency for our orders
+    def __init__(self, group_id, run_id):
+        self.topic = f"{group_id}/internal/tasks/dispatch"
+        self.prefix = f"lg-{run_id}-"
+        self.latencies = []
+        self.ready = threading.Event()
+
+        self.client = mqtt.Client(client_id=f"loadgen-{group_id}-{run_id}")
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = self.on_message
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            client.subscribe(self.topic)
+        else:
+            print(f"Failed to connect to MQTT, rc={rc}")
+
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        self.ready.set()
+
+    def on_message(self, client, userdata, msg):
+        now_us = time.time_ns() // 1000
+        try:
+            order_id = json.loads(msg.payload.decode('utf-8')).get("order_id", "")
+            if order_id.startswith(self.prefix):
+                sent_us = int(order_id.rsplit('-', 1)[1])
+                self.latencies.append((now_us - sent_us) / 1000.0)
+        except (ValueError, AttributeError):
+            pass
+
+    def start(self):
+        self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+        if not self.ready.wait(5):
+            print("WARNING: Dispatch watcher did not subscribe within 5s")
+
+    def stop(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def print_report(args, results, watcher, expected):
+    sent = sum(r["sent"] for r in results)
+    errors = sum(r["errors"] for r in results)
+    elapsed = max((r["elapsed"] for r in results), default=0.0)
+    achieved = sent / elapsed if elapsed > 0 else 0.0
+    target = expected / elapsed if elapsed > 0 else 0.0
+
+    print("\n--- Load Generator Report ---")
+    print(f"Arrival: {args.arrival} | Processes: {args.processes} | Duration: {elapsed:.1f}s")
+    print(f"Orders Sent: {sent} (expected {expected:.0f}) | Send Errors: {errors}")
+    print(f"Target Rate: {target:.1f}/s | Achieved Rate: {achieved:.1f}/s ({(achieved / target * 100) if target else 0:.1f}%)")
+    print(f"Max Scheduling Lag: {max((r['max_lag'] for r in results), default=0.0) * 1000:.1f} ms")
+
+    if watcher:
+        lat = sorted(watcher.latencies)
+        print(f"Dispatched: {len(lat)}/{sent} ({(len(lat) / sent * 100) if sent else 0:.1f}%)")
+        if lat:
+            print(f"Order->Dispatch Latency (ms): p50={percentile(lat, 50):.1f} p90={percentile(lat, 90):.1f} "
+                  f"p99={percentile(lat, 99):.1f} max={lat[-1]:.1f}")
+    print("-----------------------------\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop order load generator for the Fleet Coordinator")
+    parser.add_argument("group_id")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9091)
+    parser.add_argument("--rate", type=float, default=50.0, help="Target orders per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (ignored with --steps)")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Linear ramp-up time in seconds")
+    parser.add_argument("--steps", default=None, help="Step profile as rate:seconds,... e.g. 20:10,100:30")
+    parser.add_argument("--zipf", type=float, default=1.0, help="Zipf exponent for item popularity (0 = uniform)")
+    parser.add_argument("--stations", default="P1:1,P2:1,P3:1", help="Station mix as name:weight,...")
+    parser.add_argument("--quantity", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1, help="Sender processes for high rates")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--watch", action="store_true", help="Measure order-to-dispatch latency via MQTT")
+    parser.add_argument("--drain", type=float, default=5.0, help="Seconds to keep watching after sending")
+    args = parser.parse_args()
+    args.run_id = f"{int(time.time()) % 100000}"
+
+    steps = parse_steps(args.steps) if args.steps else None
+    expected = RateProfile(args.rate, args.duration, args.ramp, steps).expected_orders()
+
+    watcher = None
+    if args.watch:
+        watcher = DispatchWatcher(args.group_id, args.run_id)
+        watcher.start()
+
+    target_desc = f"steps {args.steps}" if args.steps else f"{args.rate}/s"
+    print(f"[{args.group_id}] Load run {args.run_id}: {args.arrival} @ {target_desc} -> {args.host}:{args.port}")
+    result_queue = multiprocessing.Queue()
+    share = 1.0 / args.processes
+    try:
+        if args.processes == 1:
+            run_worker(0, args, share, result_queue)
+        else:
+            workers = [multiprocessing.Process(target=run_worker, args=(i, args, share, result_queue))
+                       for i in range(args.processes)]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        results = [result_queue.get() for _ in range(args.processes)]
+
+        if watcher:
+            time.sleep(args.drain)
+    except KeyboardInterrupt:
+        print("Stopping load generator...")
+        results = []
+        while not result_queue.empty():
+            results.append(result_queue.get())
+    finally:
+        if watcher:
+            watcher.stop()
+
+    print_report(args, results, watcher, expected)
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,35 @@
+import socket
 import logging
 import asyncio
+import threading
 from amqtt.broker import Broker
 
-# Configuration for the broker
-config = {
-    'listeners': {
-        'default': {
-            'type': 'tcp',
-            'bind': '0.0.0.0:1883',
+def build_config(port=1883, bind_host='0.0.0.0'):
+    # Configuration for the broker
+    return {
+        'listeners': {
+            'default': {
+                'type': 'tcp',
+                'bind': f'{bind_host}:{port}',
+            },
         },
-    },
-    'sys_interval': 10,
-    'auth': {
-        'allow_anonymous': True,
-        'password_file': '',
-        'plugins': [
-            'auth_anonymous'
-        ]
+        'sys_interval': 10,
+        'auth': {
+            'allow_anonymous': True,
+            'password_file': '',
+            'plugins': [
+                'auth_anonymous'
+            ]
+        }
     }
-}
+
+config = build_config()
+
+def find_free_port():
+    # Ask the OS for an ephemeral port (the broker binds it right after)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
 
 async def start_broker():
     broker = Broker(config)
@@ -32,9 +43,51 @@ async def start_broker():
         print("Stopping broker...")
         await broker.shutdown()
 
+class EmbeddedBroker:
+    # Runs the broker on a private event loop in a background thread (benchmarks, harnesses)
+    def __init__(self, port=0):
+        self.port = port or find_free_port()
+        self.loop = None
+        self.broker = None
+        self.thread = None
+        self.started = threading.Event()
+        self.error = None
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.broker = Broker(build_config(self.port, '127.0.0.1'))
+            self.loop.run_until_complete(self.broker.start())
+        except Exception as e:
+            self.error = e
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+
+    def start(self, timeout=10):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if not self.started.wait(timeout):
+            raise RuntimeError("Embedded broker did not start in time")
+        if self.error:
+            raise RuntimeError(f"Embedded broker failed to start: {self.error}")
+        return self.port
+
+    def stop(self):
+        if not self.loop:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.broker.shutdown(), self.loop).result(5)
+        except Exception as e:
+            print(f"Error stopping embedded broker: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
 if __name__ == "__main__":
     formatter = "[%(asctime)s] %(name)s {%(filename)s:%(lineno)d} %(levelname)s - %(message)s"
     logging.basicConfig(level=logging.INFO, format=formatter, filename='broker.log', filemode='w')
-    
+
     # Run the broker
     asyncio.run(start_broker())
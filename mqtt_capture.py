@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import mmap
+import struct
+from bisect import bisect_right
+
+# Capture file layout (all little-endian):
+#   header:  MAGIC | u32 metadata length | metadata JSON
+#   records: u8 type, then
+#     REC_TOPIC:   u32 topic_id | u16 length | topic bytes           (first use of a topic)
+#     REC_MESSAGE: f64 timestamp | u32 topic_id | u8 flags | u32 length | payload bytes
+# A sidecar "<file>.idx" (JSON) holds sparse time and per-topic offsets. It is written once,
+# on close, so recording cost does not grow with capture length; readers rebuild the index by
+# scanning whatever lies past its end_offset (all of it after a crash), so no data is lost.
+MAGIC = b"WHCAP001"
+REC_TOPIC = 1
+REC_MESSAGE = 2
+TOPIC_HEADER = struct.Struct("<BIH")
+MESSAGE_HEADER = struct.Struct("<BdIBI")
+FLAG_RETAIN = 0x04
+
+def topic_matches(topic_filter, topic):
+    # MQTT wildcard match for '+' and '#'
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[i]:
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+class CaptureWriter:
+    def __init__(self, path, metadata=None, index_every_messages=1000, index_every_seconds=1.0, flush_every_seconds=5.0):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.index_every_messages = index_every_messages
+        self.index_every_seconds = index_every_seconds
+        self.flush_every_seconds = flush_every_seconds
+
+        self.topics = {}
+        self.time_index = []   # [timestamp, offset, message number]
+        self.topic_index = {}  # topic_id -> [[timestamp, offset], ...]
+        self.topic_counts = {}
+        self.messages = 0
+        self.bytes = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.last_time_entry = 0.0
+        self.last_flush = time.time()
+
+        self.file = open(path, 'wb', buffering=1 << 20)
+        # An index left by an earlier capture at this path would describe the wrong file
+        try:
+            os.remove(self.index_path)
+        except OSError:
+            pass
+        meta = json.dumps(metadata or {}).encode('utf-8')
+        self.file.write(MAGIC + struct.pack("<I", len(meta)) + meta)
+        self.offset = len(MAGIC) + 4 + len(meta)
+        self.metadata = metadata or {}
+
+    def write(self, topic, payload, qos=0, retain=False, ts=None):
+        ts = ts if ts is not None else time.time()
+        topic_id = self.topics.get(topic)
+        if topic_id is None:
+            topic_id = self.topics[topic] = len(self.topics)
+            encoded = topic.encode('utf-8')
+            self.file.write(TOPIC_HEADER.pack(REC_TOPIC, topic_id, len(encoded)) + encoded)
+            self.offset += TOPIC_HEADER.size + len(encoded)
+            self.topic_index[topic_id] = []
+            self.topic_counts[topic_id] = 0
+
+        # Sparse indexes: a time entry every N messages or T seconds, a topic entry every N of that topic
+        if self.messages % self.index_every_messages == 0 or ts - self.last_time_entry >= self.index_every_seconds:
+            self.time_index.append([ts, self.offset, self.messages])
+            self.last_time_entry = ts
+        if self.topic_counts[topic_id] % self.index_every_messages == 0:
+            self.topic_index[topic_id].append([ts, self.offset])
+        self.topic_counts[topic_id] += 1
+
+        flags = (qos & 0x03) | (FLAG_RETAIN if retain else 0)
+        self.file.write(MESSAGE_HEADER.pack(REC_MESSAGE, ts, topic_id, flags, len(payload)))
+        self.file.write(payload)
+        self.offset += MESSAGE_HEADER.size + len(payload)
+
+        self.messages += 1
+        self.bytes += len(payload)
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+
+        if ts - self.last_flush >= self.flush_every_seconds:
+            self.flush()
+
+    def flush(self):
+        # Data only: the index stays in memory until close
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def write_index(self):
+        index = {
+            "end_offset": self.offset,
+            "messages": self.messages,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "topics": {str(tid): topic for topic, tid in self.topics.items()},
+            "topic_counts": {str(tid): count for tid, count in self.topic_counts.items()},
+            "time_index": self.time_index,
+            "topic_index": {str(tid): entries for tid, entries in self.topic_index.items()},
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        self.flush()
+        self.write_index()
+        self.file.close()
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        meta_len = struct.unpack_from("<I", self.data, len(MAGIC))[0]
+        self.header_end = len(MAGIC) + 4 + meta_len
+        self.metadata = json.loads(bytes(self.data[len(MAGIC) + 4:self.header_end]).decode('utf-8'))
+
+        self.topics = {}
+        self.topic_counts = {}
+        self.time_index = []
+        self.topic_index = {}
+        self.messages = 0
+        self.first_ts = None
+        self.last_ts = None
+        self._load_index()
+
+    def _load_index(self):
+        scan_from = self.header_end
+        try:
+            with open(self.path + ".idx") as f:
+                index = json.load(f)
+            self.topics = {int(tid): topic for tid, topic in index["topics"].items()}
+            self.topic_counts = {int(tid): count for tid, count in index["topic_counts"].items()}
+            self.time_index = index["time_index"]
+            self.topic_index = {int(tid): entries for tid, entries in index["topic_index"].items()}
+            self.messages = index["messages"]
+            self.first_ts = index["first_ts"]
+            self.last_ts = index["last_ts"]
+            scan_from = min(index["end_offset"], len(self.data))
+        except (OSError, ValueError, KeyError):
+            pass
+
+        # Extend the index over anything written after the last index flush
+        last_entry = self.time_index[-1][0] if self.time_index else 0.0
+        for kind, offset, ts, topic_id, flags, payload in self._scan(scan_from):
+            if kind != REC_MESSAGE:
+                continue
+            if self.messages % 1000 == 0 or ts - last_entry >= 1.0:
+                self.time_index.append([ts, offset, self.messages])
+                last_entry = ts
+            count = self.topic_counts.get(topic_id, 0)
+            if count % 1000 == 0:
+                self.topic_index.setdefault(topic_id, []).append([ts, offset])
+            self.topic_counts[topic_id] = count + 1
+            self.messages += 1
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+
+    def _scan(self, offset, end=None):
+        # Yields (kind, offset, ts, topic_id, flags, payload) where payload is a memoryview
+        data = self.data
+        end = len(data) if end is None else end
+        view = memoryview(data)
+        while offset < end:
+            kind = data[offset]
+            if kind == REC_TOPIC:
+                if offset + TOPIC_HEADER.size > end:
+                    return
+                _, topic_id, length = TOPIC_HEADER.unpack_from(data, offset)
+                start = offset + TOPIC_HEADER.size
+                if start + length > end:
+                    return
+                self.topics[topic_id] = bytes(data[start:start + length]).decode('utf-8')
+                yield REC_TOPIC, offset, None, topic_id, 0, None
+                offset = start + length
+            elif kind == REC_MESSAGE:
+                if offset + MESSAGE_HEADER.size > end:
+                    return
+                _, ts, topic_id, flags, length = MESSAGE_HEADER.unpack_from(data, offset)
+                start = offset + MESSAGE_HEADER.size
+                if start + length > end:
+                    return # Truncated tail (writer crashed mid-record)
+                yield REC_MESSAGE, offset, ts, topic_id, flags, view[start:start + length]
+                offset = start + length
+            else:
+                raise ValueError(f"Corrupt capture record at offset {offset}")
+
+    def seek_offset(self, start_ts=None, topic_ids=None):
+        # Closest indexed offset at or before start_ts (optionally using the per-topic index)
+        if start_ts is None:
+            return self.header_end
+        if topic_ids is not None and len(topic_ids) == 1:
+            entries = self.topic_index.get(next(iter(topic_ids)), [])
+        else:
+            entries = self.time_index
+        pos = bisect_right([e[0] for e in entries], start_ts) - 1
+        return entries[pos][1] if pos >= 0 else self.header_end
+
+    def iter_messages(self, start_ts=None, end_ts=None, topic_filters=None):
+        # Yields (timestamp, topic, payload_bytes, qos, retain)
+        topic_ids = None
+        if topic_filters:
+            topic_ids = {tid for tid, topic in self.topics.items() if any(topic_matches(f, topic) for f in topic_filters)}
+        # Topic definitions before the seek point are already known from the index
+        for kind, offset, ts, topic_id, flags, payload in self._scan(self.seek_offset(start_ts, topic_ids)):
+            if kind != REC_MESSAGE:
+                if topic_filters and kind == REC_TOPIC:
+                    topic = self.topics[topic_id]
+                    if any(topic_matches(f, topic) for f in topic_filters):
+                        topic_ids.add(topic_id)
+                continue
+            if start_ts is not None and ts < start_ts:
+                continue
+            if end_ts is not None and ts > end_ts:
+                return
+            if topic_ids is not None and topic_id not in topic_ids:
+                continue
+            yield ts, self.topics[topic_id], bytes(payload), flags & 0x03, bool(flags & FLAG_RETAIN)
+
+    def summary(self):
+        duration = (self.last_ts - self.first_ts) if self.first_ts is not None else 0.0
+        return {
+            "messages": self.messages,
+            "topics": len(self.topics),
+            "duration": duration,
+            "bytes": len(self.data),
+            "metadata": self.metadata,
+        }
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+def replay(reader, publish, speed=1.0, start_ts=None, end_ts=None, topic_filters=None, topic_rewrite=None, progress=None):
+    # Republishes with original inter-message timing scaled by speed (speed <= 0: as fast as possible)
+    sent = 0
+    first_ts = None
+    wall_start = time.perf_counter()
+    for ts, topic, payload, qos, retain in reader.iter_messages(start_ts, end_ts, topic_filters):
+        if first_ts is None:
+            first_ts = ts
+        if speed > 0:
+            delay = (ts - first_ts) / speed - (time.perf_counter() - wall_start)
+            if delay > 0:
+                time.sleep(delay)
+        if topic_rewrite:
+            topic = topic_rewrite(topic)
+        publish(topic, payload, qos, retain)
+        sent += 1
+        if progress and sent % 1000 == 0:
+            progress(sent, time.perf_counter() - wall_start)
+    return sent, time.perf_counter() - wall_start
@@ -1,9 +1,11 @@
-import sys
 import time
 import json
 import datetime
+import argparse
+import threading
 import configparser
 import paho.mqtt.client as mqtt
+from mqtt_capture import CaptureWriter, CaptureReader, replay
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -12,9 +14,149 @@ config.read('config.ini')
 BROKER = config['mqtt']['broker']
 PORT = int(config['mqtt']['port'])
 
+# Entity-id positions per topic layout, replaced by '+' to group topics into patterns
+ENTITY_SEGMENTS = {
+    ("warehouse", "amr"): (3,),
+    ("warehouse", "locations"): (3, 4),
+    ("internal", "amr"): (3,),
+    ("internal", "static"): (3,),
+    ("internal", "alerts"): (3,),
+}
+SIZE_BUCKETS = 24 # Power-of-two payload size buckets (up to 8 MB)
+
+class TrafficStats:
+    # Aggregates traffic without decoding payloads; render() is called from the main thread
+    def __init__(self, top_n=10):
+        self.top_n = top_n
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.pattern_cache = {}
+        self.patterns = {}  # pattern -> [messages, bytes, max_size, size buckets]
+        self.window = {}    # pattern -> [messages, bytes] since the last render
+        self.talkers = {}   # topic -> messages
+        self.arrivals = {}  # robot_id -> [last_ts, count, mean, m2] (Welford over inter-arrival)
+        self.total_messages = 0
+        self.total_bytes = 0
+        self.last_render = self.start
+
+    def topic_pattern(self, topic):
+        pattern = self.pattern_cache.get(topic)
+        if pattern is None:
+            parts = topic.split('/')
+            kind = "warehouse" if parts[0] == "warehouse" else "internal" if len(parts) > 1 and parts[1] == "internal" else None
+            positions = ENTITY_SEGMENTS.get((kind, parts[2] if len(parts) > 2 else None), ())
+            for pos in positions:
+                if pos < len(parts) - 1:
+                    parts[pos] = '+'
+            pattern = self.pattern_cache[topic] = '/'.join(parts)
+        return pattern
+
+    def add(self, topic, size, now):
+        pattern = self.topic_pattern(topic)
+        with self.lock:
+            self.total_messages += 1
+            self.total_bytes += size
+
+            stats = self.patterns.get(pattern)
+            if stats is None:
+                stats = self.patterns[pattern] = [0, 0, 0, [0] * SIZE_BUCKETS]
+            stats[0] += 1
+            stats[1] += size
+            if size > stats[2]:
+                stats[2] = size
+            stats[3][min(size.bit_length(), SIZE_BUCKETS - 1)] += 1
+
+            window = self.window.get(pattern)
+            if window is None:
+                window = self.window[pattern] = [0, 0]
+            window[0] += 1
+            window[1] += size
+
+            self.talkers[topic] = self.talkers.get(topic, 0) + 1
+
+            # Robot telemetry jitter, measured on the robots' own status topics
+            if topic.startswith("warehouse/") and topic.endswith("/status"):
+                parts = topic.split('/')
+                if len(parts) == 5 and parts[2] == "amr":
+                    self.track_arrival(parts[3], now)
+
+    def track_arrival(self, robot_id, now):
+        entry = self.arrivals.get(robot_id)
+        if entry is None:
+            self.arrivals[robot_id] = [now, 0, 0.0, 0.0]
+            return
+        interval = now - entry[0]
+        entry[0] = now
+        entry[1] += 1
+        delta = interval - entry[2]
+        entry[2] += delta / entry[1]
+        entry[3] += delta * (interval - entry[2])
+
+    @staticmethod
+    def size_percentile(buckets, total, pct):
+        # Upper bound of the power-of-two bucket containing the percentile
+        target = total * pct / 100.0
+        seen = 0
+        for index, count in enumerate(buckets):
+            seen += count
+            if count and seen >= target:
+                return (1 << index) - 1 if index else 0
+        return 0
+
+    def render(self):
+        now = time.time()
+        with self.lock:
+            elapsed = max(now - self.last_render, 1e-6)
+            window = self.window
+            self.window = {}
+            self.last_render = now
+            patterns = {p: (s[0], s[1], s[2], list(s[3])) for p, s in self.patterns.items()}
+            talkers = sorted(self.talkers.items(), key=lambda kv: kv[1], reverse=True)[:self.top_n]
+            jitter = []
+            for robot_id, (_, count, mean, m2) in self.arrivals.items():
+                if count > 1:
+                    jitter.append((((m2 / (count - 1)) ** 0.5), mean, count, robot_id))
+            jitter.sort(reverse=True)
+            total_messages, total_bytes = self.total_messages, self.total_bytes
+
+        lines = ["\033[H\033[J" + f"MQTT Traffic | up {now - self.start:.0f}s | {total_messages} msgs, {total_bytes / 1e6:.2f} MB"]
+        lines.append("")
+        lines.append(f"{'Topic Pattern':<48}{'msg/s':>9}{'KB/s':>9}{'total':>10}{'avg B':>8}{'p50 B':>8}{'p95 B':>8}{'max B':>8}")
+        for pattern, (count, size, max_size, buckets) in sorted(patterns.items(), key=lambda kv: kv[1][0], reverse=True):
+            w_count, w_bytes = window.get(pattern, (0, 0))
+            lines.append(f"{pattern[:47]:<48}{w_count / elapsed:>9.1f}{w_bytes / elapsed / 1024:>9.1f}{count:>10}"
+                         f"{size / count:>8.0f}{min(self.size_percentile(buckets, count, 50), max_size):>8}"
+                         f"{min(self.size_percentile(buckets, count, 95), max_size):>8}{max_size:>8}")
+
+        lines.append("")
+        lines.append(f"Top {self.top_n} Talkers")
+        for topic, count in talkers:
+            lines.append(f"  {topic[:70]:<72}{count:>10}")
+
+        if jitter:
+            lines.append("")
+            lines.append(f"Robot Inter-Arrival Jitter (top {self.top_n})")
+            lines.append(f"  {'Robot':<20}{'mean s':>10}{'stddev ms':>12}{'samples':>10}")
+            for stddev, mean, count, robot_id in jitter[:self.top_n]:
+                lines.append(f"  {robot_id:<20}{mean:>10.3f}{stddev * 1000:>12.1f}{count:>10}")
+
+        print("\n".join(lines), flush=True)
+
 class MQTTDebugger:
-    def __init__(self, group_id):
+    def __init__(self, group_id, record_path=None, stats=False, topic_filters=None, sample=1, top_n=10):
         self.group_id = group_id
+        self.topic_filters = topic_filters or ["#"]
+
+        # Live view options: aggregate statistics, or print only 1 in `sample` messages
+        self.stats = TrafficStats(top_n) if stats else None
+        self.sample = max(1, sample)
+        self.seen = 0
+
+        # Recording mode writes every message to a capture file instead of printing it
+        self.recorder = None
+        if record_path:
+            self.recorder = CaptureWriter(record_path, {"group_id": group_id, "started": time.time()})
+            self.last_progress = time.time()
         
         # Topics
         self.topic_warehouse = f"warehouse/{group_id}/#"
@@ -29,8 +171,9 @@ class MQTTDebugger:
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"Connected to MQTT Broker. Subscribing to:")
-            print(f" - # (ALL)")
-            client.subscribe("#")
+            for topic_filter in self.topic_filters:
+                print(f" - {topic_filter}" + (" (ALL)" if topic_filter == "#" else ""))
+                client.subscribe(topic_filter)
         else:
             print(f"Failed to connect, return code {rc}")
 
@@ -38,6 +181,16 @@ class MQTTDebugger:
         print("Disconnected from MQTT Broker")
 
     def on_message(self, client, userdata, msg):
+        if self.recorder:
+            self.record_message(msg)
+            return
+        if self.stats:
+            # Cheap path: only topic and size, payload is never decoded
+            self.stats.add(msg.topic, len(msg.payload), time.time())
+            return
+        self.seen += 1
+        if self.seen % self.sample:
+            return
         try:
             timestamp = datetime.datetime.now().isoformat()
             topic = msg.topic
@@ -48,13 +201,13 @@ class MQTTDebugger:
             
             # Try decoding as UTF-8 string first
             try:
-                str_payload = payload.decode('utf-8')
-                # Try parsing as JSON
-                try:
-                    json_payload = json.loads(str_payload)
-                    decoded_msg = json.dumps(json_payload, indent=None) # Compact JSON for one-line log
-                except json.JSONDecodeError:
-                    decoded_msg = str_payload
+                decoded_msg = payload.decode('utf-8')
+                # Only re-dump multi-line JSON, to keep the log one line per message
+                if '\n' in decoded_msg:
+                    try:
+                        decoded_msg = json.dumps(json.loads(decoded_msg), indent=None)
+                    except json.JSONDecodeError:
+                        decoded_msg = decoded_msg.replace('\n', ' ')
             except UnicodeDecodeError:
                 is_binary = True
                 decoded_msg = f"BINARY: {payload.hex()}"
@@ -64,23 +217,101 @@ class MQTTDebugger:
         except Exception as e:
             print(f"Error processing message: {e}")
 
-    def run(self):
+    def record_message(self, msg):
+        try:
+            self.recorder.write(msg.topic, msg.payload, msg.qos, msg.retain)
+            now = time.time()
+            if now - self.last_progress >= 5:
+                self.last_progress = now
+                print(f"Recorded {self.recorder.messages} messages ({self.recorder.bytes / 1e6:.1f} MB, {len(self.recorder.topics)} topics)")
+        except Exception as e:
+            print(f"Error recording message: {e}")
+
+    def run(self, interval=2.0):
         try:
             self.client.connect(BROKER, PORT, 60)
-            self.client.loop_forever()
+            if self.stats:
+                # Network loop in the background; refresh the aggregate view in place
+                self.client.loop_start()
+                while True:
+                    time.sleep(interval)
+                    self.stats.render()
+            else:
+                self.client.loop_forever()
         except KeyboardInterrupt:
             print("\nStopping debugger...")
         except Exception as e:
             print(f"Unexpected error: {e}")
         finally:
+            if self.stats:
+                self.client.loop_stop()
             self.client.disconnect()
+            if self.recorder:
+                self.recorder.close()
+                print(f"Capture closed: {self.recorder.messages} messages in {self.recorder.path}")
+
+def run_replay(group_id, path, speed, topic_filters, start_offset, duration):
+    reader = CaptureReader(path)
+    summary = reader.summary()
+    print(f"Replaying {path}: {summary['messages']} messages over {summary['duration']:.1f}s, "
+          f"speed {'max' if speed <= 0 else f'{speed}x'}")
+
+    # Map the recorded group onto the target group so a capture can drive another stack
+    recorded_group = reader.metadata.get("group_id")
+    topic_rewrite = None
+    if recorded_group and recorded_group != group_id:
+        print(f"Rewriting group {recorded_group} -> {group_id}")
+        topic_rewrite = lambda topic: '/'.join(group_id if p == recorded_group else p for p in topic.split('/'))
+
+    start_ts = reader.first_ts + start_offset if (reader.first_ts is not None and start_offset) else None
+    end_ts = (start_ts or reader.first_ts or 0) + duration if duration else None
+
+    client = mqtt.Client(client_id=f"replay-{group_id}-{int(time.time())}")
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+    try:
+        sent, elapsed = replay(
+            reader,
+            lambda topic, payload, qos, retain: client.publish(topic, payload, qos, retain),
+            speed=speed, start_ts=start_ts, end_ts=end_ts, topic_filters=topic_filters,
+            topic_rewrite=topic_rewrite,
+            progress=lambda n, t: print(f"Replayed {n} messages ({n / t:.0f} msg/s)") if n % 10000 == 0 else None
+        )
+        print(f"Replay done: {sent} messages in {elapsed:.1f}s ({sent / elapsed if elapsed else 0:.0f} msg/s)")
+    except KeyboardInterrupt:
+        print("\nStopping replay...")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        reader.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python mqtt_debugger.py {GroupID}")
-        sys.exit(1)
-        
-    group_id = sys.argv[1]
-    
-    debugger = MQTTDebugger(group_id)
-    debugger.run()
+    parser = argparse.ArgumentParser(description="MQTT debugger: live view, record and replay")
+    parser.add_argument("group_id")
+    parser.add_argument("--record", metavar="FILE", help="Record all traffic to a capture file")
+    parser.add_argument("--replay", metavar="FILE", help="Republish a capture file")
+    parser.add_argument("--speed", default="1", help="Replay speed multiplier, or 'max'")
+    parser.add_argument("--topics", default=None, help="Comma-separated topic filters to replay (MQTT wildcards)")
+    parser.add_argument("--start", type=float, default=0.0, help="Seconds into the capture to start replaying")
+    parser.add_argument("--duration", type=float, default=0.0, help="Seconds of capture to replay (0 = all)")
+    parser.add_argument("--stats", action="store_true", help="Aggregated live traffic view instead of one line per message")
+    parser.add_argument("--interval", type=float, default=2.0, help="Stats refresh interval in seconds")
+    parser.add_argument("--top", type=int, default=10, help="Rows in the top talkers and jitter tables")
+    parser.add_argument("--filter", default=None, help="Comma-separated topic filters to subscribe to (default: #)")
+    parser.add_argument("--sample", type=int, default=1, help="Print only 1 in N messages in the live view")
+    args = parser.parse_args()
+
+    if args.replay:
+        speed = 0.0 if args.speed == "max" else float(args.speed)
+        topic_filters = args.topics.split(',') if args.topics else None
+        run_replay(args.group_id, args.replay, speed, topic_filters, args.start, args.duration)
+    else:
+        debugger = MQTTDebugger(
+            args.group_id,
+            record_path=args.record,
+            stats=args.stats,
+            topic_filters=args.filter.split(',') if args.filter else None,
+            sample=args.sample,
+            top_n=args.top
+        )
+        debugger.run(interval=args.interval)
@@ -0,0 +1,205 @@
+import json
+import time
+import socket
+import itertools
+from collections import deque
+
+MAX_LINE = 64 * 1024          # Longest accepted NDJSON line
+MAX_OUTBOUND = 4 * 1024 * 1024 # Stop reading from a client whose events are not being drained
+TERMINAL_EVENTS = ("COMPLETED", "CANCELLED")
+
+class IngestConnection:
+    __slots__ = ("conn_id", "sock", "addr", "inbuf", "outbuf", "orders", "received", "seq")
+
+    def __init__(self, conn_id, sock, addr):
+        self.conn_id = conn_id
+        self.sock = sock
+        self.addr = addr
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.orders = set()  # order_ids whose events stream to this connection
+        self.received = 0
+        self.seq = 0
+
+class IngestServer:
+    # Streaming NDJSON order API, driven by the Coordinator's select() loop.
+    # Clients pipeline one JSON order per line over a persistent TCP connection and get
+    # one JSON event per line back: queued / duplicate, then dispatched, requeued and
+    # completed (or cancelled) as the order moves through the fleet.
+    def __init__(self, port, ingest, cancel, bind='0.0.0.0'):
+        self.ingest = ingest
+        self.cancel = cancel
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((bind, port))
+        self.listener.listen(128)
+        self.listener.setblocking(False)
+        self.port = self.listener.getsockname()[1]
+        self.connections = {}  # socket -> IngestConnection
+        self.subscribers = {}  # order_id -> IngestConnection
+        self.events = deque()  # Appended from any thread, drained by the loop
+        self.conn_ids = itertools.count(1)
+        print(f"Order stream API listening on TCP port {self.port}")
+
+    def read_sockets(self):
+        return [self.listener] + [s for s, c in self.connections.items() if len(c.outbuf) < MAX_OUTBOUND]
+
+    def write_sockets(self):
+        return [s for s, c in self.connections.items() if c.outbuf]
+
+    def owns(self, sock):
+        return sock is self.listener or sock in self.connections
+
+    def handle_readable(self, sock):
+        if sock is self.listener:
+            self.accept()
+            return
+        conn = self.connections.get(sock)
+        if conn is None:
+            return
+        try:
+            data = sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.close(conn)
+            return
+
+        conn.inbuf += data
+        start = 0
+        while True:
+            end = conn.inbuf.find(b'\n', start)
+            if end < 0:
+                break
+            self.process_line(conn, bytes(conn.inbuf[start:end]))
+            start = end + 1
+        del conn.inbuf[:start]
+        if len(conn.inbuf) > MAX_LINE:
+            self.send(conn, {"event": "error", "error": f"line exceeds {MAX_LINE} bytes"})
+            self.close(conn)
+
+    def handle_writable(self, sock):
+        conn = self.connections.get(sock)
+        if conn is not None:
+            self.drain(conn)
+
+    def accept(self):
+        try:
+            sock, addr = self.listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = IngestConnection(next(self.conn_ids), sock, addr)
+        self.connections[sock] = conn
+        print(f"Order stream client {conn.conn_id} connected from {addr[0]}:{addr[1]}")
+
+    def process_line(self, conn, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            order = json.loads(line)
+            if not isinstance(order, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            self.send(conn, {"event": "error", "error": f"invalid JSON: {e}"})
+            return
+
+        if order.get("command") == "CANCEL":
+            order_id = order.get("order_id")
+            if not self.cancel(order_id):
+                self.send(conn, {"event": "error", "order_id": order_id, "error": "not pending"})
+            return
+
+        conn.received += 1
+        if not order.get("order_id"):
+            conn.seq += 1
+            order["order_id"] = f"tcp-{conn.conn_id}-{conn.seq}"
+        order_id = str(order["order_id"])
+        order["order_id"] = order_id
+
+        # Subscribe before ingesting so the queued event reaches this connection
+        self.subscribe(order_id, conn)
+        try:
+            result = self.ingest(order)
+        except Exception as e:
+            self.unsubscribe(order_id)
+            self.send(conn, {"event": "error", "order_id": order_id, "error": str(e)})
+            return
+        if result.get("duplicate"):
+            # A retry (often on a new connection) takes over the event stream if the order is still live
+            if result.get("status") in TERMINAL_EVENTS:
+                self.unsubscribe(order_id)
+            event = dict(result, event="duplicate")
+            event.pop("duplicate", None)
+            self.send(conn, event)
+
+    def subscribe(self, order_id, conn):
+        previous = self.subscribers.get(order_id)
+        if previous is not None and previous is not conn:
+            previous.orders.discard(order_id)
+        self.subscribers[order_id] = conn
+        conn.orders.add(order_id)
+
+    def unsubscribe(self, order_id):
+        conn = self.subscribers.pop(order_id, None)
+        if conn is not None:
+            conn.orders.discard(order_id)
+
+    def notify(self, order_id, status, details):
+        # Called from the loop or the MQTT thread; cheap no-op for orders nobody is streaming
+        if order_id in self.subscribers:
+            self.events.append((order_id, status, details, time.time()))
+
+    def flush_events(self):
+        touched = set()
+        while self.events:
+            order_id, status, details, ts = self.events.popleft()
+            conn = self.subscribers.get(order_id)
+            if conn is None:
+                continue
+            event = dict(details, event=status.lower(), order_id=order_id, ts=ts)
+            conn.outbuf += json.dumps(event).encode('utf-8') + b'\n'
+            touched.add(conn)
+            if status in TERMINAL_EVENTS:
+                self.unsubscribe(order_id)
+        for conn in touched:
+            self.drain(conn)
+
+    def send(self, conn, event):
+        # Queued events raised earlier in this batch go out first, keeping per-order event order
+        self.flush_events()
+        conn.outbuf += json.dumps(event).encode('utf-8') + b'\n'
+        self.drain(conn)
+
+    def drain(self, conn):
+        if not conn.outbuf or conn.sock not in self.connections:
+            return
+        try:
+            sent = conn.sock.send(conn.outbuf)
+            del conn.outbuf[:sent]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self.close(conn)
+
+    def close(self, conn):
+        if self.connections.pop(conn.sock, None) is None:
+            return
+        for order_id in list(conn.orders):
+            if self.subscribers.get(order_id) is conn:
+                del self.subscribers[order_id]
+        conn.orders.clear()
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+        print(f"Order stream client {conn.conn_id} disconnected ({conn.received} orders received)")
+
+    def shutdown(self):
+        for conn in list(self.connections.values()):
+            self.close(conn)
+        self.listener.close()
@@ -0,0 +1,197 @@
+import time
+import itertools
+import threading
+from world_model import intern_id
+
+class Order:
+    # One pending order. Client fields are copied out of the JSON message once, at ingest;
+    # key, seq and index belong to the queue, so a queued order is a single object.
+    __slots__ = ("order_id", "item", "quantity", "pack_station", "priority", "deadline", "due_in",
+                 "enqueued_at", "recv_ns", "recv_mono", "parked_at", "key", "seq", "index")
+
+    def __init__(self, order_id=None, item=None, quantity=1, pack_station="", priority=0, deadline=None, due_in=None):
+        self.order_id = order_id
+        self.item = intern_id(item.strip()) if isinstance(item, str) else item
+        self.quantity = quantity
+        self.pack_station = intern_id(pack_station.strip()) if isinstance(pack_station, str) else ""
+        self.priority = priority
+        self.deadline = deadline
+        self.due_in = due_in
+        self.enqueued_at = None
+        self.recv_ns = None
+        self.recv_mono = None
+        self.parked_at = None
+        self.key = 0.0
+        self.seq = 0  # FIFO tie-break between equal keys
+        self.index = 0
+
+    @classmethod
+    def from_message(cls, message):
+        return cls(message.get("order_id"), message.get("item"), message.get("quantity", 1),
+                   message.get("pack_station", ""), message.get("priority", 0),
+                   message.get("deadline"), message.get("due_in"))
+
+    def __lt__(self, other):
+        return self.key < other.key or (self.key == other.key and self.seq < other.seq)
+
+    def to_dict(self):
+        return {"order_id": self.order_id, "item": self.item, "quantity": self.quantity,
+                "pack_station": self.pack_station, "priority": self.priority, "deadline": self.deadline}
+
+    def __repr__(self):
+        return f"Order({self.to_dict()})"
+
+class OrderQueue:
+    # Indexed binary min-heap of pending orders, earliest effective deadline first.
+    # The position of every order is tracked by order_id, so push, requeue and
+    # cancel are O(log n) and lookups are O(1).
+    #
+    # Effective key = deadline - priority * priority_weight - aging * (now - enqueued_at).
+    # Every queued order ages at the same rate, so the aging term only depends on the
+    # enqueue time and the key stays static: deadline + aging * enqueued_at - priority * weight.
+    # aging = 0 is pure EDF; larger values drift towards FIFO so bulk orders cannot starve.
+    def __init__(self, default_deadline=300.0, priority_weight=60.0, aging=0.5):
+        self.default_deadline = default_deadline
+        self.priority_weight = priority_weight
+        self.aging = aging
+        self.heap = []
+        self.index = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __bool__(self):
+        return bool(self.heap)
+
+    def __contains__(self, order_id):
+        return order_id in self.index
+
+    def prepare(self, order, now=None):
+        # Stamp scheduling fields once; requeued orders keep their original promise
+        now = now if now is not None else time.time()
+        if order.enqueued_at is None:
+            order.enqueued_at = now
+        try:
+            order.deadline = float(order.deadline)
+        except (TypeError, ValueError):
+            try:
+                due_in = float(order.due_in) if order.due_in is not None else self.default_deadline
+            except (TypeError, ValueError):
+                due_in = self.default_deadline
+            order.deadline = order.enqueued_at + due_in
+        try:
+            order.priority = int(order.priority)
+        except (TypeError, ValueError):
+            order.priority = 0
+        try:
+            order.quantity = int(order.quantity)
+        except (TypeError, ValueError):
+            order.quantity = 1
+        if not order.order_id:
+            order.order_id = f"order-{int(now * 1000)}-{next(self.counter)}"
+        return order
+
+    def key_for(self, order):
+        return order.deadline + self.aging * order.enqueued_at - order.priority * self.priority_weight
+
+    def push(self, order, now=None):
+        self.prepare(order, now)
+        with self.lock:
+            order_id = order.order_id
+            if order_id in self.index:
+                return False
+            order.key = self.key_for(order)
+            order.seq = next(self.counter)
+            order.index = len(self.heap)
+            self.heap.append(order)
+            self.index[order_id] = order
+            self._sift_up(order.index)
+            return True
+
+    # A failed order goes back with its original deadline and enqueue time
+    requeue = push
+
+    def peek(self):
+        return self.heap[0] if self.heap else None
+
+    def pop(self):
+        with self.lock:
+            if not self.heap:
+                return None
+            return self._remove_at(0)
+
+    def cancel(self, order_id):
+        with self.lock:
+            order = self.index.get(order_id)
+            if order is None:
+                return None
+            return self._remove_at(order.index)
+
+    def update_priority(self, order_id, priority):
+        with self.lock:
+            order = self.index.get(order_id)
+            if order is None:
+                return False
+            order.priority = int(priority)
+            old_key = order.key
+            order.key = self.key_for(order)
+            if order.key < old_key:
+                self._sift_up(order.index)
+            else:
+                self._sift_down(order.index)
+            return True
+
+    def overdue(self, now=None):
+        now = now if now is not None else time.time()
+        return sum(1 for order in list(self.heap) if order.deadline < now)
+
+    def orders(self):
+        # Snapshot in scheduling order (O(n log n), for reporting only)
+        return sorted(list(self.heap))
+
+    def _remove_at(self, i):
+        heap = self.heap
+        entry = heap[i]
+        last = heap.pop()
+        del self.index[entry.order_id]
+        if i < len(heap):
+            last.index = i
+            heap[i] = last
+            if last < entry:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+        return entry
+
+    def _sift_up(self, i):
+        heap = self.heap
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            heap[i].index = i
+            i = parent
+        heap[i] = entry
+        entry.index = i
+
+    def _sift_down(self, i):
+        heap = self.heap
+        size = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            heap[i].index = i
+            i = child
+        heap[i] = entry
+        entry.index = i
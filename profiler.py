@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import configparser
+from collections import Counter
+from latency_trace import LatencyHistogram, format_us
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+PROFILE_DIR = config.get('profiling', 'dir', fallback='profiles')
+PROFILE_INTERVAL = config.getfloat('profiling', 'interval_ms', fallback=5.0) / 1000.0
+PROFILE_DEFAULT_SECONDS = config.getfloat('profiling', 'default_seconds', fallback=30.0)
+PROFILE_MAX_SECONDS = config.getfloat('profiling', 'max_seconds', fallback=300.0)
+PROFILE_MAX_DEPTH = 64
+PROFILE_ENV = "WAREHOUSE_PROFILE"
+
+ADMIN_PORTS = {
+    "gateway": config.getint('ports', 'gateway_udp', fallback=9090),
+    "coordinator": config.getint('ports', 'coordinator_udp', fallback=9091),
+}
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def topic_shape(topic):
+    # Collapse entity IDs so per-callback timing groups by topic type, not by robot
+    return "/".join('+' if any(c.isdigit() for c in part) else part for part in topic.split('/'))
+
+class CallbackStats:
+    __slots__ = ("calls", "total", "max", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = LatencyHistogram()
+
+    def record(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram.record(int(seconds * 1_000_000))
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_s": round(self.total, 6),
+            "mean_us": round(self.total / self.calls * 1_000_000, 1) if self.calls else 0,
+            "p50_us": self.histogram.percentile(50),
+            "p99_us": self.histogram.percentile(99),
+            "max_us": round(self.max * 1_000_000, 1),
+        }
+
+class SamplingProfiler:
+    # Bounded-window statistical profiler. A background thread snapshots every thread's
+    # stack with sys._current_frames() and counts collapsed stacks (flamegraph.pl /
+    # speedscope input). Nothing runs while idle; paho callbacks are only wrapped for
+    # per-callback timing while a window is open.
+    def __init__(self, component):
+        self.component = component
+        self.lock = threading.Lock()
+        self.active = False
+        self.clients = []
+        self.originals = []
+        self.stacks = Counter()
+        self.callbacks = {}
+        self.shapes = {}
+        self.samples = 0
+        self.started = 0.0
+
+    def attach(self, client, callbacks=("on_message",)):
+        self.clients.append((client, callbacks))
+
+    def install(self):
+        # Env var (WAREHOUSE_PROFILE=<seconds>) profiles from startup; SIGUSR1 opens a default window
+        value = os.environ.get(PROFILE_ENV)
+        if value:
+            try:
+                seconds = float(value)
+            except ValueError:
+                seconds = None
+            self.start(seconds)
+        if hasattr(signal, "SIGUSR1"):
+            try:
+                signal.signal(signal.SIGUSR1, lambda signum, frame: self.start())
+            except ValueError:
+                pass # Not on the main thread
+
+    def handle_command(self, payload):
+        # UDP admin command: {"command": "PROFILE", "seconds": 30}
+        return self.start(payload.get("seconds"))
+
+    def start(self, seconds=None):
+        seconds = min(float(seconds or PROFILE_DEFAULT_SECONDS), PROFILE_MAX_SECONDS)
+        with self.lock:
+            if self.active:
+                print(f"Profiler [{self.component}]: already running")
+                return False
+            self.active = True
+            self.stacks = Counter()
+            self.callbacks = {}
+            self.samples = 0
+            self.started = time.time()
+            self.wrap_callbacks()
+        print(f"Profiler [{self.component}]: sampling every {PROFILE_INTERVAL * 1000:.1f}ms for {seconds:g}s")
+        threading.Thread(target=self.sample_loop, args=(seconds,), name="profiler", daemon=True).start()
+        return True
+
+    def stop(self):
+        self.active = False
+
+    def wrap_callbacks(self):
+        self.originals = []
+        for client, names in self.clients:
+            for name in names:
+                original = getattr(client, name)
+                if original is None:
+                    continue
+                self.originals.append((client, name, original))
+                setattr(client, name, self.timed(name, original))
+
+    def restore_callbacks(self):
+        for client, name, original in self.originals:
+            setattr(client, name, original)
+        self.originals = []
+
+    def timed(self, name, func):
+        def wrapper(client, userdata, msg):
+            start = time.perf_counter()
+            try:
+                return func(client, userdata, msg)
+            finally:
+                self.record_callback(name, msg.topic, time.perf_counter() - start)
+        return wrapper
+
+    def record_callback(self, name, topic, seconds):
+        shape = self.shapes.get(topic)
+        if shape is None:
+            shape = self.shapes[topic] = topic_shape(topic)
+        key = f"{name} {shape}"
+        stats = self.callbacks.get(key)
+        if stats is None:
+            stats = self.callbacks[key] = CallbackStats()
+        stats.record(seconds)
+
+    def sample_loop(self, seconds):
+        own_id = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        try:
+            while self.active and time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                        stack.append(frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    stack.reverse()
+                    self.stacks[";".join(stack)] += 1
+                self.samples += 1
+                time.sleep(PROFILE_INTERVAL)
+        finally:
+            with self.lock:
+                self.restore_callbacks()
+                self.dump()
+                self.active = False
+
+    def dump(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        base = os.path.join(PROFILE_DIR, f"{self.component}-{stamp}")
+        with open(base + ".folded", 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        callbacks = {key: stats.to_dict() for key, stats in self.callbacks.items()}
+        with open(base + ".callbacks.json", 'w') as f:
+            json.dump({
+                "component": self.component,
+                "started": self.started,
+                "duration_s": round(time.time() - self.started, 3),
+                "samples": self.samples,
+                "interval_ms": PROFILE_INTERVAL * 1000,
+                "callbacks": callbacks,
+            }, f, indent=2)
+        print(f"Profiler [{self.component}]: {self.samples} samples written to {base}.folded")
+        for key, stats in sorted(callbacks.items(), key=lambda kv: -kv[1]["total_s"])[:5]:
+            print(f"  {key}: {stats['calls']} calls, mean {stats['mean_us']}us, p99 {format_us(stats['p99_us'])}, total {stats['total_s']}s")
+
+def print_top(path, limit):
+    # Self and inclusive sample counts per frame from a .folded dump
+    self_counts = Counter()
+    total_counts = Counter()
+    total = 0
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            count = int(count)
+            frames = stack.split(';')
+            total += count
+            self_counts[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_counts[frame] += count
+    print(f"{total} samples in {path}")
+    print(f"{'self%':>7} {'total%':>7}  frame")
+    for frame, count in self_counts.most_common(limit):
+        print(f"{100.0 * count / total:>6.1f}% {100.0 * total_counts[frame] / total:>6.1f}%  {frame}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trigger or inspect a profiling window")
+    parser.add_argument("component", nargs="?", choices=sorted(ADMIN_PORTS), help="Component to profile over UDP")
+    parser.add_argument("--seconds", type=float, default=PROFILE_DEFAULT_SECONDS, help="Window length")
+    parser.add_argument("--host", default="127.0.0.1", help="Host running the component")
+    parser.add_argument("--top", metavar="FOLDED", help="Print the hottest frames of a .folded dump")
+    parser.add_argument("--limit", type=int, default=20, help="Frames to print with --top")
+    args = parser.parse_args()
+
+    if args.top:
+        print_top(args.top, args.limit)
+    elif args.component:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(json.dumps({"command": "PROFILE", "seconds": args.seconds}).encode('utf-8'),
+                    (args.host, ADMIN_PORTS[args.component]))
+        print(f"Requested a {args.seconds:g}s profile from {args.component} at {args.host}:{ADMIN_PORTS[args.component]}")
+    else:
+        parser.print_help()
+        sys.exit(1)
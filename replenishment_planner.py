@@ -0,0 +1,141 @@
+import math
+import time
+
+class ShelfStock:
+    __slots__ = ("shelf_id", "item_id", "stock", "stockout_since", "stockout_seconds",
+                 "restock_at", "restock_qty", "restock_from")
+
+    def __init__(self, shelf_id, item_id):
+        self.shelf_id = shelf_id
+        self.item_id = item_id
+        self.stock = 0.0
+        self.stockout_since = None
+        self.stockout_seconds = 0.0
+        self.restock_at = None   # Time an in-flight restock was issued
+        self.restock_qty = 0.0
+        self.restock_from = 0.0  # Stock level when it was issued
+
+class ReplenishmentPlanner:
+    # Keeps an exponentially weighted consumption rate per item, fed by dispatches, and
+    # the latest stock per shelf, fed by shelf status. plan() issues restocks for shelves
+    # whose item is predicted to run out within lead_time * safety_factor, with at most
+    # max_concurrent restocks in flight.
+    def __init__(self, target_level, lead_time=10.0, safety_factor=1.5, max_concurrent=2,
+                 rate_window=120.0, restock_timeout=30.0):
+        self.target_level = target_level
+        self.lead_time = lead_time
+        self.safety_factor = safety_factor
+        self.max_concurrent = max_concurrent
+        self.rate_window = rate_window
+        self.restock_timeout = restock_timeout
+
+        self.shelves = {}
+        self.rates = {}  # item_id -> [rate per second at last_ts, last_ts]
+        self.proactive = 0
+        self.reactive = 0
+        self.completed = 0
+        self.timed_out = 0
+
+    def observe_stock(self, shelf_id, item_id, stock, now=None):
+        now = now if now is not None else time.time()
+        shelf = self.shelves.get(shelf_id)
+        if shelf is None:
+            shelf = self.shelves[shelf_id] = ShelfStock(shelf_id, item_id)
+        shelf.item_id = item_id
+
+        # An in-flight restock is done once the shelf reports more stock than when it was issued
+        if shelf.restock_at is not None and stock > shelf.restock_from:
+            shelf.restock_at = None
+            self.completed += 1
+
+        if stock <= 0 and shelf.stockout_since is None:
+            shelf.stockout_since = now
+        elif stock > 0 and shelf.stockout_since is not None:
+            shelf.stockout_seconds += now - shelf.stockout_since
+            shelf.stockout_since = None
+        shelf.stock = stock
+
+    def observe_consumption(self, item_id, quantity, now=None):
+        # Exponentially weighted rate: decay the old rate by the elapsed time, add the new event
+        now = now if now is not None else time.time()
+        entry = self.rates.get(item_id)
+        if entry is None:
+            self.rates[item_id] = [quantity / self.rate_window, now]
+            return
+        rate, last_ts = entry
+        entry[0] = rate * math.exp(-max(0.0, now - last_ts) / self.rate_window) + quantity / self.rate_window
+        entry[1] = now
+
+    def rate(self, item_id, now=None):
+        entry = self.rates.get(item_id)
+        if entry is None:
+            return 0.0
+        now = now if now is not None else time.time()
+        return entry[0] * math.exp(-max(0.0, now - entry[1]) / self.rate_window)
+
+    def time_to_stockout(self, item_id, now=None):
+        rate = self.rate(item_id, now)
+        stock = sum(s.stock for s in self.shelves.values() if s.item_id == item_id)
+        if stock <= 0:
+            return 0.0
+        return stock / rate if rate > 0 else None
+
+    def in_flight(self):
+        return sum(1 for s in self.shelves.values() if s.restock_at is not None)
+
+    def plan(self, now=None):
+        # Returns [(shelf_id, quantity)] to restock now, most urgent item first
+        now = now if now is not None else time.time()
+        for shelf in self.shelves.values():
+            if shelf.restock_at is not None and now - shelf.restock_at > self.restock_timeout:
+                print(f"Restock of {shelf.shelf_id} not confirmed after {self.restock_timeout:.0f}s, retrying")
+                shelf.restock_at = None
+                self.timed_out += 1
+
+        slots = self.max_concurrent - self.in_flight()
+        if slots <= 0:
+            return []
+
+        horizon = self.lead_time * self.safety_factor
+        urgent = []
+        for item_id in {s.item_id for s in self.shelves.values()}:
+            remaining = self.time_to_stockout(item_id, now)
+            if remaining is not None and remaining <= horizon:
+                urgent.append((remaining, item_id))
+        urgent.sort()
+
+        restocks = []
+        for remaining, item_id in urgent:
+            candidates = [s for s in self.shelves.values() if s.item_id == item_id and s.restock_at is None]
+            if not candidates:
+                continue
+            shelf = min(candidates, key=lambda s: s.stock)
+            quantity = self.target_level - shelf.stock
+            if quantity <= 0:
+                continue
+            shelf.restock_at = now
+            shelf.restock_qty = quantity
+            shelf.restock_from = shelf.stock
+            self.proactive += 1
+            restocks.append((shelf.shelf_id, quantity))
+            if len(restocks) >= slots:
+                break
+        return restocks
+
+    def record_reactive(self, shelf_id, quantity, now=None):
+        # Restock triggered by an order that found too little stock
+        self.reactive += 1
+        shelf = self.shelves.get(shelf_id)
+        if shelf is not None and shelf.restock_at is None:
+            shelf.restock_at = now if now is not None else time.time()
+            shelf.restock_qty = quantity
+            shelf.restock_from = shelf.stock
+
+    def stockout_seconds(self, now=None):
+        now = now if now is not None else time.time()
+        total = 0.0
+        for shelf in self.shelves.values():
+            total += shelf.stockout_seconds
+            if shelf.stockout_since is not None:
+                total += now - shelf.stockout_since
+        return total
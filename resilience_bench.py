@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import importlib
+from benchmark_suite import BENCH_CONFIG, GROUP_ID, NullWriteApi, wait_for
+
+# Robot fault profiles available to the harness, appended to the benchmark config
+FAULT_PROFILES = """
+[faults.none]
+stall_probability = 0
+
+[faults.default]
+stall_probability = 0.05
+
+[faults.flaky]
+stall_probability = 0.1
+status_loss = 0.2
+silence_probability = 0.01
+silence_seconds = 8
+"""
+
+class ResilienceBench:
+    # The full stack (gateway, coordinator, monitor, shelves, simulated robots) talks to an
+    # embedded broker through the fault proxy. After a clean baseline, each fault in the schedule
+    # is applied for its duration; throughput while it is active is compared with the baseline,
+    # and recovery is the time from the fault's end until throughput over a sliding window is
+    # back to recovered_fraction of the baseline.
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="warehouse-faults-")
+        self.broker = None
+        self.proxy = None
+        self.components = []
+        self.robots = []
+        self.shelves = []
+        self.samples = []  # (time, completed orders, requeued, stalls)
+        self.running = True
+        self.results = {"faults": []}
+
+    def setup(self):
+        import local_broker
+        self.broker = local_broker.EmbeddedBroker()
+        broker_port = self.broker.start()
+
+        # The proxy module reads config.ini too, but only for defaults that are passed explicitly here
+        import fault_proxy
+        self.fault_proxy = fault_proxy
+        self.proxy = fault_proxy.FaultProxy('127.0.0.1', broker_port, 0, seed=self.args.seed)
+        proxy_port = self.proxy.start()
+        self.report(f"Embedded broker on 127.0.0.1:{broker_port}, fault proxy on 127.0.0.1:{proxy_port}")
+
+        with open(os.path.join(self.workdir, "config.ini"), 'w') as f:
+            catalog_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json")
+            f.write(BENCH_CONFIG.format(mqtt_port=proxy_port, catalog_path=catalog_path) + FAULT_PROFILES)
+        os.chdir(self.workdir)
+
+        self.gateway_mod = importlib.import_module("warehouse_gateway")
+        self.coordinator_mod = importlib.import_module("fleet_coordinator")
+        self.monitor_mod = importlib.import_module("system_monitor")
+        self.robot_mod = importlib.import_module("amr_robot")
+        self.shelf_mod = importlib.import_module("shelves")
+
+    def start_stack(self):
+        gateway = self.gateway_mod.WarehouseGateway(GROUP_ID)
+        gateway.write_api = NullWriteApi()
+        coordinator = self.coordinator_mod.FleetCoordinator(GROUP_ID)
+        monitor = self.monitor_mod.SystemMonitor(GROUP_ID)
+        monitor.gateway_address = ('127.0.0.1', gateway.udp_socket.getsockname()[1])
+        self.components = [gateway, coordinator, monitor]
+        self.gateway, self.coordinator, self.monitor = gateway, coordinator, monitor
+
+        catalog = self.robot_mod.CATALOG
+        for shelf_id in catalog.shelf_names[1:]:
+            zone = catalog.zone_names[catalog.shelf_zone[catalog.shelf_codes[shelf_id]]]
+            self.shelves.append(self.shelf_mod.ShelfSensor(GROUP_ID, zone, shelf_id, 1))
+        for i in range(self.args.robots):
+            self.robots.append(self.robot_mod.AMRRobot(GROUP_ID, f"AMR-{i + 1}", self.args.robot_profile))
+
+        for component in self.components + self.shelves + self.robots:
+            threading.Thread(target=component.run, daemon=True).start()
+        threading.Thread(target=self.feed_orders, daemon=True).start()
+        threading.Thread(target=self.sample, daemon=True).start()
+
+    def feed_orders(self):
+        # Keeps a backlog of a couple of orders per robot so throughput is bounded by the fleet
+        catalog = self.robot_mod.CATALOG
+        items = catalog.stocked_items()
+        stations = catalog.stations or ["P1"]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        target = ('127.0.0.1', self.coordinator.udp_socket.getsockname()[1])
+        sent = 0
+        while self.running:
+            while self.coordinator.pending_count() + len(self.coordinator.robot_assignments) < 2 * self.args.robots:
+                order = {"item": items[sent % len(items)], "quantity": 1,
+                         "pack_station": stations[sent % len(stations)], "order_id": f"fault-{sent}"}
+                sock.sendto(json.dumps(order).encode('utf-8'), target)
+                sent += 1
+                time.sleep(0.01)
+            time.sleep(0.2)
+        sock.close()
+
+    def sample(self):
+        c = self.coordinator
+        while self.running:
+            self.samples.append((time.time(), c.completed_orders, c.m_orders_requeued.default.value, c.m_stalls.value))
+            time.sleep(1.0)
+
+    def rate(self, start, end):
+        # Completed orders per second between two times, from the one-second samples
+        inside = [s for s in self.samples if start <= s[0] <= end]
+        if len(inside) < 2:
+            return 0.0
+        return (inside[-1][1] - inside[0][1]) / (inside[-1][0] - inside[0][0])
+
+    def counters(self, start, end):
+        inside = [s for s in self.samples if start <= s[0] <= end]
+        if len(inside) < 2:
+            return 0, 0
+        return inside[-1][2] - inside[0][2], inside[-1][3] - inside[0][3]
+
+    def recovery_time(self, fault_end, baseline):
+        # First moment after the fault when the trailing window is back near the baseline rate
+        window = self.args.window
+        target = baseline * self.args.recovered_fraction
+        deadline = fault_end + self.args.max_recovery
+        while time.time() < deadline:
+            now = time.time()
+            if now - fault_end >= window / 2 and self.rate(max(fault_end, now - window), now) >= target:
+                return now - fault_end
+            time.sleep(1.0)
+        return None
+
+    def run_fault(self, phase, baseline):
+        name = phase.get("name", "fault")
+        self.report(f"Fault {name}: {phase.get('duration', 30)}s")
+        start = time.time()
+        self.fault_proxy.run_phase(self.proxy, phase)
+        end = time.time()
+        during = self.rate(start, end)
+        recovery = self.recovery_time(end, baseline)
+        requeued, stalls = self.counters(start, time.time())
+
+        result = {
+            "name": name,
+            "duration": round(end - start, 1),
+            "throughput": round(during, 3),
+            "degradation_pct": round((1.0 - during / baseline) * 100.0, 1) if baseline else None,
+            "recovery_seconds": round(recovery, 1) if recovery is not None else None,
+            "requeued": requeued,
+            "stalls": stalls,
+        }
+        self.results["faults"].append(result)
+        recovered = f"{result['recovery_seconds']}s" if recovery is not None else f"not within {self.args.max_recovery:.0f}s"
+        self.report(f"  {during:.2f} orders/s ({result['degradation_pct']}% below baseline), recovered {recovered}, "
+                    f"{requeued} requeued, {stalls} stalls")
+        return result
+
+    def run(self):
+        log = open(self.args.log, 'a') if self.args.log else open(os.devnull, 'w')
+        try:
+            with contextlib.redirect_stdout(log):
+                self.setup()
+                self.start_stack()
+                wait_for(lambda: len(self.coordinator.robots) >= self.args.robots, timeout=30)
+                time.sleep(self.args.warmup)
+
+                start = time.time()
+                time.sleep(self.args.baseline)
+                baseline = self.rate(start, time.time())
+                self.results["baseline_throughput"] = round(baseline, 3)
+                self.report(f"Baseline: {baseline:.2f} orders/s over {self.args.baseline:.0f}s ({self.args.robots} robots, "
+                            f"robot fault profile {self.args.robot_profile})")
+
+                for phase in self.fault_proxy.load_schedule(self.args.schedule):
+                    self.run_fault(phase, baseline)
+                    time.sleep(self.args.gap)
+                self.results["proxy"] = dict(self.proxy.stats)
+        finally:
+            self.running = False
+            with contextlib.redirect_stdout(log):
+                self.teardown()
+            log.close()
+        return self.results
+
+    def teardown(self):
+        for robot in self.robots:
+            robot.running = False
+        for shelf in self.shelves:
+            shelf.running = False
+        for component in self.components:
+            with contextlib.suppress(Exception):
+                component.mqtt_client.disconnect()
+        if self.proxy:
+            self.proxy.stop()
+        if self.broker:
+            self.broker.stop()
+
+    def report(self, line):
+        sys.__stdout__.write(line + "\n")
+        sys.__stdout__.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and recovery of the warehouse stack under injected faults")
+    parser.add_argument("--output", default="fault_results.json", help="Machine-readable results file")
+    parser.add_argument("--schedule", default=None, help="JSON list of fault phases (default: fault_proxy's built-in set)")
+    parser.add_argument("--robots", type=int, default=10)
+    parser.add_argument("--robot-profile", default="none", help="Robot fault profile (none, default, flaky)")
+    parser.add_argument("--warmup", type=float, default=15, help="Seconds before the baseline starts")
+    parser.add_argument("--baseline", type=float, default=30, help="Seconds of clean traffic for the baseline rate")
+    parser.add_argument("--window", type=float, default=10, help="Sliding window for the recovery check")
+    parser.add_argument("--recovered-fraction", type=float, default=0.9, help="Share of the baseline that counts as recovered")
+    parser.add_argument("--max-recovery", type=float, default=60, help="Give up on recovery after this many seconds")
+    parser.add_argument("--gap", type=float, default=5, help="Extra clean seconds between faults")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log", default=None, help="File for component output (default: discarded)")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+    output = os.path.abspath(args.output)
+    if args.schedule:
+        args.schedule = os.path.abspath(args.schedule)
+    if args.log:
+        args.log = os.path.abspath(args.log)
+
+    results = ResilienceBench(args).run()
+    record = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "log")},
+        "results": results
+    }
+    with open(output, 'w') as f:
+        json.dump(record, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
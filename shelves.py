@@ -4,6 +4,8 @@ import json
 import random
 import configparser
 import paho.mqtt.client as mqtt
+from catalog import load_catalog
+from telemetry_policy import ChangePublisher, SHELF_KEEPALIVE
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -12,6 +14,9 @@ config.read('config.ini')
 BROKER = config['mqtt']['broker']
 PORT = int(config['mqtt']['port'])
 INITIAL_STOCK = int(config['shelf']['initial_stock'])
+# Local refill below 25%; off when the Coordinator's replenishment planner restocks
+AUTO_REFILL = config.getboolean('shelf', 'auto_refill', fallback=True)
+CATALOG = load_catalog()
 
 class ShelfSensor:
     def __init__(self, group_id, zone_id, asset_id, update_time):
@@ -27,39 +32,41 @@ class ShelfSensor:
         self.deduction_queue = []   # Quantity reserved for incoming robots
         self.processed_robots = set() 
 
-        # Parse Shelf ID (e.g., S1 -> 1)
-        try:
-            self.shelf_num = int(asset_id[1:])
-        except ValueError:
-            self.shelf_num = 1 
-            
-        self.item_id = f"item_{chr(64 + self.shelf_num)}"
-        
-        # Assign Units based on Zone
-        if zone_id == "storage-a":
-            self.unit = "units"
-        elif zone_id == "storage-b":
-            self.unit = "kg"
-        else:
-            self.unit = "units" 
+        # Item and unit come from the catalog (the unit is set per zone)
+        self.item_id = CATALOG.item_for_shelf(asset_id)
+        if self.item_id is None:
+            raise ValueError(f"Shelf {asset_id} is not in the catalog")
+        self.unit = CATALOG.unit_for_shelf(asset_id)
             
         self.stock = INITIAL_STOCK
+
+        # Stock goes out as soon as it changes; otherwise the loop only repeats it once per keepalive
+        self.telemetry = ChangePublisher(SHELF_KEEPALIVE)
         
         self.client = mqtt.Client(client_id=f"{group_id}-{asset_id}-{random.randint(0, 1000)}")
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_subscribe = self.on_subscribe
+        self.subscribed_topics = [f"{group_id}/internal/tasks/dispatch", f"{group_id}/internal/amr/+/status"]
+        self.pending_subscriptions = set()
         
         self.running = True
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print(f"Connected to MQTT Broker as {self.asset_id}")
-            client.subscribe(f"{self.group_id}/internal/tasks/dispatch")
-            client.subscribe(f"{self.group_id}/internal/amr/+/status")
+            self.pending_subscriptions = {client.subscribe(topic)[1] for topic in self.subscribed_topics}
         else:
             print(f"Failed to connect, return code {rc}")
 
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        # Launcher ready marker, printed once the broker has acknowledged every subscription
+        if mid in self.pending_subscriptions:
+            self.pending_subscriptions.discard(mid)
+            if not self.pending_subscriptions:
+                print(f"Subscribed to {' and '.join(self.subscribed_topics)}")
+
     def on_disconnect(self, client, userdata, rc):
         print("Disconnected from MQTT Broker")
 
@@ -142,13 +149,17 @@ class ShelfSensor:
         else:
              print(f"Robot {robot_id} arrived but no queued deductions?")
 
-    def publish_status(self):
+    def publish_status(self, now=None):
+        now = now if now is not None else time.time()
+        if not self.telemetry.due(self.stock, now):
+            return
         msg = {
             "asset_id": self.asset_id,
             "type": "SHELF",
             "item_id": self.item_id,
             "stock": self.stock,
             "unit": self.unit,
+            "keepalive": self.telemetry.keepalive,
         }
         try:
             self.client.publish(self.topic, json.dumps(msg))
@@ -165,7 +176,7 @@ class ShelfSensor:
                 self.publish_status()
                 
                 # Auto-Refill Logic (<25%)
-                if self.stock < (INITIAL_STOCK * 0.25):
+                if AUTO_REFILL and self.stock < (INITIAL_STOCK * 0.25):
                     print(f"Stock low ({self.stock}). Refilling in 2 seconds...")
                     time.sleep(2)
                     self.stock = INITIAL_STOCK
@@ -191,5 +202,9 @@ if __name__ == "__main__":
     asset_id = sys.argv[3]
     update_time = sys.argv[4]
     
-    sensor = ShelfSensor(group_id, zone_id, asset_id, update_time)
+    try:
+        sensor = ShelfSensor(group_id, zone_id, asset_id, update_time)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
     sensor.run()
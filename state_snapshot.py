@@ -0,0 +1,48 @@
+import time
+import threading
+
+# Consumers publish a request with the topic to answer on; the gateway replies with one
+# message holding the last known status of every robot and shelf in the group.
+def request_topic(group_id):
+    return f"{group_id}/internal/snapshot/request"
+
+def reply_topic(group_id, client_id):
+    return f"{group_id}/internal/snapshot/reply/{client_id}"
+
+class SnapshotStore:
+    # Last known status per entity of one group, as published on the internal topics.
+    # Entities not heard from within ttl seconds are left out of snapshots and dropped,
+    # so a consumer that resyncs also learns which robots and shelves have gone away.
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.robots = {}   # robot_id -> (received_at, payload)
+        self.shelves = {}  # shelf_id -> (received_at, payload)
+        self.lock = threading.Lock()
+        self.served = 0
+
+    def __len__(self):
+        return len(self.robots) + len(self.shelves)
+
+    def update_robot(self, robot_id, payload, now=None):
+        self.robots[robot_id] = (now if now is not None else time.time(), payload)
+
+    def update_shelf(self, shelf_id, payload, now=None):
+        self.shelves[shelf_id] = (now if now is not None else time.time(), payload)
+
+    def snapshot(self, now=None):
+        now = now if now is not None else time.time()
+        with self.lock:
+            robots = self._collect(self.robots, now)
+            shelves = self._collect(self.shelves, now)
+            self.served += 1
+        return {"ts": now, "ttl": self.ttl, "robots": robots, "shelves": shelves}
+
+    def _collect(self, entities, now):
+        fresh = {}
+        for entity_id, (received_at, payload) in list(entities.items()):
+            age = now - received_at
+            if age > self.ttl:
+                del entities[entity_id]
+                continue
+            fresh[entity_id] = {"age": round(age, 3), "status": payload}
+        return fresh
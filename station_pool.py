@@ -0,0 +1,149 @@
+import time
+from collections import deque
+
+def parse_capacity(value, default_slots, default_buffer):
+    # "3" -> 3 drop slots with the default buffer lane, "3+1" -> 3 slots plus 1 buffer position
+    slots, _, buffer = str(value).partition('+')
+    try:
+        slots = max(1, int(slots))
+        buffer = max(0, int(buffer)) if buffer else default_buffer
+    except ValueError:
+        return default_slots, default_buffer
+    return slots, buffer
+
+class PackStation:
+    # Drop slots plus a buffer lane; robots are dispatched while any position is free.
+    # Orders that find the station full wait in its own FIFO instead of the global queue.
+    __slots__ = ("station_id", "slots", "buffer", "occupants", "waiting",
+                 "slot_seconds", "buffer_seconds", "started", "last_change",
+                 "dispatched", "waited", "wait_total", "wait_max")
+
+    def __init__(self, station_id, slots, buffer, now):
+        self.station_id = station_id
+        self.slots = slots
+        self.buffer = buffer
+        self.occupants = set()
+        self.waiting = deque()
+        self.slot_seconds = 0.0   # Integral of occupied drop slots over time
+        self.buffer_seconds = 0.0 # Integral of occupied buffer positions over time
+        self.started = now
+        self.last_change = now
+        self.dispatched = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def capacity(self):
+        return self.slots + self.buffer
+
+    def has_room(self):
+        return len(self.occupants) < self.capacity
+
+    def accumulate(self, now):
+        elapsed = now - self.last_change
+        if elapsed > 0:
+            occupied = len(self.occupants)
+            self.slot_seconds += min(occupied, self.slots) * elapsed
+            self.buffer_seconds += max(0, occupied - self.slots) * elapsed
+        self.last_change = now
+
+    def occupy(self, occupant, now):
+        self.accumulate(now)
+        self.occupants.add(occupant)
+        self.dispatched += 1
+
+    def release(self, occupant, now):
+        if occupant not in self.occupants:
+            return False
+        self.accumulate(now)
+        self.occupants.discard(occupant)
+        return True
+
+    def park(self, order, now):
+        order.parked_at = now
+        self.waiting.append(order)
+
+    def record_wait(self, order, now):
+        parked_at = order.parked_at
+        if parked_at is None:
+            return
+        order.parked_at = None
+        wait = now - parked_at
+        self.waited += 1
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+    def utilization(self, now):
+        self.accumulate(now)
+        elapsed = now - self.started
+        return self.slot_seconds / (self.slots * elapsed) if elapsed > 0 else 0.0
+
+    def report(self, now):
+        utilization = self.utilization(now)
+        elapsed = now - self.started
+        return {
+            "occupied": len(self.occupants),
+            "capacity": self.capacity,
+            "waiting": len(self.waiting),
+            "utilization": utilization,
+            "buffer_utilization": self.buffer_seconds / (self.buffer * elapsed) if self.buffer and elapsed > 0 else 0.0,
+            "dispatched": self.dispatched,
+            "avg_wait": self.wait_total / self.waited if self.waited else 0.0,
+            "max_wait": self.wait_max,
+        }
+
+class StationPool:
+    def __init__(self, default_slots=2, default_buffer=1, overrides=None):
+        self.default_slots = default_slots
+        self.default_buffer = default_buffer
+        # configparser lower-cases option names, so overrides are matched case-insensitively
+        self.overrides = {k.lower(): v for k, v in (overrides or {}).items()}
+        self.stations = {}
+
+    def get(self, station_id, now=None):
+        station = self.stations.get(station_id)
+        if station is None:
+            now = now if now is not None else time.time()
+            slots, buffer = parse_capacity(self.overrides.get(station_id.lower(), self.default_slots), self.default_slots, self.default_buffer)
+            station = self.stations[station_id] = PackStation(station_id, slots, buffer, now)
+        return station
+
+    def has_room(self, station_id):
+        return self.get(station_id).has_room()
+
+    # occupant identifies one assignment, (robot_id, order_id), since a robot with a queued
+    # task can hold two positions at once
+    def occupy(self, station_id, occupant, order, now=None):
+        now = now if now is not None else time.time()
+        station = self.get(station_id, now)
+        station.record_wait(order, now)
+        station.occupy(occupant, now)
+
+    def release(self, station_id, occupant, now=None):
+        station = self.stations.get(station_id)
+        if station is None:
+            return False
+        return station.release(occupant, now if now is not None else time.time())
+
+    def ready(self):
+        # Stations with parked orders and at least one free position
+        return [s for s in self.stations.values() if s.waiting and s.has_room()]
+
+    def waiting_count(self):
+        return sum(len(s.waiting) for s in self.stations.values())
+
+    def occupied_count(self):
+        return sum(len(s.occupants) for s in self.stations.values())
+
+    def overdue(self, now):
+        return sum(1 for s in self.stations.values() for order in list(s.waiting) if order.deadline < now)
+
+    def cancel(self, order_id):
+        for station in self.stations.values():
+            for order in station.waiting:
+                if order.order_id == order_id:
+                    station.waiting.remove(order)
+                    return order
+        return None
@@ -1,9 +1,16 @@
 import json
 import time
 import socket
+import threading
 import configparser
 import sys
 import paho.mqtt.client as mqtt
+from timer_wheel import TimerWheel
+from battery_analytics import BatteryAnalytics
+from metrics import MetricsRegistry
+from profiler import SamplingProfiler
+from state_snapshot import request_topic, reply_topic
+from telemetry_policy import advertised_keepalive
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -11,6 +18,20 @@ config.read('config.ini')
 
 MQTT_BROKER = config['mqtt']['broker']
 MQTT_PORT = int(config['mqtt']['port'])
+GATEWAY_UDP_PORT = config.getint('ports', 'gateway_udp', fallback=9090)
+METRICS_PORT = config.getint('metrics', 'monitor_port', fallback=9102)
+
+# Liveness deadlines (seconds); detection latency is bounded by timeout + tick. Robots that
+# only publish on change get their advertised keepalive on top of heartbeat_timeout.
+MONITOR_TICK = config.getfloat('monitor', 'tick', fallback=0.1)
+HEARTBEAT_TIMEOUT = config.getfloat('monitor', 'heartbeat_timeout', fallback=5.0)
+STUCK_TIMEOUT = config.getfloat('monitor', 'stuck_timeout', fallback=30.0)
+
+# Battery analytics
+BATTERY_LOW_THRESHOLD = config.getfloat('robot', 'battery_low_threshold', fallback=15.0)
+BATTERY_WINDOW = config.getint('monitor', 'battery_window', fallback=120)
+CHARGE_RECOMMEND_HORIZON = config.getfloat('monitor', 'charge_recommend_horizon', fallback=60.0)
+BATTERY_ALERT_DEBOUNCE = config.getfloat('monitor', 'battery_alert_debounce', fallback=30.0)
 
 class SystemMonitor:
     def __init__(self, group_id):
@@ -18,14 +39,44 @@ class SystemMonitor:
         
         # State tracking for anomaly detection
         self.robot_states = {}
+
+        # Per-robot heartbeat, stall and stuck deadlines
+        self.timers = TimerWheel(tick=MONITOR_TICK)
+
+        # Held by the paho thread while it applies a status and by the main loop while timers fire,
+        # so a status that re-arms a deadline is never overtaken by the expiry it replaced
+        self.state_lock = threading.Lock()
+
+        # Per-robot ring buffers of battery samples with drain-rate regressions
+        self.battery_analytics = BatteryAnalytics(BATTERY_WINDOW, BATTERY_LOW_THRESHOLD)
+
+        self.metrics = MetricsRegistry("monitor")
+        self.m_in = self.metrics.counter("monitor_mqtt_messages_in_total", "Robot status messages received")
+        self.m_handle = self.metrics.histogram("monitor_message_seconds", "Time spent handling one status message")
+        self.m_alerts = self.metrics.counter("monitor_alerts_total", "Alerts and overrides sent by reason", ("reason",))
+        self.m_timers_fired = self.metrics.counter("monitor_timers_fired_total", "Deadline timers that expired")
+        self.metrics.gauge("monitor_robots", "Robots tracked").set_function(lambda: len(self.robot_states))
+        self.metrics.gauge("monitor_robots_lost", "Robots currently without heartbeat").set_function(
+            lambda: sum(1 for s in list(self.robot_states.values()) if s["lost"]))
+        self.metrics.gauge("monitor_robots_stalled", "Robots currently reporting STALLED").set_function(
+            lambda: sum(1 for s in list(self.robot_states.values()) if s["status"] == "STALLED"))
+        self.metrics.gauge("monitor_timers_scheduled", "Deadline timers armed").set_function(lambda: len(self.timers))
         
-        self.mqtt_client = mqtt.Client(client_id=f"monitor-{group_id}-{int(time.time())}")
+        client_id = f"monitor-{group_id}-{int(time.time())}"
+        self.snapshot_topic = reply_topic(group_id, client_id)
+        self.mqtt_client = mqtt.Client(client_id=client_id)
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
+        self.mqtt_client.on_subscribe = self.on_subscribe
+        self.pending_subscriptions = set()
+
+        # On-demand sampling profiler (env var or SIGUSR1)
+        self.profiler = SamplingProfiler("monitor")
+        self.profiler.attach(self.mqtt_client)
         
         # UDP Socket (Sender) to Gateway
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.gateway_address = ('127.0.0.1', 9090)
+        self.gateway_address = ('127.0.0.1', GATEWAY_UDP_PORT)
         
         print(f"System Monitor initialized for Group {group_id}")
 
@@ -33,23 +84,69 @@ class SystemMonitor:
         if rc == 0:
             print("Connected to MQTT Broker")
             topic = f"{self.group_id}/internal/amr/+/status"
-            client.subscribe(topic)
-            print(f"Subscribed to {topic}")
+            self.pending_subscriptions = {client.subscribe(topic)[1]}
+            # Warm start: liveness deadlines for every known robot without waiting for its next heartbeat
+            self.pending_subscriptions.add(client.subscribe(self.snapshot_topic, qos=1)[1])
+            client.publish(request_topic(self.group_id), json.dumps({"reply_to": self.snapshot_topic}), qos=1)
         else:
             print(f"Failed to connect to MQTT, rc={rc}")
 
+    def on_subscribe(self, client, userdata, mid, granted_qos):
+        # Launcher ready marker, printed once the broker has acknowledged every subscription
+        if mid in self.pending_subscriptions:
+            self.pending_subscriptions.discard(mid)
+            if not self.pending_subscriptions:
+                print(f"Subscribed to {self.group_id}/internal/amr/+/status")
+
     def on_message(self, client, userdata, msg):
+        started = time.perf_counter()
         try:
             topic = msg.topic
             payload = json.loads(msg.payload.decode('utf-8'))
             
             parts = topic.split('/')
-            if len(parts) >= 5 and parts[2] == 'amr':
-                robot_id = parts[3]
-                self.process_robot_status(robot_id, payload)
+            with self.state_lock:
+                if len(parts) >= 5 and parts[2] == 'amr':
+                    robot_id = parts[3]
+                    self.m_in.inc()
+                    self.process_robot_status(robot_id, payload)
+                elif len(parts) >= 5 and parts[2] == 'snapshot':
+                    self.apply_snapshot(payload)
                 
         except Exception as e:
             print(f"Error processing message: {e}")
+        finally:
+            self.m_handle.observe(time.perf_counter() - started)
+
+    def apply_snapshot(self, payload):
+        # Seed state and heartbeat deadlines from the gateway's last known status. Battery samples
+        # are not replayed, the next live status feeds the analytics. Robots the snapshot no longer
+        # lists went silent while we were away and are forgotten.
+        now = time.time()
+        robots = payload.get("robots", {})
+        for robot_id, entry in robots.items():
+            last_seen = now - entry.get("age", 0)
+            state = self.robot_states.get(robot_id)
+            if state is not None and state["last_seen"] >= last_seen:
+                continue
+            status = entry["status"]
+            self.robot_states[robot_id] = {
+                "last_location": status.get("location_id"),
+                "last_move_time": last_seen,
+                "last_seen": last_seen,
+                "lost": False,
+                "status": status.get("status"),
+                "battery": float(status.get("battery", 0))
+            }
+            deadline = last_seen + HEARTBEAT_TIMEOUT + advertised_keepalive(status)
+            self.timers.schedule((robot_id, "heartbeat"), max(0, deadline - now), self.on_heartbeat_timeout, now)
+
+        for robot_id in [r for r in self.robot_states if r not in robots]:
+            del self.robot_states[robot_id]
+            for kind in ("heartbeat", "stall", "stuck"):
+                self.timers.cancel((robot_id, kind))
+            print(f"Robot {robot_id} not in gateway snapshot, no longer monitored")
+        print(f"Applied gateway snapshot: {len(robots)} robots")
 
     def process_robot_status(self, robot_id, payload):
         # ANOMALY DETECTION LOGIC
@@ -57,65 +154,146 @@ class SystemMonitor:
         current_location = payload.get("location_id")
         current_battery = float(payload.get("battery", 0))
         now = time.time()
+
+        # Every status message re-arms the liveness deadline, stretched by the robot's keepalive
+        timeout = HEARTBEAT_TIMEOUT + advertised_keepalive(payload)
+        self.timers.schedule((robot_id, "heartbeat"), timeout, self.on_heartbeat_timeout, now)
+        tracker = self.battery_analytics.observe(robot_id, now, current_battery, current_status)
         
         if robot_id not in self.robot_states:
             self.robot_states[robot_id] = {
                 "last_location": current_location,
                 "last_move_time": now,
+                "last_seen": now,
+                "lost": False,
                 "status": current_status,
                 "battery": current_battery
             }
             return
 
         state = self.robot_states[robot_id]
+        state["last_seen"] = now
+        if state["lost"]:
+            state["lost"] = False
+            print(f"Robot {robot_id} is back online ({current_status})")
         
-        # Check for Stalled Robots
+        # Stalled Robots: deadline counts from the last observed movement
         if current_status == "STALLED":
-            time_stalled = now - state["last_move_time"]
-            if time_stalled >= 30:
-                print(f"CRITICAL: Robot {robot_id} reported STALLED for {int(time_stalled)}s. Sending FORCE_CHARGE.")
-                self.send_override(robot_id, "STALLED_REPORT")
-                state["last_move_time"] = now # Reset timer
-            else:
-                if int(time_stalled) % 5 == 0:
-                    print(f"DEBUG: Robot {robot_id} STALLED. Timeout: {int(time_stalled)}/30s")
+            self.timers.cancel((robot_id, "stuck"))
+            if not self.timers.is_scheduled((robot_id, "stall")):
+                delay = max(0, state["last_move_time"] + STUCK_TIMEOUT - now)
+                self.timers.schedule((robot_id, "stall"), delay, self.on_stall_timeout, now)
         
-        # Check for Stuck Robots (Moving but not changing location)
-        elif "MOVING" in current_status:
+        # Stuck Robots (Moving but not changing location)
+        elif current_status and "MOVING" in current_status:
+            self.timers.cancel((robot_id, "stall"))
             if current_location != state["last_location"]:
-                # Movement detected, reset timer
+                # Movement detected, restart the deadline
                 state["last_location"] = current_location
                 state["last_move_time"] = now
-            else:
-                time_stalled = now - state["last_move_time"]
-                
-                if time_stalled >= 30:
-                    print(f"CRITICAL: Robot {robot_id} STUCK for {int(time_stalled)}s")
-                    self.send_override(robot_id, "STUCK_TIMEOUT")
-                    state["last_move_time"] = now 
+                self.timers.schedule((robot_id, "stuck"), STUCK_TIMEOUT, self.on_stuck_timeout, now)
+            elif not self.timers.is_scheduled((robot_id, "stuck")):
+                delay = max(0, state["last_move_time"] + STUCK_TIMEOUT - now)
+                self.timers.schedule((robot_id, "stuck"), delay, self.on_stuck_timeout, now)
         else:
             state["last_move_time"] = now
             state["last_location"] = current_location
+            self.timers.cancel((robot_id, "stall"))
+            self.timers.cancel((robot_id, "stuck"))
 
         # Check for Critical Battery Levels
         last_alert = state.get("last_alert", 0)
-        if current_battery < 15.0 and current_status not in ["CHARGING", "MOVING_TO_CHARGE"]:
+        if current_battery < BATTERY_LOW_THRESHOLD and current_status not in ["CHARGING", "MOVING_TO_CHARGE"]:
             if (now - last_alert) > 10.0: # Debounce alerts (10s)
                 print(f"CRITICAL: Robot {robot_id} LOW BATTERY ({current_battery}%)")
                 self.send_override(robot_id, "LOW_BATTERY")
                 state["last_alert"] = now
+        else:
+            self.check_battery_forecast(robot_id, tracker, current_status, now)
             
         # Update local state
         state["status"] = current_status
         state["battery"] = current_battery
 
-    def send_override(self, robot_id, reason):
+    def check_battery_forecast(self, robot_id, tracker, current_status, now):
+        # Predictive Battery Alert: recommend charging before the robot strands mid-trip
+        if current_status in ["CHARGING", "MOVING_TO_CHARGE"]:
+            return
+        prediction = tracker.predict(BATTERY_LOW_THRESHOLD)
+        if not prediction or prediction["time_to_threshold"] > CHARGE_RECOMMEND_HORIZON:
+            return
+        if now - tracker.last_alert < BATTERY_ALERT_DEBOUNCE:
+            return
+        tracker.last_alert = now
+
+        print(f"WARNING: Robot {robot_id} predicted to reach {BATTERY_LOW_THRESHOLD}% in {prediction['time_to_threshold']:.0f}s "
+              f"(drain {prediction['drain_rate']:.2f}%/s, empty in {prediction['time_to_empty']:.0f}s). Recommending charge.")
+        alert = {
+            "robot_id": robot_id,
+            "alert": "CHARGE_RECOMMENDED",
+            "battery": tracker.last_battery,
+            "drain_rate": round(prediction["drain_rate"], 4),
+            "time_to_threshold": round(prediction["time_to_threshold"], 1),
+            "time_to_empty": round(prediction["time_to_empty"], 1)
+        }
+        self.mqtt_client.publish(f"{self.group_id}/internal/alerts/{robot_id}/battery", json.dumps(alert), qos=1)
+        self.send_override(robot_id, "CHARGE_RECOMMENDED", override_task="CHARGE_RECOMMENDED", level="WARNING")
+
+    def on_stall_timeout(self, key):
+        robot_id = key[0]
+        state = self.robot_states.get(robot_id)
+        if not state or state["lost"] or state["status"] != "STALLED":
+            return
+        now = time.time()
+        print(f"CRITICAL: Robot {robot_id} reported STALLED for {int(now - state['last_move_time'])}s. Sending FORCE_CHARGE.")
+        self.send_override(robot_id, "STALLED_REPORT")
+        state["last_move_time"] = now # Reset timer
+        self.timers.schedule(key, STUCK_TIMEOUT, self.on_stall_timeout, now)
+
+    def on_stuck_timeout(self, key):
+        robot_id = key[0]
+        state = self.robot_states.get(robot_id)
+        if not state or state["lost"] or not state["status"] or "MOVING" not in state["status"]:
+            return
+        now = time.time()
+        print(f"CRITICAL: Robot {robot_id} STUCK for {int(now - state['last_move_time'])}s")
+        self.send_override(robot_id, "STUCK_TIMEOUT")
+        state["last_move_time"] = now
+        self.timers.schedule(key, STUCK_TIMEOUT, self.on_stuck_timeout, now)
+
+    def on_heartbeat_timeout(self, key):
+        # Robot went silent (crash or lost connectivity): alert and let the Coordinator requeue its order
+        robot_id = key[0]
+        state = self.robot_states.get(robot_id)
+        if not state or state["lost"]:
+            return
+        silent_for = time.time() - state["last_seen"]
+        if silent_for < HEARTBEAT_TIMEOUT:
+            return # Heard from since this deadline was armed; its status re-armed a later one
+        state["lost"] = True
+        print(f"CRITICAL: Robot {robot_id} LOST (no status for {silent_for:.1f}s, last {state['status']})")
+
+        self.timers.cancel((robot_id, "stall"))
+        self.timers.cancel((robot_id, "stuck"))
+        self.send_override(robot_id, "HEARTBEAT_LOST", override_task="HEARTBEAT_LOST")
+
+        alert = {
+            "robot_id": robot_id,
+            "alert": "ROBOT_LOST",
+            "last_seen": state["last_seen"],
+            "last_status": state["status"]
+        }
+        self.mqtt_client.publish(f"{self.group_id}/internal/alerts/{robot_id}/liveness", json.dumps(alert), qos=1)
+
+    def send_override(self, robot_id, reason, override_task="FORCE_CHARGE", level="CRITICAL"):
         # Send UDP Packet to Gateway to trigger immediate action
         msg = {
+            "group_id": self.group_id,
             "robot_id": robot_id,
-            "level": "CRITICAL",
-            "override_task": "FORCE_CHARGE"
+            "level": level,
+            "override_task": override_task
         }
+        self.m_alerts.labels(reason).inc()
         try:
             self.udp_socket.sendto(json.dumps(msg).encode('utf-8'), self.gateway_address)
             print(f"Sent UDP Override for {robot_id} (Reason: {reason})")
@@ -124,12 +302,24 @@ class SystemMonitor:
 
     def run(self):
         try:
+            self.profiler.install()
+            self.metrics.start_server(METRICS_PORT)
             self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-            self.mqtt_client.loop_forever()
+            self.mqtt_client.loop_start()
+
+            # Deadlines fire from this loop, independent of incoming traffic
+            while True:
+                with self.state_lock:
+                    fired = self.timers.advance()
+                self.m_timers_fired.inc(fired)
+                time.sleep(MONITOR_TICK)
         except KeyboardInterrupt:
             print("Stopping Monitor...")
         except Exception as e:
             print(f"Unexpected error: {e}")
+        finally:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
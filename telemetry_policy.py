@@ -0,0 +1,40 @@
+import configparser
+
+# Load Configuration
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Devices publish at once when something consumers act on changes, otherwise once per keepalive (seconds)
+ROBOT_KEEPALIVE = config.getfloat('telemetry', 'robot_keepalive', fallback=10.0)
+SHELF_KEEPALIVE = config.getfloat('telemetry', 'shelf_keepalive', fallback=10.0)
+# Battery change (percent) that is worth a status of its own
+BATTERY_DEADBAND = config.getfloat('telemetry', 'battery_deadband', fallback=5.0)
+
+class ChangePublisher:
+    # Publish-on-change with a keepalive. key holds whatever the consumers act on (state,
+    # location, stock...); an unchanged key is only repeated once keepalive has passed, so an
+    # idle device costs one message per keepalive instead of one per loop tick.
+    __slots__ = ("keepalive", "last_key", "last_at", "sent", "skipped")
+
+    def __init__(self, keepalive):
+        self.keepalive = keepalive
+        self.last_key = None
+        self.last_at = None
+        self.sent = 0
+        self.skipped = 0
+
+    def due(self, key, now, force=False):
+        if force or key != self.last_key or self.last_at is None or now - self.last_at >= self.keepalive:
+            self.last_key = key
+            self.last_at = now
+            self.sent += 1
+            return True
+        self.skipped += 1
+        return False
+
+def advertised_keepalive(payload):
+    # Keepalive a device put in its status; 0 for devices that report every tick and do not say so
+    try:
+        return max(0.0, float(payload.get("keepalive", 0)))
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,90 @@
+import time
+import threading
+
+class Timer:
+    __slots__ = ("key", "deadline", "callback", "slot")
+
+    def __init__(self, key, deadline, callback):
+        self.key = key
+        self.deadline = deadline  # Absolute tick number
+        self.callback = callback
+        self.slot = None
+
+class TimerWheel:
+    # Hashed timing wheel keyed by (entity, kind). schedule/cancel are O(1);
+    # advance() touches only the slots that elapsed since the last call.
+    # Deadlines beyond one revolution simply stay in their slot until their tick comes round.
+    def __init__(self, tick=0.1, slots=1024, now=None):
+        self.tick = tick
+        self.num_slots = slots
+        self.slots = [dict() for _ in range(slots)]
+        self.index = {}
+        self.current_tick = int((now if now is not None else time.time()) / tick)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def schedule(self, key, delay, callback, now=None):
+        # (Re-)arm the timer for key; an existing timer with the same key is replaced
+        now = now if now is not None else time.time()
+        deadline = max(int((now + delay) / self.tick + 0.999999), self.current_tick + 1)
+        with self.lock:
+            self._remove(key)
+            timer = Timer(key, deadline, callback)
+            timer.slot = deadline % self.num_slots
+            self.index[key] = timer
+            self.slots[timer.slot][key] = timer
+
+    def cancel(self, key):
+        with self.lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        timer = self.index.pop(key, None)
+        if timer is None:
+            return False
+        if timer.slot is not None:
+            del self.slots[timer.slot][key]
+        return True
+
+    def is_scheduled(self, key):
+        return key in self.index
+
+    def advance(self, now=None):
+        # Fire every timer whose deadline has passed; callbacks run outside the lock
+        now = now if now is not None else time.time()
+        target_tick = int(now / self.tick)
+        expired = []
+        with self.lock:
+            if target_tick - self.current_tick > self.num_slots:
+                # Fell behind by more than a revolution: one full sweep covers every slot
+                for slot in self.slots:
+                    self._collect(slot, target_tick, expired)
+                self.current_tick = target_tick
+            while self.current_tick < target_tick:
+                self.current_tick += 1
+                self._collect(self.slots[self.current_tick % self.num_slots], self.current_tick, expired)
+
+        fired = 0
+        for timer in expired:
+            # A callback earlier in this batch may have cancelled or re-armed this key
+            with self.lock:
+                if self.index.get(timer.key) is not timer:
+                    continue
+                del self.index[timer.key]
+            fired += 1
+            try:
+                timer.callback(timer.key)
+            except Exception as e:
+                print(f"Timer callback error for {timer.key}: {e}")
+        return fired
+
+    def _collect(self, slot, tick, expired):
+        if not slot:
+            return
+        due = [key for key, timer in slot.items() if timer.deadline <= tick]
+        for key in due:
+            timer = slot.pop(key)
+            timer.slot = None
+            expired.append(timer)
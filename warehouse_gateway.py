@@ -7,8 +7,14 @@ import paho.mqtt.client as mqtt
 import socket
 import struct
 import threading
+from collections import OrderedDict
 from influxdb_client import InfluxDBClient, Point
 from influxdb_client.client.write_api import WriteOptions
+from latency_trace import StageRecorder
+from metrics import MetricsRegistry
+from profiler import SamplingProfiler
+from state_snapshot import SnapshotStore, request_topic
+from catalog import load_catalog
 
 # Load Configuration
 config = configparser.ConfigParser()
@@ -22,42 +28,195 @@ INFLUX_TOKEN = config['influxdb']['token']
 INFLUX_ORG = config['influxdb']['org']
 INFLUX_BUCKET = config['influxdb']['bucket']
 
-class WarehouseGateway:
-    def __init__(self, group_id):
+GATEWAY_UDP_PORT = config.getint('ports', 'gateway_udp', fallback=9090)
+METRICS_PORT = config.getint('metrics', 'gateway_port', fallback=9100)
+
+# Per-group telemetry rate limit (messages/second, 0 = unlimited); [group_limits] overrides per group
+GROUP_RATE_LIMIT = config.getfloat('gateway', 'group_rate_limit', fallback=0.0)
+GROUP_BURST = config.getfloat('gateway', 'group_burst', fallback=200.0)
+GROUP_LIMITS = dict(config.items('group_limits')) if config.has_section('group_limits') else {}
+# Entities silent for longer than this are left out of state snapshots
+SNAPSHOT_TTL = config.getfloat('gateway', 'snapshot_ttl', fallback=30.0)
+
+CATALOG = load_catalog()
+
+MAX_TRACE_TOKENS = 65536
+ALL_GROUPS = "+"
+
+# Binary robot opcodes; QUEUE_TASK is an EXECUTE_TASK that only a busy robot may accept
+COMMAND_TYPES = {0x01: "EXECUTE_TASK", 0x02: "QUEUE_TASK", 0x03: "FORCE_CHARGE"}
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+class GroupContext:
+    # Everything the gateway keeps per warehouse group: trace tokens, rate limit, last known
+    # state and metric children. The MQTT connection, Influx writer and UDP socket are shared.
+    def __init__(self, group_id, metrics):
         self.group_id = group_id
+        self.trace_tokens = OrderedDict()
+        self.next_trace_token = 1
+        self.snapshot = SnapshotStore(SNAPSHOT_TTL)
+
+        rate = float(GROUP_LIMITS.get(group_id.lower(), GROUP_RATE_LIMIT))
+        self.bucket = TokenBucket(rate, max(GROUP_BURST, rate)) if rate > 0 else None
+
+        self.m_in_amr = metrics["in"].labels(group_id, "amr")
+        self.m_in_shelf = metrics["in"].labels(group_id, "locations")
+        self.m_in_dispatch = metrics["in"].labels(group_id, "dispatch")
+        self.m_in_other = metrics["in"].labels(group_id, "other")
+        self.m_out_internal = metrics["out"].labels(group_id, "internal_status")
+        self.m_out_command = metrics["out"].labels(group_id, "robot_command")
+        self.m_out_snapshot = metrics["out"].labels(group_id, "snapshot")
+        self.m_dropped = metrics["dropped"].labels(group_id)
+        self.m_errors = metrics["errors"].labels(group_id)
+
+class WarehouseGateway:
+    def __init__(self, group_ids):
+        # One group ID, a list of them, or "+" to serve every group seen on the broker
+        if isinstance(group_ids, str):
+            group_ids = [group_ids]
+        self.group_ids = list(group_ids)
+        self.wildcard = ALL_GROUPS in self.group_ids
+        self.group_id = self.group_ids[0] if not self.wildcard else ALL_GROUPS
+        name = "all" if self.wildcard else self.group_id if len(self.group_ids) == 1 else f"{len(self.group_ids)}groups"
         
         # Initialize MQTT Client for bidirectional communication
-        self.mqtt_client = mqtt.Client(client_id=f"gateway-{group_id}-{int(time.time())}")
+        self.mqtt_client = mqtt.Client(client_id=f"gateway-{name}-{int(time.time())}")
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         self.mqtt_client.on_subscribe = self.on_subscribe 
+        self.pending_subscriptions = set()
+        
+        self.init_metrics()
+        self.groups = {}
+        self.groups_lock = threading.Lock()
+        if not self.wildcard:
+            for group_id in self.group_ids:
+                self.get_group(group_id)
         
         # Initialize InfluxDB Client with batching for efficiency
         self.influx_client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-        self.write_api = self.influx_client.write_api(write_options=WriteOptions(batch_size=10, flush_interval=1000))
+        self.write_api = self.influx_client.write_api(
+            write_options=WriteOptions(batch_size=10, flush_interval=1000),
+            success_callback=self.on_influx_success,
+            error_callback=self.on_influx_error
+        )
         
         # UDP Server to listen for critical override commands from Monitor
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.udp_socket.bind(('0.0.0.0', 9090))
+        self.udp_socket.bind(('0.0.0.0', GATEWAY_UDP_PORT))
         self.udp_running = True
+
+        # Trace tokens travel in the binary command and map back to order context (per group)
+        self.trace_recorder = StageRecorder("gateway")
+
+        # On-demand sampling profiler (env var, UDP PROFILE command or SIGUSR1)
+        self.profiler = SamplingProfiler("gateway")
+        self.profiler.attach(self.mqtt_client)
         
-        print(f"Gateway initialized for Group {group_id}")
+        print(f"Gateway initialized for {'all groups' if self.wildcard else 'Group ' + ', '.join(self.group_ids)}")
+
+    def init_metrics(self):
+        self.metrics = MetricsRegistry("gateway")
+        self.group_metrics = {
+            "in": self.metrics.counter("gateway_mqtt_messages_in_total", "MQTT messages received by group and topic class", ("group", "topic_class")),
+            "out": self.metrics.counter("gateway_mqtt_messages_out_total", "MQTT messages published by group and topic class", ("group", "topic_class")),
+            "dropped": self.metrics.counter("gateway_rate_limited_total", "Telemetry messages dropped by the per-group rate limit", ("group",)),
+            "errors": self.metrics.counter("gateway_message_errors_total", "Messages that failed to decode or process", ("group",)),
+        }
+        self.m_errors = self.group_metrics["errors"].labels("unknown")
+        self.metrics.gauge("gateway_groups", "Warehouse groups served by this gateway").set_function(lambda: len(self.groups))
+        self.m_handle = self.metrics.histogram("gateway_message_seconds", "Time spent handling one MQTT message")
+        self.metrics.gauge("gateway_snapshot_entities", "Robots and shelves held for state snapshots").set_function(
+            lambda: sum(len(ctx.snapshot) for ctx in list(self.groups.values())))
+        self.m_udp = self.metrics.counter("gateway_udp_overrides_total", "UDP overrides received", ("group", "override_task"))
+
+        # Influx pipeline: depth = points handed to the batching writer but not yet acknowledged
+        self.m_influx_submitted = self.metrics.counter("gateway_influx_points_submitted_total", "Points handed to the Influx writer")
+        self.m_influx_written = self.metrics.counter("gateway_influx_points_written_total", "Points acknowledged by Influx")
+        self.m_influx_failed = self.metrics.counter("gateway_influx_points_failed_total", "Points dropped after write errors")
+        self.metrics.gauge("gateway_influx_queue_depth", "Points waiting in the Influx write pipeline").set_function(
+            lambda: self.m_influx_submitted.default.value - self.m_influx_written.default.value - self.m_influx_failed.default.value
+        )
+
+    def get_group(self, group_id):
+        ctx = self.groups.get(group_id)
+        if ctx is None:
+            with self.groups_lock:
+                ctx = self.groups.get(group_id)
+                if ctx is None:
+                    ctx = self.groups[group_id] = GroupContext(group_id, self.group_metrics)
+                    if self.wildcard:
+                        print(f"Gateway: serving new group {group_id}")
+        return ctx
+
+    def group_for_topic(self, parts):
+        # warehouse/{group}/... from devices, {group}/internal/... from the Coordinator
+        group_id = parts[1] if parts[0] == "warehouse" and len(parts) > 1 else parts[0]
+        if not self.wildcard and group_id not in self.groups:
+            return None
+        return self.get_group(group_id)
+
+    def write_point(self, point):
+        self.m_influx_submitted.inc()
+        self.write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+
+    @staticmethod
+    def count_lines(data):
+        if isinstance(data, bytes):
+            return data.count(b'\n') + 1
+        return str(data).count('\n') + 1
+
+    def on_influx_success(self, conf, data):
+        self.m_influx_written.inc(self.count_lines(data))
+
+    def on_influx_error(self, conf, data, exception):
+        self.m_influx_failed.inc(self.count_lines(data))
+        print(f"Influx write failed: {exception}")
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print("Connected to MQTT Broker")
-            # Subscribe to all telemetry topics to act as ETL
-            client.subscribe(f"warehouse/{self.group_id}/#")
-            # Subscribe to Coordinator commands to forward them to robots
-            client.subscribe(f"{self.group_id}/internal/tasks/dispatch")
-            print(f"Subscribed to warehouse/{self.group_id}/# and {self.group_id}/internal/tasks/dispatch")
+            # One subscription pair per group, or a single wildcard pair over all groups
+            self.pending_subscriptions = set()
+            for group_id in ([ALL_GROUPS] if self.wildcard else self.group_ids):
+                # Subscribe to all telemetry topics to act as ETL
+                self.pending_subscriptions.add(client.subscribe(f"warehouse/{group_id}/#")[1])
+                # Subscribe to Coordinator commands to forward them to robots
+                self.pending_subscriptions.add(client.subscribe(f"{group_id}/internal/tasks/dispatch")[1])
+                # Consumers ask for the last known state when they start or reconnect
+                self.pending_subscriptions.add(client.subscribe(request_topic(group_id))[1])
         else:
             print(f"Failed to connect to MQTT, rc={rc}")
 
     def on_subscribe(self, client, userdata, mid, granted_qos):
         print(f"DEBUG Gateway: Subscribed to topic (MsgID: {mid}, QoS: {granted_qos})")
+        # Launcher ready marker, printed once the broker has acknowledged every subscription
+        if mid in self.pending_subscriptions:
+            self.pending_subscriptions.discard(mid)
+            if not self.pending_subscriptions:
+                for group_id in ([ALL_GROUPS] if self.wildcard else self.group_ids):
+                    print(f"Subscribed to warehouse/{group_id}/#, {group_id}/internal/tasks/dispatch and {request_topic(group_id)}")
 
     def on_message(self, client, userdata, msg):
+        started = time.perf_counter()
+        ctx = None
         try:
             topic = msg.topic
             
@@ -65,45 +224,96 @@ class WarehouseGateway:
             if topic.endswith("/command"):
                 return
 
-            payload = json.loads(msg.payload.decode('utf-8'))
-            
             parts = topic.split('/')
+            ctx = self.group_for_topic(parts)
+            if ctx is None:
+                return
             
             # Route based on source entity
+            if "tasks" in parts and "dispatch" in parts:
+                # Commands are never rate limited
+                ctx.m_in_dispatch.inc()
+                self.process_dispatch_command(ctx, json.loads(msg.payload.decode('utf-8')))
+                return
+
+            if parts[1:4] == ["internal", "snapshot", "request"]:
+                self.serve_snapshot(ctx, json.loads(msg.payload.decode('utf-8')))
+                return
+
+            # Telemetry is shed per group so one noisy cell cannot starve the others
+            if ctx.bucket is not None and not ctx.bucket.allow():
+                ctx.m_dropped.inc()
+                return
+
             if "amr" in parts:
-                self.process_robot_message(topic, payload)
+                ctx.m_in_amr.inc()
+                self.process_robot_message(ctx, topic, json.loads(msg.payload.decode('utf-8')))
             elif "locations" in parts:
-                self.process_shelf_message(topic, payload)
-            elif "tasks" in parts and "dispatch" in parts:
-                self.process_dispatch_command(payload)
+                ctx.m_in_shelf.inc()
+                self.process_shelf_message(ctx, topic, json.loads(msg.payload.decode('utf-8')))
+            else:
+                ctx.m_in_other.inc()
                 
         except json.JSONDecodeError:
+            (ctx.m_errors if ctx else self.m_errors).inc()
             print(f"Failed to decode JSON from {msg.topic}")
         except Exception as e:
+            (ctx.m_errors if ctx else self.m_errors).inc()
             print(f"Error processing message: {e}")
+        finally:
+            self.m_handle.observe(time.perf_counter() - started)
 
-    def process_robot_message(self, topic, payload):
+    def process_robot_message(self, ctx, topic, payload):
         # Forward robot status to internal logic topics and DB
         try:
             robot_id = payload.get("robot_id")
             if not robot_id: return
 
-            internal_topic = f"{self.group_id}/internal/amr/{robot_id}/status"
+            trace = payload.get("trace")
+            if trace:
+                self.resolve_robot_trace(ctx, payload, trace)
+
+            internal_topic = f"{ctx.group_id}/internal/amr/{robot_id}/status"
             self.mqtt_client.publish(internal_topic, json.dumps(payload))
+            ctx.m_out_internal.inc()
+            ctx.snapshot.update_robot(robot_id, payload)
             
             point = Point("robot_status") \
-                .tag("group_id", self.group_id) \
+                .tag("group_id", ctx.group_id) \
                 .tag("robot_id", robot_id) \
                 .field("battery", float(payload.get("battery", 0))) \
                 .field("location_id", payload.get("location_id", "UNKNOWN")) \
                 .field("status", payload.get("status", "UNKNOWN"))
                 
-            self.write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+            self.write_point(point)
             
         except Exception as e:
             print(f"Error in robot processing: {e}")
 
-    def process_shelf_message(self, topic, payload):
+    def resolve_robot_trace(self, ctx, payload, trace):
+        # Re-attach order_id to robot status and time the command hop to the robot
+        context = ctx.trace_tokens.get(trace.get("token"))
+        if context is None:
+            return
+        payload["order_id"] = context["order_id"]
+        trace["order_id"] = context["order_id"]
+
+        if not context["accepted"] and trace.get("accept_ns"):
+            context["accepted"] = True
+            self.trace_recorder.record_ns("mqtt.command_transit", context["publish_ns"], trace["accept_ns"])
+
+        if trace.get("drop_ns"):
+            del ctx.trace_tokens[trace["token"]]
+
+    def allocate_trace_token(self, ctx, order_id):
+        token = ctx.next_trace_token
+        ctx.next_trace_token = token + 1 if token < 0xFFFFFFFF else 1
+        ctx.trace_tokens[token] = {"order_id": order_id, "publish_ns": 0, "accepted": False}
+        while len(ctx.trace_tokens) > MAX_TRACE_TOKENS:
+            ctx.trace_tokens.popitem(last=False)
+        return token
+
+    def process_shelf_message(self, ctx, topic, payload):
         # Normalize stock units to KG and log to DB
         try:
             parts = topic.split('/')
@@ -113,10 +323,10 @@ class WarehouseGateway:
             stock = float(payload.get("stock", 0))
             unit = payload.get("unit", "units")
             
-            # Unit Conversion Logic
+            # Unit Conversion Logic: per-item weight precomputed per shelf in the catalog
             stock_kg = stock
             if unit == "units":
-                stock_kg = stock * 23.0
+                stock_kg = stock * CATALOG.kg_per_unit(asset_id)
             
             cleaned_payload = payload.copy()
             cleaned_payload["stock"] = stock_kg
@@ -124,28 +334,49 @@ class WarehouseGateway:
             cleaned_payload["original_stock"] = stock
             cleaned_payload["original_unit"] = unit
             
-            internal_topic = f"{self.group_id}/internal/static/{asset_id}/status"
+            internal_topic = f"{ctx.group_id}/internal/static/{asset_id}/status"
             self.mqtt_client.publish(internal_topic, json.dumps(cleaned_payload))
+            ctx.m_out_internal.inc()
+            ctx.snapshot.update_shelf(asset_id, cleaned_payload)
             
             point = Point("shelf_status") \
-                .tag("group_id", self.group_id) \
+                .tag("group_id", ctx.group_id) \
                 .tag("zone_id", zone_id) \
                 .tag("asset_id", asset_id) \
                 .tag("item_id", payload.get("item_id", "UNKNOWN")) \
                 .field("stock_kg", stock_kg)
                 
-            self.write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+            self.write_point(point)
             
         except Exception as e:
             print(f"Error in shelf processing: {e}")
 
-    def process_dispatch_command(self, payload):
+    def serve_snapshot(self, ctx, payload):
+        # One reply with every fresh robot and shelf status, so a consumer is warm after one round-trip
+        reply_to = payload.get("reply_to", "")
+        if not reply_to.startswith(f"{ctx.group_id}/internal/snapshot/reply/"):
+            print(f"Ignoring snapshot request with reply topic '{reply_to}'")
+            return
+        snapshot = ctx.snapshot.snapshot()
+        snapshot["group_id"] = ctx.group_id
+        self.mqtt_client.publish(reply_to, json.dumps(snapshot), qos=1)
+        ctx.m_out_snapshot.inc()
+        print(f"Served snapshot to {reply_to.rsplit('/', 1)[-1]}: {len(snapshot['robots'])} robots, {len(snapshot['shelves'])} shelves")
+
+    def process_dispatch_command(self, ctx, payload):
         # Convert high-level JSON tasks to low-level binary commands
         try:
+            received = time.perf_counter()
             robot_id = payload.get("robot_id")
             command_str = payload.get("command")
             target_shelf = payload.get("target_shelf_id")
             target_station = payload.get("target_station_id")
+
+            # Scheduled charging from the Coordinator reuses the FORCE_CHARGE opcode
+            if command_str == "CHARGE" and robot_id:
+                self.send_robot_command(ctx, robot_id, 0x03, "S0", "P0")
+                print(f"DEBUG Gateway: Dispatched CHARGE to {robot_id}")
+                return
             
             if not all([robot_id, command_str, target_shelf, target_station]):
                 print("Invalid dispatch payload")
@@ -154,7 +385,18 @@ class WarehouseGateway:
             quantity = payload.get("quantity", 1)
 
             if command_str == "EXECUTE_TASK":
-                self.send_robot_command(robot_id, 0x01, target_shelf, target_station, quantity)
+                trace_token = 0
+                trace = payload.get("trace")
+                if trace:
+                    self.trace_recorder.record_ns("mqtt.dispatch_transit", trace.get("dispatch_ns"), time.time_ns())
+                    trace_token = self.allocate_trace_token(ctx, payload.get("order_id", "unknown"))
+
+                # Pre-assigned tasks use their own opcode so an idle robot does not start them
+                cmd_byte = 0x02 if payload.get("queue_only") else 0x01
+                self.send_robot_command(ctx, robot_id, cmd_byte, target_shelf, target_station, quantity, trace_token)
+                if trace_token:
+                    ctx.trace_tokens[trace_token]["publish_ns"] = time.time_ns()
+                    self.trace_recorder.record("gateway.encode", time.perf_counter() - received)
                 print(f"DEBUG Gateway: Dispatched EXECUTE_TASK to {robot_id} (Shelf {target_shelf}, Station {target_station}, Qty {quantity})")
                 
         except Exception as e:
@@ -162,7 +404,7 @@ class WarehouseGateway:
 
     def start_udp_server(self):
         # Background thread for handling UDP overrides
-        print("UDP Server listening on port 9090...")
+        print(f"UDP Server listening on port {self.udp_socket.getsockname()[1]}...")
         while self.udp_running:
             try:
                 data, addr = self.udp_socket.recvfrom(1024)
@@ -174,72 +416,91 @@ class WarehouseGateway:
                 print(f"UDP Error: {e}")
 
     def process_udp_message(self, payload):
+        if payload.get("command") == "PROFILE":
+            self.profiler.handle_command(payload)
+            return
         try:
+            # Overrides name their group; single-group senders may omit it
+            group_id = payload.get("group_id") or self.group_ids[0]
+            if group_id == ALL_GROUPS or (not self.wildcard and group_id not in self.groups):
+                print(f"Ignoring UDP override for unknown group {group_id}")
+                return
+            ctx = self.get_group(group_id)
             robot_id = payload.get("robot_id")
             override_task = payload.get("override_task")
+            self.m_udp.labels(group_id, override_task).inc()
             
             point = Point("system_alerts") \
-                .tag("group_id", self.group_id) \
+                .tag("group_id", ctx.group_id) \
                 .tag("robot_id", robot_id) \
                 .tag("level", payload.get("level", "INFO")) \
                 .field("message", f"Override: {override_task}")
-            self.write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+            self.write_point(point)
             
             if override_task == "FORCE_CHARGE":
                 # Send binary override command (0x03)
-                self.send_robot_command(robot_id, 0x03, "S0", "P0")
+                self.send_robot_command(ctx, robot_id, 0x03, "S0", "P0")
                 print(f"Sent FORCE_CHARGE override to {robot_id}")
                 
         except Exception as e:
             print(f"Error processing UDP override: {e}")
 
-    def send_robot_command(self, robot_id, cmd_byte, shelf_id_str, station_id_str, quantity=0):
+    def send_robot_command(self, ctx, robot_id, cmd_byte, shelf_id_str, station_id_str, quantity=0, trace_token=0):
         # Pack command into 3-byte binary struct for bandwidth efficiency
+        # (7 bytes when a 32-bit trace token is appended). Shelf and station are catalog
+        # codes; past 255 they are sent as 16-bit fields (5 or 9 bytes).
         try:
-            shelf_id = self.extract_id(shelf_id_str)
-            station_id = self.extract_id(station_id_str)
+            shelf_id = CATALOG.shelf_code(shelf_id_str)
+            station_id = CATALOG.station_code(station_id_str)
             
-            payload = struct.pack("BBB", cmd_byte, shelf_id, station_id)
+            if shelf_id > 0xFF or station_id > 0xFF:
+                if trace_token:
+                    payload = struct.pack("<BHHI", cmd_byte, shelf_id, station_id, trace_token)
+                else:
+                    payload = struct.pack("<BHH", cmd_byte, shelf_id, station_id)
+            elif trace_token:
+                payload = struct.pack("<BBBI", cmd_byte, shelf_id, station_id, trace_token)
+            else:
+                payload = struct.pack("BBB", cmd_byte, shelf_id, station_id)
             
-            topic = f"warehouse/{self.group_id}/amr/{robot_id}/command"
+            topic = f"warehouse/{ctx.group_id}/amr/{robot_id}/command"
             self.mqtt_client.publish(topic, payload)
+            ctx.m_out_command.inc()
             
-            cmd_type_str = "EXECUTE_TASK" if cmd_byte == 0x01 else "FORCE_CHARGE" if cmd_byte == 0x03 else "UNKNOWN"
+            cmd_type_str = COMMAND_TYPES.get(cmd_byte, "UNKNOWN")
             point = Point("robot_commands") \
-                .tag("group_id", self.group_id) \
+                .tag("group_id", ctx.group_id) \
                 .tag("robot_id", robot_id) \
                 .field("command_type", cmd_type_str) \
                 .field("target_shelf", str(shelf_id_str)) \
                 .field("target_station", str(station_id_str)) \
                 .field("quantity", int(quantity))
-            self.write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
+            self.write_point(point)
             
         except Exception as e:
             print(f"Error sending robot command: {e}")
 
-    def extract_id(self, id_str):
-        # Helper to extract integer ID from string (e.g. "S1" -> 1)
-        import re
-        match = re.search(r'\d+', str(id_str))
-        return int(match.group()) if match else 0
-
     def run(self):
         try:
+            self.profiler.install()
             udp_thread = threading.Thread(target=self.start_udp_server, daemon=True)
             udp_thread.start()
+            self.trace_recorder.start()
+            self.metrics.start_server(METRICS_PORT)
             
             self.mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
             self.mqtt_client.loop_forever()
         except KeyboardInterrupt:
             print("Stopping Gateway...")
+            self.trace_recorder.flush()
         except Exception as e:
             print(f"Unexpected error: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python warehouse_gateway.py {GroupID}")
+    if len(sys.argv) < 2:
+        print("Usage: python warehouse_gateway.py {GroupID} [GroupID ...]  (or + for every group)")
         sys.exit(1)
         
-    group_id = sys.argv[1]
-    gateway = WarehouseGateway(group_id)
+    group_ids = sys.argv[1:]
+    gateway = WarehouseGateway(group_ids)
     gateway.run()
@@ -0,0 +1,124 @@
+import sys
+
+# Robot statuses and the coordinator's own task states share one table of small integer codes,
+# so world state holds ints instead of a fresh string per status message and comparisons are
+# int compares. Statuses not listed here get the next free code the first time they are seen.
+STATUS_NAMES = ["UNKNOWN", "IDLE", "MOVING_TO_PICK", "PICKING", "MOVING_TO_DROP", "DROPPING",
+                "MOVING_TO_CHARGE", "CHARGING", "STALLED", "LOST", "ASSIGNED", "FREE", "WORKING"]
+STATUS_CODES = {name: code for code, name in enumerate(STATUS_NAMES)}
+(UNKNOWN, IDLE, MOVING_TO_PICK, PICKING, MOVING_TO_DROP, DROPPING,
+ MOVING_TO_CHARGE, CHARGING, STALLED, LOST, ASSIGNED, FREE, WORKING) = range(len(STATUS_NAMES))
+
+def status_code(name):
+    code = STATUS_CODES.get(name)
+    if code is None:
+        if not isinstance(name, str):
+            return UNKNOWN
+        code = STATUS_CODES[sys.intern(name)] = len(STATUS_NAMES)
+        STATUS_NAMES.append(name)
+    return code
+
+def status_codes(names):
+    return frozenset(status_code(name) for name in names)
+
+def intern_id(value):
+    # Item and station IDs repeat across thousands of orders; one shared string each.
+    # Robot and shelf IDs are unique keys already, interning them would only grow the intern table.
+    return sys.intern(value) if isinstance(value, str) else value
+
+class RobotRecord:
+    # What the coordinator keeps per robot; the rest of the status payload is not needed here
+    __slots__ = ("robot_id", "status", "state", "battery", "tasks_completed", "seen_at", "keepalive", "on_task",
+                 "idle_slot")
+
+    def __init__(self, robot_id):
+        self.robot_id = robot_id
+        self.status = UNKNOWN
+        self.state = FREE
+        self.battery = 0.0
+        self.tasks_completed = None  # Only robots with a task queue report a running count
+        self.seen_at = None          # Last status time, for utilization
+        self.keepalive = 0.0         # Advertised status interval when nothing changes
+        self.on_task = False
+        self.idle_slot = -1          # Position in RobotTable.idle, -1 when not idle
+
+    def status_name(self):
+        return STATUS_NAMES[self.status]
+
+    def state_name(self):
+        return STATUS_NAMES[self.state]
+
+class RobotTable:
+    # robot_id -> RobotRecord. Robots that are IDLE on their side and FREE on ours are also kept
+    # in a dense list (each record knows its position, removal swaps in the last one), so
+    # dispatch draws a free robot in O(1) instead of scanning the whole fleet per order.
+    def __init__(self):
+        self.records = {}
+        self.idle = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, robot_id):
+        return robot_id in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, robot_id):
+        return self.records.get(robot_id)
+
+    def values(self):
+        return self.records.values()
+
+    def add(self, robot_id):
+        robot = self.records[robot_id] = RobotRecord(robot_id)
+        return robot
+
+    def set_state(self, robot, status, state):
+        robot.status = status
+        robot.state = state
+        if status == IDLE and state == FREE:
+            if robot.idle_slot < 0:
+                robot.idle_slot = len(self.idle)
+                self.idle.append(robot)
+        elif robot.idle_slot >= 0:
+            self._unlist(robot)
+
+    def remove(self, robot_id):
+        robot = self.records.pop(robot_id, None)
+        if robot is not None and robot.idle_slot >= 0:
+            self._unlist(robot)
+        return robot
+
+    def _unlist(self, robot):
+        idle = self.idle
+        last = idle.pop()
+        if last is not robot:
+            last.idle_slot = robot.idle_slot
+            idle[last.idle_slot] = last
+        robot.idle_slot = -1
+
+class ShelfRecord:
+    __slots__ = ("shelf_id", "item_id", "stock", "units", "en_route", "reserved")
+
+    def __init__(self, shelf_id, item_id, stock, units):
+        self.shelf_id = shelf_id
+        self.item_id = item_id
+        self.stock = stock      # In the gateway's normalized unit, as reported
+        self.units = units      # In the shelf's own units, which order quantities use
+        self.en_route = 0       # Robots assigned to this shelf that have not picked yet
+        self.reserved = 0       # Quantity those robots will take
+
+class Assignment:
+    # One task handed to a robot; slot identifies it at the pack station, (robot_id, order_id).
+    # at_shelf stays set until the robot has picked, while it counts against the shelf's limit.
+    __slots__ = ("station", "shelf_id", "quantity", "order", "slot", "at_shelf")
+
+    def __init__(self, station, shelf_id, quantity, order, slot):
+        self.station = station
+        self.shelf_id = shelf_id
+        self.quantity = quantity
+        self.order = order
+        self.slot = slot
+        self.at_shelf = False